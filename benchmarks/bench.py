@@ -0,0 +1,303 @@
+"""Micro-benchmarks of gryannote backend hot paths.
+
+Benchmarks run offline, on synthetic audio and annotations generated in a
+temporary directory. Results are written as JSON in `benchmarks/results/` so
+that they can be compared between releases with `benchmarks/compare.py`.
+
+Usage:
+    python benchmarks/bench.py                     # default sizes
+    python benchmarks/bench.py --quick             # smallest sizes only
+    python benchmarks/bench.py --filter rttm       # only benchmarks matching "rttm"
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import gryannote  # noqa: E402,F401  isort: skip  (registers gryannote_* modules)
+from gradio.data_classes import FileData  # noqa: E402
+from gryannote_audio import AnnotadedAudioData, AudioLabeling  # noqa: E402
+from gryannote_pipeline import PipelineSelector  # noqa: E402
+from gryannote_rttm import RTTM  # noqa: E402
+from pyannote.core import Annotation, Segment  # noqa: E402
+from pyannote.database.util import load_rttm  # noqa: E402
+from pyannote.pipeline.parameter import (  # noqa: E402
+    Categorical,
+    Integer,
+    LogUniform,
+    Uniform,
+)
+
+SAMPLE_RATE = 16000
+
+# audio durations (in seconds) and number of segments
+DURATIONS = [60, 600, 3600, 4 * 3600]
+NUM_SEGMENTS = [100, 10_000, 100_000, 1_000_000]
+
+# benchmarks whose warm-up run exceeds this duration (in seconds) are run once
+SLOW = 10.0
+
+
+@dataclass
+class Result:
+    name: str
+    params: Dict[str, Any]
+    repeat: int
+    times: List[float] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "params": self.params,
+            "repeat": self.repeat,
+            "min": min(self.times),
+            "median": statistics.median(self.times),
+            "mean": statistics.mean(self.times),
+        }
+
+
+BENCHMARKS: List[Callable] = []
+
+
+def benchmark(fn: Callable) -> Callable:
+    """Register a benchmark. Benchmarks are generators yielding (params, run)."""
+    BENCHMARKS.append(fn)
+    return fn
+
+
+def measure(run: Callable[[], Any], repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def make_audio(path: Path, duration: float) -> Path:
+    """Write a synthetic 16-bit mono wav file, chunk by chunk"""
+    rng = np.random.default_rng(0)
+    with wave.open(str(path), "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(SAMPLE_RATE)
+        remaining = int(duration * SAMPLE_RATE)
+        while remaining > 0:
+            n = min(remaining, 60 * SAMPLE_RATE)
+            t = np.arange(n) / SAMPLE_RATE
+            data = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(n)
+            file.writeframes((data * 32767).astype(np.int16).tobytes())
+            remaining -= n
+    return path
+
+
+def make_annotation(num_segments: int, uri: str = "bench") -> Annotation:
+    """Synthetic annotation with 4 speakers and 1s-long segments"""
+    annotation = Annotation(uri=uri)
+    for i in range(num_segments):
+        annotation[Segment(i, i + 1.0), i % 2] = f"SPEAKER_{i % 4:02d}"
+    return annotation
+
+
+def make_component(cls, tmp: Path, **kwargs):
+    component = cls(render=False, **kwargs)
+    component.GRADIO_CACHE = str(tmp)
+    return component
+
+
+@benchmark
+def audio_preprocess(tmp: Path, durations: List[float], sizes: List[int]):
+    for duration in durations:
+        audio = make_audio(tmp / f"preprocess-{duration}.wav", duration)
+        payload = AnnotadedAudioData(file_data=FileData(path=str(audio)))
+        for type in ["numpy", "filepath"]:
+            component = make_component(AudioLabeling, tmp, type=type)
+            yield {"duration": duration, "type": type}, lambda: component.preprocess(
+                payload
+            )
+
+
+@benchmark
+def audio_postprocess(tmp: Path, durations: List[float], sizes: List[int]):
+    for duration in durations:
+        data = np.random.default_rng(0).standard_normal(int(duration * SAMPLE_RATE))
+        data = (0.1 * data * 32767).astype(np.int16)
+        audio = make_audio(tmp / f"postprocess-{duration}.wav", duration)
+        for format in ["wav", "mp3"]:
+            component = make_component(AudioLabeling, tmp, format=format)
+            yield {
+                "duration": duration,
+                "input": "numpy",
+                "format": format,
+            }, lambda: component.postprocess(((SAMPLE_RATE, data), None))
+        component = make_component(AudioLabeling, tmp)
+        yield {
+            "duration": duration,
+            "input": "filepath",
+        }, lambda: component.postprocess((str(audio), None))
+
+
+@benchmark
+def prepare_annotations(tmp: Path, durations: List[float], sizes: List[int]):
+    file_data = FileData(path=str(tmp / "bench.wav"))
+    for size in sizes:
+        annotation = make_annotation(size)
+        yield {"segments": size}, lambda: AnnotadedAudioData(
+            file_data=file_data, annotations=annotation
+        )
+
+
+@benchmark
+def convert_to_pyannote_annotation(tmp: Path, durations: List[float], sizes: List[int]):
+    rttm = make_component(RTTM, tmp)
+    file_data = FileData(path=str(tmp / "bench.wav"))
+    for size in sizes:
+        data = AnnotadedAudioData(
+            file_data=file_data, annotations=make_annotation(size)
+        )
+        yield {"segments": size}, lambda: rttm._convert_to_pyannote_annotation(data)
+
+
+@benchmark
+def rttm_write(tmp: Path, durations: List[float], sizes: List[int]):
+    rttm = make_component(RTTM, tmp)
+    for size in sizes:
+        annotation = make_annotation(size, uri=f"write-{size}")
+        yield {"segments": size}, lambda: rttm._write_rttm(annotation)
+
+
+@benchmark
+def rttm_parse(tmp: Path, durations: List[float], sizes: List[int]):
+    rttm = make_component(RTTM, tmp)
+    for size in sizes:
+        path = rttm._write_rttm(make_annotation(size, uri=f"parse-{size}"))
+        yield {"segments": size}, lambda: load_rttm(path)
+
+
+@benchmark
+def stream_output(tmp: Path, durations: List[float], sizes: List[int]):
+    component = make_component(AudioLabeling, tmp, streaming=True)
+    # streamed chunks are short, whatever the total duration of the stream
+    for chunk_duration in [0.5, 2, 10]:
+        audio = make_audio(tmp / f"chunk-{chunk_duration}.wav", chunk_duration)
+        value = {"path": str(audio), "orig_name": audio.name}
+        for first_chunk in [True, False]:
+            yield {
+                "chunk_duration": chunk_duration,
+                "first_chunk": first_chunk,
+            }, lambda: component.stream_output(value, "output", first_chunk)
+
+
+@benchmark
+def param_specs_round_trip(tmp: Path, durations: List[float], sizes: List[int]):
+    # avoid listing available pipelines from Hugging Face
+    selector = PipelineSelector.__new__(PipelineSelector)
+    for num_params in [4, 32, 256]:
+        param_types, param_values = {}, {}
+        for i in range(num_params):
+            group = f"group_{i % 4}"
+            param_types.setdefault(group, {})
+            param_values.setdefault(group, {})
+            param, value = [
+                (Uniform(0.0, 1.0), 0.5),
+                (LogUniform(1e-3, 1.0), 0.1),
+                (Integer(1, 100), 10),
+                (Categorical(["a", "b", "c"]), "b"),
+            ][i % 4]
+            param_types[group][f"param_{i}"] = param
+            param_values[group][f"param_{i}"] = value
+
+        def round_trip():
+            specs = selector._get_param_specs(param_types, param_values)
+            return selector._get_param_values(param_types, specs)
+
+        yield {"parameters": num_params}, round_trip
+
+
+def get_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_version() -> str:
+    with open(ROOT / "pyproject.toml", encoding="utf-8") as file:
+        return re.search(r'^version = "(.+)"', file.read(), re.MULTILINE).group(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--quick", action="store_true", help="smallest sizes only")
+    parser.add_argument("--filter", default="", help="run benchmarks matching this")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="output file. Default to benchmarks/results/<version>-<revision>.json",
+    )
+    args = parser.parse_args()
+
+    durations = DURATIONS[:1] if args.quick else DURATIONS
+    sizes = NUM_SEGMENTS[:2] if args.quick else NUM_SEGMENTS
+
+    results: List[Result] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for bench in BENCHMARKS:
+            if args.filter not in bench.__name__:
+                continue
+            for params, run in bench(Path(tmp), durations, sizes):
+                (warmup,) = measure(run, 1)
+                # a single run of slow benchmarks is meaningful enough
+                repeat = 1 if warmup > SLOW else args.repeat
+                result = Result(bench.__name__, params, repeat, measure(run, repeat))
+                summary = result.summary()
+                print(
+                    f"{bench.__name__:<32} {json.dumps(params):<60} "
+                    f"median={summary['median']:.6f}s min={summary['min']:.6f}s"
+                )
+                results.append(result)
+
+    version, revision = get_version(), get_revision()
+    output = args.output or (
+        ROOT / "benchmarks" / "results" / f"{version}-{revision or 'unknown'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "version": version,
+                "revision": revision,
+                "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "processor": platform.processor(),
+                "results": [result.summary() for result in results],
+            },
+            file,
+            indent=2,
+        )
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Import time and memory footprint of gryannote.
+
+Each scenario is run in a fresh interpreter, several times. Wall-clock time and
+peak RSS of the child process are reported, and written as JSON in
+`benchmarks/results/` (see `bench.py`).
+
+Usage:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --revision v0.3.0   # measure another revision
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCENARIOS = {
+    "import gryannote": "import gryannote",
+    "RTTM only": "from gryannote import RTTM",
+    "Player only": "from gryannote import Player",
+    "PipelineSelector": "from gryannote import PipelineSelector",
+    "all components": "from gryannote import AudioLabeling, PipelineSelector, RTTM",
+}
+
+
+def run(statement: str, root: Path) -> tuple[float, int]:
+    """Run `statement` in a fresh interpreter, return (duration, peak RSS in bytes)"""
+    # component packages are importable under their top-level name, as when they
+    # are installed (required by revisions before gryannote provided aliases)
+    paths = [str(root)] + [
+        str(root / "gryannote" / component / "backend")
+        for component in ["audio", "pipeline", "rttm"]
+    ]
+    code = (
+        "import resource, sys\n"
+        f"sys.path[:0] = {paths!r}\n"
+        f"{statement}\n"
+        "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    )
+    start = time.perf_counter()
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    duration = time.perf_counter() - start
+    peak_rss = int(output.strip().splitlines()[-1])
+    # ru_maxrss is given in kilobytes on Linux, but in bytes on macOS
+    return duration, peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def get_revision() -> str:
+    return subprocess.check_output(
+        ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+    ).strip()
+
+
+def get_version(root: Path) -> str:
+    with open(root / "pyproject.toml", encoding="utf-8") as file:
+        return re.search(r'^version = "(.+)"', file.read(), re.MULTILINE).group(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per scenario")
+    parser.add_argument(
+        "--revision",
+        default=None,
+        help="git revision to measure, e.g. to compare with a previous release. "
+        "Default to the working tree.",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="output file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = ROOT
+        if args.revision:
+            root = Path(tmp) / "worktree"
+            subprocess.check_call(
+                ["git", "worktree", "add", "--detach", str(root), args.revision],
+                cwd=ROOT,
+            )
+
+        try:
+            results = []
+            for name, statement in SCENARIOS.items():
+                # warm-up, to fill the OS file cache and compile bytecode
+                run(statement, root)
+                durations, peak_rss = [], []
+                for _ in range(args.repeat):
+                    duration, rss = run(statement, root)
+                    durations.append(duration)
+                    peak_rss.append(rss)
+                result = {
+                    "name": "import",
+                    "params": {"scenario": name},
+                    "repeat": args.repeat,
+                    "min": min(durations),
+                    "median": statistics.median(durations),
+                    "mean": statistics.mean(durations),
+                    "peak_rss": max(peak_rss),
+                }
+                print(
+                    f"{name:<20} median={result['median']:.3f}s "
+                    f"peak_rss={result['peak_rss'] / 2**20:.0f}MB"
+                )
+                results.append(result)
+            version = get_version(root)
+        finally:
+            if args.revision:
+                subprocess.check_call(
+                    ["git", "worktree", "remove", "--force", str(root)], cwd=ROOT
+                )
+
+    revision = args.revision or get_revision()
+    output = args.output or (
+        ROOT / "benchmarks" / "results" / f"import-{version}-{revision}.json"
+    )
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump({"revision": revision, "results": results}, file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
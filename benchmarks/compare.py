@@ -0,0 +1,60 @@
+"""Compare two benchmark result files and report regressions.
+
+Usage:
+    python benchmarks/compare.py results/0.3.0-abc1234.json results/0.4.0-def5678.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Tuple
+
+
+def load(path: Path) -> Dict[Tuple[str, str], float]:
+    with open(path, encoding="utf-8") as file:
+        results = json.load(file)["results"]
+    return {
+        (result["name"], json.dumps(result["params"], sort_keys=True)): result["median"]
+        for result in results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown above which a benchmark is a regression. Default to 10%%.",
+    )
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key], candidate[key]
+        change = (after - before) / before if before > 0 else 0.0
+        status = ""
+        if change > args.threshold:
+            status = "REGRESSION"
+            regressions += 1
+        elif change < -args.threshold:
+            status = "improvement"
+        name, params = key
+        print(
+            f"{name:<32} {params:<60} {before:.6f}s -> {after:.6f}s "
+            f"({change:+.1%}) {status}"
+        )
+
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        print(f"{key[0]:<32} {key[1]:<60} only in one of the result files")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
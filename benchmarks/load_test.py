@@ -0,0 +1,444 @@
+"""Multi-user load test of the demo application.
+
+The demo (`demo/app.py`) is started in a subprocess, and simulated annotators drive
+it concurrently with `gradio_client`, going through the whole annotation flow:
+
+    upload -> select pipeline -> run pipeline -> edit -> download RTTM
+
+Latency percentiles of each event, and CPU / RSS of the server process (and of its
+children, e.g. inference workers) are reported, and written as JSON in
+`benchmarks/results/` (see `bench.py`).
+
+With `--stub`, Hugging Face pipelines are replaced by a stub pipeline taking
+`--stub-rtf` seconds per second of audio, so that no hub access (nor token) is
+needed, and the load on the server itself is measured.
+
+Usage:
+    python benchmarks/load_test.py --stub --users 30
+    python benchmarks/load_test.py --users 4 --iterations 2    # real pipelines
+    python benchmarks/load_test.py --url http://host:7860/     # running server
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import os
+import platform
+import re
+import runpy
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import wave
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SAMPLE_RATE = 16000
+PIPELINE = "pyannote/speaker-diarization-3.1"
+
+# events of the annotation flow, in order
+EVENTS = ["upload", "select", "run", "edit", "download"]
+# API names of the demo's event listeners
+SELECT_API = "/on_select"
+RUN_API = "/apply_pipeline"
+EDIT_API = "/on_edit"
+
+# server CPU and RSS are sampled at this interval (in seconds)
+SAMPLING_INTERVAL = 0.5
+
+
+def serve_stub(port: int, rtf: float):
+    """Run the demo with a stub pipeline, in the current process"""
+    sys.path.insert(0, str(ROOT))
+    import gryannote  # noqa: F401  isort: skip  (registers gryannote_* modules)
+    from gryannote_pipeline import PipelineSelector
+    from pyannote.audio import Pipeline
+    from pyannote.core import Annotation, Segment
+
+    class StubDiarization(Pipeline):
+        """Alternates two speakers every 2 seconds, taking `rtf` seconds per second"""
+
+        def apply(self, file, hook=None, **kwargs):
+            if "waveform" in file:
+                duration = file["waveform"].shape[-1] / file["sample_rate"]
+            else:
+                with wave.open(str(file["audio"])) as audio:
+                    duration = audio.getnframes() / audio.getframerate()
+            time.sleep(rtf * duration)
+            annotation = Annotation(uri=file.get("uri"))
+            for i, start in enumerate(np.arange(0.0, duration, 2.0)):
+                segment = Segment(start, min(start + 1.8, duration))
+                annotation[segment] = f"SPEAKER_{i % 2:02d}"
+            return annotation
+
+    PipelineSelector.get_available_pipelines = lambda self: [PIPELINE]
+    Pipeline.from_pretrained = classmethod(
+        lambda cls, *args, **kwargs: StubDiarization()
+    )
+
+    os.environ["GRADIO_SERVER_PORT"] = str(port)
+    runpy.run_path(str(ROOT / "demo" / "app.py"), run_name="__main__")
+
+
+def start_server(port: int, stub: bool, rtf: float) -> subprocess.Popen:
+    if stub:
+        command = [sys.executable, __file__, "--serve-stub", "--port", str(port)]
+        command += ["--stub-rtf", str(rtf)]
+    else:
+        command = [sys.executable, str(ROOT / "demo" / "app.py")]
+    env = dict(os.environ, GRADIO_SERVER_PORT=str(port))
+    return subprocess.Popen(command, env=env, cwd=ROOT / "demo")
+
+
+def wait_for_server(url: str, server: Optional[subprocess.Popen], timeout: float):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            response = httpx.get(url, timeout=1.0)
+        except httpx.HTTPError:
+            # not listening yet
+            time.sleep(0.5)
+            continue
+        if response.status_code >= 500:
+            raise RuntimeError(f"Server responded with status {response.status_code}")
+        return
+    raise TimeoutError(f"Server did not start within {timeout} seconds")
+
+
+def make_audio(path: Path, duration: float) -> Path:
+    """Write a synthetic 16-bit mono wav file"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+    data = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+    with wave.open(str(path), "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(SAMPLE_RATE)
+        file.writeframes((data * 32767).astype(np.int16).tobytes())
+    return path
+
+
+class ProcessSampler:
+    """Samples CPU usage and RSS of a process and its children (Linux only)"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.cpu: List[float] = []
+        self.rss: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def _tree(self) -> List[int]:
+        """pid of the process and of its descendants"""
+        parents = {}
+        for entry in Path("/proc").iterdir():
+            if entry.name.isdigit():
+                try:
+                    stat = (entry / "stat").read_text()
+                except OSError:
+                    continue
+                # fields following the command name, which may contain spaces
+                parents[int(entry.name)] = int(stat.rsplit(")", 1)[1].split()[1])
+        tree = [self.pid]
+        for pid in tree:
+            tree += [child for child, parent in parents.items() if parent == pid]
+        return tree
+
+    def _read(self) -> tuple[float, int]:
+        """(CPU time in seconds, RSS in bytes) of the process tree"""
+        cpu_time, rss = 0.0, 0
+        for pid in self._tree():
+            try:
+                fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            # utime and stime, then rss (in pages)
+            cpu_time += (int(fields[11]) + int(fields[12])) / self._ticks
+            rss += int(fields[21]) * self._page_size
+        return cpu_time, rss
+
+    def _run(self):
+        previous, start = self._read()[0], time.monotonic()
+        while not self._stop.wait(SAMPLING_INTERVAL):
+            cpu_time, rss = self._read()
+            now = time.monotonic()
+            self.cpu.append(100 * (cpu_time - previous) / (now - start))
+            self.rss.append(rss)
+            previous, start = cpu_time, now
+
+    def start(self):
+        if Path(f"/proc/{self.pid}/stat").exists():
+            self._thread.start()
+
+    def stop(self) -> Dict[str, float]:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if not self.cpu:
+            return {}
+        return {
+            "cpu_mean": statistics.mean(self.cpu),
+            "cpu_max": max(self.cpu),
+            "rss_mean": statistics.mean(self.rss),
+            "rss_max": max(self.rss),
+        }
+
+
+class Annotator:
+    """Simulated user, going through the annotation flow with its own session"""
+
+    def __init__(self, url: str, audio: Path, think_time: float, results: Dict):
+        from gradio_client import Client
+
+        self.client = Client(url, verbose=False, download_files=False)
+        self.audio = audio
+        self.think_time = think_time
+        self.results = results
+
+    def _measure(self, event: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            output = fn(*args, **kwargs)
+        except Exception as error:
+            self.results[event]["errors"].append(repr(error))
+            raise
+        self.results[event]["latencies"].append(time.perf_counter() - start)
+        # users do not chain events instantly
+        time.sleep(self.think_time)
+        return output
+
+    def upload(self) -> str:
+        import httpx
+
+        with open(self.audio, "rb") as file:
+            response = httpx.post(
+                self.client.upload_url,
+                files={"files": (self.audio.name, file, "audio/wav")},
+                headers=self.client.headers,
+                timeout=None,
+            )
+        response.raise_for_status()
+        return response.json()[0]
+
+    def download(self, file_data: Dict) -> int:
+        import httpx
+
+        url = file_data.get("url") or urllib.parse.urljoin(
+            self.client.src_prefixed, f"file={file_data['path']}"
+        )
+        size = 0
+        with httpx.stream("GET", url, headers=self.client.headers, timeout=None) as r:
+            r.raise_for_status()
+            for chunk in r.iter_bytes():
+                size += len(chunk)
+        return size
+
+    def session(self):
+        path = self._measure("upload", self.upload)
+        pipeline_info = {"name": PIPELINE, "token": "", "param_specs": {}}
+        pipeline_info = self._measure(
+            "select", self.client.predict, pipeline_info, api_name=SELECT_API
+        )
+
+        file_data = {"path": path, "meta": {"_type": "gradio.FileData"}}
+        audio_value = {"file_data": file_data}
+        annotated, _ = self._measure(
+            "run", self.client.predict, pipeline_info, audio_value, api_name=RUN_API
+        )
+
+        # shift the end of the first segment, as an annotator would
+        edited = copy.deepcopy(annotated)
+        if edited.get("annotations"):
+            edited["annotations"][0]["end"] += 0.1
+        rttm = self._measure("edit", self.client.predict, edited, api_name=EDIT_API)
+        self._measure("download", self.download, rttm)
+
+
+def run_annotator(url: str, audio: Path, args, results: Dict, delay: float):
+    time.sleep(delay)
+    try:
+        annotator = Annotator(url, audio, args.think_time, results)
+    except Exception as error:
+        results["connect"]["errors"].append(repr(error))
+        return
+    for _ in range(args.iterations):
+        try:
+            annotator.session()
+        except Exception:
+            # already recorded, start a new session
+            continue
+
+
+def summarize(results: Dict) -> Dict:
+    summary = {}
+    for event, result in results.items():
+        latencies = result["latencies"]
+        summary[event] = {"count": len(latencies), "errors": len(result["errors"])}
+        if latencies:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            summary[event].update(
+                p50=float(p50),
+                p95=float(p95),
+                p99=float(p99),
+                mean=statistics.mean(latencies),
+                max=max(latencies),
+            )
+        if result["errors"]:
+            # a few examples are enough to diagnose
+            summary[event]["error_examples"] = sorted(set(result["errors"]))[:3]
+    return summary
+
+
+def get_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_version() -> str:
+    with open(ROOT / "pyproject.toml", encoding="utf-8") as file:
+        return re.search(r'^version = "(.+)"', file.read(), re.MULTILINE).group(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=30, help="concurrent users")
+    parser.add_argument(
+        "--iterations", type=int, default=3, help="annotation flows per user"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=60.0, help="audio duration, in seconds"
+    )
+    parser.add_argument(
+        "--ramp-up", type=float, default=10.0, help="seconds to start all users"
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=1.0, help="seconds between user events"
+    )
+    parser.add_argument("--stub", action="store_true", help="use a stub pipeline")
+    parser.add_argument(
+        "--stub-rtf",
+        type=float,
+        default=0.05,
+        help="seconds of stub inference per second of audio",
+    )
+    parser.add_argument("--port", type=int, default=7860, help="server port")
+    parser.add_argument(
+        "--url", default=None, help="URL of a running server, instead of starting one"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="output file. Default to benchmarks/results/load-<version>-<revision>.json",
+    )
+    parser.add_argument("--serve-stub", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_stub:
+        return serve_stub(args.port, args.stub_rtf)
+
+    server = None
+    url = args.url or f"http://127.0.0.1:{args.port}/"
+    if args.url is None:
+        server = start_server(args.port, args.stub, args.stub_rtf)
+
+    # lists are only appended to, which is thread-safe
+    results = {event: {"latencies": [], "errors": []} for event in EVENTS + ["connect"]}
+    try:
+        wait_for_server(url, server, timeout=300)
+        sampler = ProcessSampler(server.pid) if server is not None else None
+        with tempfile.TemporaryDirectory() as tmp:
+            audio = make_audio(Path(tmp) / "load.wav", args.duration)
+            if sampler is not None:
+                sampler.start()
+            start = time.perf_counter()
+            threads = [
+                threading.Thread(
+                    target=run_annotator,
+                    args=(url, audio, args, results, args.ramp_up * i / args.users),
+                )
+                for i in range(args.users)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        server_usage = sampler.stop() if sampler is not None else {}
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    events = summarize(results)
+    for event, summary in events.items():
+        if "p50" in summary:
+            print(
+                f"{event:<10} count={summary['count']:<5} errors={summary['errors']:<4} "
+                f"p50={summary['p50']:.3f}s p95={summary['p95']:.3f}s "
+                f"p99={summary['p99']:.3f}s"
+            )
+        elif summary["errors"]:
+            print(f"{event:<10} errors={summary['errors']}")
+    if server_usage:
+        print(
+            f"server     cpu={server_usage['cpu_mean']:.0f}% (max "
+            f"{server_usage['cpu_max']:.0f}%) rss={server_usage['rss_max'] / 2**20:.0f}MiB"
+        )
+
+    version, revision = get_version(), get_revision()
+    output = args.output or (
+        ROOT / "benchmarks" / "results" / f"load-{version}-{revision or 'unknown'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "version": version,
+                "revision": revision,
+                "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "processor": platform.processor(),
+                "cpu_count": os.cpu_count(),
+                "config": {
+                    "users": args.users,
+                    "iterations": args.iterations,
+                    "duration": args.duration,
+                    "ramp_up": args.ramp_up,
+                    "think_time": args.think_time,
+                    "stub": args.stub,
+                    "stub_rtf": args.stub_rtf if args.stub else None,
+                },
+                "elapsed": elapsed,
+                "flows_per_minute": 60 * events["download"]["count"] / elapsed,
+                "events": events,
+                "server": server_usage,
+            },
+            file,
+            indent=2,
+        )
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,25 @@
 import gradio as gr
-from gryannote_audio import AudioLabeling
-from gryannote_pipeline import PipelineSelector
-from gryannote_rttm import RTTM
+from gryannote_audio import AudioLabeling, ExportItem, cache_manager, exporter
+from gryannote_pipeline import (
+    OnlineDiarization,
+    PipelineExecutor,
+    PipelineSelector,
+    PostProcessing,
+)
+from gryannote_rttm import RTTM, EditComparison
 from pyannote.audio import Pipeline
 
 
-def apply_pipeline(pipeline: Pipeline, audio):
+async def apply_pipeline(pipeline: Pipeline, audio):
     """Apply specified pipeline on the indicated audio file"""
     try:
-        annotations = pipeline(audio)
+        annotations = await pipeline_selector.run_async(audio, pipeline=pipeline)
     except (ValueError, RuntimeError) as e:
         raise gr.Error(f"An error occurred while processing audio: {e}")
 
-    return ((audio, annotations), annotations)
+    exporter.add(ExportItem(audio["uri"], annotations, audio=audio["audio"]))
+    # edits are compared with the pipeline output as they are made
+    return ((audio, annotations), annotations, EditComparison(annotations))
 
 
 with gr.Blocks() as demo:
@@ -20,8 +27,13 @@ with gr.Blocks() as demo:
         "[Gryannote](): The [pyannote](https://github.com/pyannote/pyannote-audio) audio labeling tool"
     )
 
+    # one run at a time, other users wait in a bounded queue
+    executor = PipelineExecutor(max_concurrency=1, max_queue_size=8)
     pipeline_selector = PipelineSelector(
-        default_pipeline="pyannote/speaker-diarization-3.1"
+        default_pipeline="pyannote/speaker-diarization-3.1",
+        executor=executor,
+        # fragmented turns of a speaker are merged before reaching the UI
+        postprocessing=PostProcessing(max_gap=0.25),
     )
     pipeline_selector.select(
         fn=pipeline_selector.on_select,
@@ -37,8 +49,9 @@ with gr.Blocks() as demo:
         preprocess=False,
         postprocess=False,
     )
+    # audio is decoded and resampled once, and passed as is to the pipeline
     audio_labeling = AudioLabeling(
-        type="filepath",
+        type="pipeline",
         interactive=True,
     )
 
@@ -59,12 +72,103 @@ with gr.Blocks() as demo:
         postprocess=False,
     )
 
+    comparison = gr.State()
+    edit_report = gr.JSON(label="Edits")
+    audio_labeling.edit(
+        fn=lambda comparison, value: comparison.update(value) if comparison else None,
+        inputs=[comparison, audio_labeling],
+        outputs=edit_report,
+        preprocess=False,
+    )
+
     run_btn.click(
         fn=apply_pipeline,
         inputs=[pipeline_selector, audio_labeling],
-        outputs=[audio_labeling, rttm],
+        outputs=[audio_labeling, rttm, comparison],
+    )
+
+    with gr.Accordion("Bulk operations", open=False):
+        # e.g. merging speakers or dropping short segments, applied on the server
+        operations = gr.Code(
+            value='[{"operation": "fill_gaps", "max_gap": 0.5}]',
+            language="json",
+            label="Operations",
+        )
+        apply_btn = gr.Button("Apply")
+        apply_btn.click(
+            fn=audio_labeling.apply_operations,
+            inputs=[audio_labeling, operations],
+            outputs=audio_labeling,
+            preprocess=False,
+        ).then(
+            fn=rttm.on_edit,
+            inputs=audio_labeling,
+            outputs=rttm,
+            preprocess=False,
+            postprocess=False,
+        )
+
+    with gr.Accordion("Listen to a speaker", open=False):
+        # turns of a speaker are played back-to-back, decoded by seeking
+        speaker = gr.Textbox(label="Speaker")
+        listen_btn = gr.Button("Listen")
+        montage = AudioLabeling(streaming=True, interactive=False)
+        listen_btn.click(
+            fn=audio_labeling.montage,
+            inputs=[audio_labeling, speaker],
+            outputs=montage,
+            preprocess=False,
+        )
+
+    with gr.Accordion("Live diarization", open=False):
+        # microphone stream is diarized while recording
+        online = OnlineDiarization(pipeline_selector)
+        online_state = gr.State()
+        microphone = AudioLabeling(
+            sources=["microphone"], streaming=True, type="numpy", interactive=True
+        )
+        live = AudioLabeling(interactive=False)
+        microphone.stream(
+            fn=online.step,
+            inputs=[microphone, online_state, pipeline_selector],
+            outputs=[online_state, live],
+            stream_every=0.5,
+        )
+        microphone.stop_recording(
+            fn=online.finish,
+            inputs=online_state,
+            outputs=[online_state, live, rttm],
+        )
+
+    with gr.Row():
+        export_btn = gr.Button("Export session")
+        export_link = gr.Markdown()
+    # archive is streamed to the client when the link is followed
+    export_btn.click(
+        fn=lambda: f"[Download archive]({exporter.link(include_audio=True)})",
+        outputs=export_link,
     )
 
+    # files referenced by a session are kept in cache until the session ends
+    cache_manager.install(demo)
+    # runs of a session are cancelled when the session ends
+    executor.install(demo)
+    exporter.install(demo)
+    # annotations paged by the server are forgotten when their session ends
+    live.install(demo)
+    # recordings are closed when their session ends while streaming
+    online.install(demo)
+
 
 if __name__ == "__main__":
-    demo.launch()
+    import os
+
+    import uvicorn
+    from fastapi import FastAPI
+
+    # exports are served by their own route, next to the demo
+    app = exporter.add_route(FastAPI())
+    # downloads of cached files by browsers delay their eviction
+    app = cache_manager.add_middleware(app)
+    app = gr.mount_gradio_app(app, demo, path="/")
+    uvicorn.run(app, port=int(os.environ.get("GRADIO_SERVER_PORT", 7860)))
@@ -20,16 +20,123 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+"""gryannote: Gradio custom components for diarization-based audio annotation.
+
+Components are loaded lazily (PEP 562): importing `gryannote` does not import
+heavy dependencies (torch, pyannote.audio...) until a component that needs
+them is accessed.
+"""
+
+import importlib
+import importlib.abc
+import importlib.machinery
+import importlib.util
 import sys
 
-from gryannote.audio.backend.gryannote_audio import *
-from gryannote.pipeline.backend.gryannote_pipeline import *
-from gryannote.rttm.backend.gryannote_rttm import *
+# top-level name of each component package => its actual location in this repository
+_PACKAGES = {
+    "gryannote_audio": "gryannote.audio.backend.gryannote_audio",
+    "gryannote_pipeline": "gryannote.pipeline.backend.gryannote_pipeline",
+    "gryannote_rttm": "gryannote.rttm.backend.gryannote_rttm",
+}
+
+# public name => package exporting it
+_EXPORTS = {
+    "AudioLabeling": "gryannote_audio",
+    "AnnotadedAudioData": "gryannote_audio",
+    "Annotation": "gryannote_audio",
+    "SpeakerTable": "gryannote_audio",
+    "AudioHandle": "gryannote_audio",
+    "Corpus": "gryannote_audio",
+    "ExportItem": "gryannote_audio",
+    "Exporter": "gryannote_audio",
+    "exporter": "gryannote_audio",
+    "Player": "gryannote_audio",
+    "add_metrics_route": "gryannote_audio",
+    "apply_operations": "gryannote_audio",
+    "cache_manager": "gryannote_audio",
+    "metrics": "gryannote_audio",
+    "TranscoderPool": "gryannote_audio",
+    "transcoder": "gryannote_audio",
+    "PipelineSelector": "gryannote_pipeline",
+    "InferenceOptions": "gryannote_pipeline",
+    "MicroBatching": "gryannote_pipeline",
+    "CPUBackend": "gryannote_pipeline",
+    "PostProcessing": "gryannote_pipeline",
+    "PipelineExecutor": "gryannote_pipeline",
+    "InferenceWorkers": "gryannote_pipeline",
+    "OnlineDiarization": "gryannote_pipeline",
+    "PipelineRegistry": "gryannote_pipeline",
+    "ParameterSweep": "gryannote_pipeline",
+    "SweepResult": "gryannote_pipeline",
+    "RTTM": "gryannote_rttm",
+    "EditComparison": "gryannote_rttm",
+}
+
+__all__ = list(_EXPORTS)
+
+
+class _AliasFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """Make `gryannote_*` packages (and their submodules) importable under their
+    top-level name, as when they are installed, without importing them eagerly.
+    Aliases share module objects with the actual modules, so that e.g.
+    `gryannote_audio.core` and `gryannote.audio.backend.gryannote_audio.core`
+    are the same module."""
+
+    def _resolve(self, fullname: str) -> str | None:
+        package, _, submodule = fullname.partition(".")
+        if package not in _PACKAGES:
+            return None
+
+        if submodule:
+            # only alias submodules of packages aliased by this finder
+            if sys.modules.get(package) is not sys.modules.get(_PACKAGES[package]):
+                return None
+            return f"{_PACKAGES[package]}.{submodule}"
+
+        # installed packages take precedence
+        if importlib.machinery.PathFinder.find_spec(package) is not None:
+            return None
+        return _PACKAGES[package]
+
+    def find_spec(self, fullname, path, target=None):
+        if self._resolve(fullname) is None:
+            return None
+        return importlib.util.spec_from_loader(fullname, self)
+
+    def create_module(self, spec):
+        module = importlib.import_module(self._resolve(spec.name))
+        self._alias_submodules(spec.name.partition(".")[0])
+        return module
+
+    def _alias_submodules(self, package: str):
+        """Alias submodules already imported under their actual name. Otherwise,
+        importing them under their alias would (re)bind them as attributes of their
+        package, shadowing attributes of the same name (e.g. `gryannote_audio.metrics`
+        registry)."""
+        actual = _PACKAGES[package]
+        for name, module in list(sys.modules.items()):
+            if name.startswith(f"{actual}."):
+                sys.modules.setdefault(f"{package}{name[len(actual):]}", module)
+
+    def exec_module(self, module):
+        # actual module has already been executed by `create_module`
+        pass
+
+
+# must come first, so that submodules of aliased packages are not imported twice
+if not any(isinstance(finder, _AliasFinder) for finder in sys.meta_path):
+    sys.meta_path.insert(0, _AliasFinder())
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    # cache attribute so that __getattr__ is not called again
+    globals()[name] = value
+    return value
 
-__import__("pkg_resources").declare_namespace(__name__)
 
-sys.modules["gryannote_audio"] = sys.modules["gryannote.audio.backend.gryannote_audio"]
-sys.modules["gryannote_pipeline"] = sys.modules[
-    "gryannote.pipeline.backend.gryannote_pipeline"
-]
-sys.modules["gryannote_rttm"] = sys.modules["gryannote.rttm.backend.gryannote_rttm"]
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,4 +1,58 @@
-from .audio_labeling import AudioLabeling, Player
-from .core import AnnotadedAudioData, Annotation
+import importlib
 
-__all__ = ["AudioLabeling", "AnnotadedAudioData", "Annotation", "Player"]
+# the `metrics` registry shadows its (lightweight) module, hence is imported eagerly:
+# once imported, the `metrics` module would be returned instead of the registry
+from .metrics import add_metrics_route, metrics
+
+# public name => module defining it. Modules are imported on first access (PEP 562)
+_EXPORTS = {
+    "AudioLabeling": ".audio_labeling",
+    "Player": ".audio_labeling",
+    "AnnotadedAudioData": ".core",
+    "AudioHandle": ".handle",
+    "CacheManager": ".cache",
+    "cache_manager": ".cache",
+    "Corpus": ".corpus",
+    "CorpusItem": ".corpus",
+    "ExportItem": ".export",
+    "Exporter": ".export",
+    "exporter": ".export",
+    "Annotation": ".core",
+    "apply_operations": ".operations",
+    "SpeakerTable": ".core",
+    "TranscoderPool": ".transcoding",
+    "transcoder": ".transcoding",
+}
+
+__all__ = [
+    "AudioLabeling",
+    "AnnotadedAudioData",
+    "Annotation",
+    "AudioHandle",
+    "CacheManager",
+    "Corpus",
+    "CorpusItem",
+    "ExportItem",
+    "Exporter",
+    "Player",
+    "SpeakerTable",
+    "TranscoderPool",
+    "add_metrics_route",
+    "apply_operations",
+    "cache_manager",
+    "exporter",
+    "metrics",
+    "transcoder",
+]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,28 +1,55 @@
 """gryannote_audio.AudioLabeling() component."""
 
 import dataclasses
+import secrets
+import threading
 import warnings
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Callable, Literal, Tuple
-
-import httpx
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Literal,
+    Mapping,
+    Sequence,
+    Tuple,
+)
+
+import anyio
 import numpy as np
-import torch
-import torchaudio
 from gradio import Warning, processing_utils, utils
-from gradio.components.base import Component, StreamingInput, StreamingOutput
-from gradio.data_classes import FileData
+from gradio.components.base import (
+    Component,
+    StreamingInput,
+    StreamingOutput,
+    server,
+)
+from gradio.data_classes import FileData, FileDataDict, MediaStreamChunk
 from gradio.events import Events
 from gradio.exceptions import Error
 from gradio_client import utils as client_utils
 from gradio_client.documentation import document, set_documentation_group
-from pydub import AudioSegment
 from pyannote.core import Annotation as PyannoteAnnotation
 
-from .core import AnnotadedAudioData
+from .cache import cache_manager, get_session, install_session
+from .core import AnnotadedAudioData, Annotation, SpeakerTable
+from .encoding import save_audio, save_bytes, write_audio
+from .handle import AudioHandle
+from .index import SegmentIndex
+from .metrics import file_size, metrics
+from .montage import iter_montage, merge_segments
+from .operations import apply_operations, to_annotations
+from .transcoding import transcoder
 
 set_documentation_group("component")
 
+# maximum number of paged annotation sets kept in memory by a component, per session
+MAX_SEGMENT_INDEXES = 16
+
 
 @dataclasses.dataclass
 class WaveformOptions:
@@ -139,7 +166,8 @@ class AudioLabeling(
         video: str | Path | None = None,
         annotations: PyannoteAnnotation | None = None,
         sources: list[Literal["upload", "microphone"]] | str | None = None,
-        type: Literal["numpy", "filepath"] = "numpy",
+        type: Literal["numpy", "filepath", "pipeline", "lazy"] = "numpy",
+        pipeline_sample_rate: int = 16000,
         label: str | None = None,
         every: float | None = None,
         show_label: bool | None = None,
@@ -152,13 +180,14 @@ class AudioLabeling(
         elem_id: str | None = None,
         elem_classes: list[str] | str | None = None,
         render: bool = True,
-        format: Literal["wav", "mp3"] = "wav",
+        format: Literal["wav", "flac", "mp3"] = "wav",
         autoplay: bool = False,
         show_download_button=True,
         show_share_button: bool | None = None,
         show_minimap: bool = True,
         min_length: int | None = None,
         max_length: int | None = None,
+        paging_threshold: int | None = 10_000,
         waveform_options: WaveformOptions | dict | None = None,
         timeline_options: TimelineOptions | dict | None = None,
         hover_options: HoverOptions | dict | None = None,
@@ -170,7 +199,8 @@ class AudioLabeling(
             video: Init the `AudioLabeling` component with this video. Note: ignored if `audio` is not `None`
             annotations: Init the `AudioLabeling` with these annotations. Can be specified only if audio was set with the corresponding audio or video.
             sources: A list of sources permitted for audio. "upload" creates a box where user can drop an audio file, "microphone" creates a microphone input. The first element in the list will be used as the default source. If None, defaults to ["upload", "microphone"], or ["microphone"] if `streaming` is True.
-            type: The format the audio file is converted to before being passed into the prediction function. "numpy" converts the audio to a tuple consisting of: (int sample rate, numpy.array for the data), "filepath" passes a str path to a temporary file containing the audio.
+            type: The format the audio file is converted to before being passed into the prediction function. "numpy" converts the audio to a tuple consisting of: (int sample rate, numpy.array for the data), "filepath" passes a str path to a temporary file containing the audio, "pipeline" passes a {"waveform": torch.Tensor, "sample_rate": int, "uri": str, "audio": str} mapping that pyannote pipelines accept as is: the audio is decoded once, downmixed to mono and resampled to `pipeline_sample_rate`, and the result is cached by file content, "lazy" passes an `AudioHandle` that only decodes the requested excerpts of the audio (see `AudioHandle.crop` and `AudioHandle.chunks`), for memory bounded processing of long recordings.
+            pipeline_sample_rate: The sample rate (in Hz) of the waveform passed to the prediction function when `type` is "pipeline". Should match the sample rate of the pipeline's models. Default is 16000.
             label: The label for this component. Appears above the component and is also used as the header if there are a table of examples for this component. If None and used in a `gr.Interface`, the label will be the name of the parameter this component is assigned to.
             every: If `value` is a callable, run the function 'every' number of seconds while the client connection is open. Has no effect otherwise. Queue must be enabled. The event can be accessed (e.g. to cancel it) via this component's .load_event attribute.
             show_label: if True, will display label.
@@ -183,13 +213,14 @@ class AudioLabeling(
             elem_id: An optional string that is assigned as the id of this component in the HTML DOM. Can be used for targeting CSS styles.
             elem_classes: An optional list of strings that are assigned as the classes of this component in the HTML DOM. Can be used for targeting CSS styles.
             render: If False, component will not render be rendered in the Blocks context. Should be used if the intention is to assign event listeners now but render the component later.
-            format: The file format to save audio files. Either 'wav' or 'mp3'. wav files are lossless but will tend to be larger files. mp3 files tend to be smaller. Default is wav. Applies both when this component is used as an input (when `type` is "format") and when this component is used as an output.
+            format: The file format to save audio files. Either 'wav', 'flac' or 'mp3'. wav and flac files are lossless, and are written directly without external encoder, flac files being smaller than wav files. mp3 files tend to be smaller, but are encoded with ffmpeg. Default is wav. Applies both when this component is used as an input (when `type` is "format") and when this component is used as an output.
             autoplay: Whether to automatically play the audio when the component is used as an output. Note: browsers will not autoplay audio files if the user has not interacted with the page yet.
             show_download_button: If True, will show a download button in the corner of the component for saving audio. If False, icon does not appear.
             show_share_button: If True, will show a share icon in the corner of the component that allows user to share outputs to Hugging Face Spaces Discussions. If False, icon does not appear. If set to None (default behavior), then the icon appears if this Gradio app is launched on Spaces, but not otherwise.
             show_minimap: Whether to show audio minimap on the player. Default to True.
             min_length: The minimum length of audio (in seconds) that the user can pass into the prediction function. If None, there is no minimum length.
             max_length: The maximum length of audio (in seconds) that the user can pass into the prediction function. If None, there is no maximum length.
+            paging_threshold: When the component is not interactive, annotations with more segments than this are not sent to the browser at once: they are indexed on the server, and the browser only fetches segments overlapping the visible part of the waveform (at most `paging_threshold`, longest first). If None, all annotations are always sent.
             waveform_options: A dictionary of options for the waveform display. Options include: waveform_color (str), waveform_progress_color (str), show_controls (bool), skip_length (int). Default is None, which uses the default values for these options.
             timeline_options:
                 A dictionary of options for the timeline display.
@@ -219,12 +250,13 @@ class AudioLabeling(
                     f"`sources` must a list consisting of elements in {valid_sources}"
                 )
 
-        valid_types = ["numpy", "filepath"]
+        valid_types = ["numpy", "filepath", "pipeline", "lazy"]
         if type not in valid_types:
             raise ValueError(
                 f"Invalid value for parameter `type`: {type}. Please choose from one of: {valid_types}"
             )
         self.type = type
+        self.pipeline_sample_rate = pipeline_sample_rate
 
         self.streaming = streaming
         if self.streaming and "microphone" not in self.sources:
@@ -282,6 +314,12 @@ class AudioLabeling(
         self.min_length = min_length
         self.max_length = max_length
 
+        self.paging_threshold = paging_threshold
+        # paged annotations of each session, in least recently used order
+        self._segment_indexes: Dict[Hashable, OrderedDict[str, SegmentIndex]] = {}
+        self._segment_index_sessions: Dict[str, Hashable] = {}
+        self._segment_indexes_lock = threading.Lock()
+
         super().__init__(
             label=label,
             every=every,
@@ -299,7 +337,7 @@ class AudioLabeling(
 
     def example_inputs(self) -> Any:
         return "https://github.com/gradio-app/gradio/raw/main/test/test_files/audio_sample.wav"
-    
+
     def process_example(
         self, value: Tuple[int, np.ndarray] | str | Path | bytes | None
     ) -> str:
@@ -311,10 +349,18 @@ class AudioLabeling(
 
     def preprocess(
         self, payload: AnnotadedAudioData | None
-    ) -> Tuple[int, np.ndarray] | str | None:
+    ) -> Tuple[int, np.ndarray] | str | Dict | AudioHandle | None:
         if payload is None:
             return payload
 
+        with metrics.measure(
+            "audio.preprocess", size=file_size(payload.file_data.path)
+        ):
+            return self._preprocess(payload)
+
+    def _preprocess(
+        self, payload: AnnotadedAudioData
+    ) -> Tuple[int, np.ndarray] | str | Dict | AudioHandle | None:
         file_data = payload.file_data
 
         assert file_data.path
@@ -325,48 +371,70 @@ class AudioLabeling(
             temp_file_path.with_name(f"{temp_file_path.stem}{temp_file_path.suffix}")
         )
 
-        if file_data.mime_type and "video" in file_data.mime_type:
-            # extract audio from video and temporary save it into the cache
-            data, sample_rate = torchaudio.load(temp_file_path)
-            # save in cache is needed to avoid conversion issue(s) in the rest of the method
-            torchaudio.save(temp_file_path, data, sample_rate)
+        if self.type == "pipeline":
+            from .decoding import load_for_pipeline
 
-        sample_rate, data = processing_utils.audio_from_file(temp_file_path)
+            # decode (even from video) and resample once, for pyannote pipelines
+            file = load_for_pipeline(temp_file_path, self.pipeline_sample_rate)
+            self._check_duration(file["waveform"].shape[1] / file["sample_rate"])
+            return file
 
-        duration = len(data) / sample_rate
-        if self.min_length is not None and duration < self.min_length:
-            raise Error(
-                f"Audio is too short, and must be at least {self.min_length} seconds"
-            )
-        if self.max_length is not None and duration > self.max_length:
-            raise Error(
-                f"Audio is too long, and must be at most {self.max_length} seconds"
-            )
+        if self.type == "lazy":
+            # audio is decoded on demand, by seeking into the file
+            try:
+                handle = AudioHandle(temp_file_path)
+            except ValueError:
+                # e.g. video: audio is converted once (streamed by ffmpeg) to flac,
+                # which can be seeked into
+                flac_path = temp_file_path.with_name(f"{temp_file_path.stem}-lazy.flac")
+                transcoder.convert(temp_file_path, flac_path, "flac")
+                handle = AudioHandle(cache_manager.track(flac_path))
+            self._check_duration(handle.duration)
+            return handle
+
+        # decode (even from video) by ffmpeg, within the limits of the transcoder pool
+        sample_rate, data = transcoder.decode(temp_file_path)
+
+        self._check_duration(len(data) / sample_rate)
 
         if self.type == "numpy":
             return (sample_rate, data)
         elif self.type == "filepath":
             output_file = str(Path(output_file_name).with_suffix(f".{self.format}"))
-            processing_utils.audio_to_file(
-                sample_rate, data, output_file, format=self.format
-            )
-            return output_file
+            write_audio(output_file, data, sample_rate, self.format)
+            return cache_manager.track(output_file)
         else:
             raise ValueError(
                 "Unknown type: "
                 + str(self.type)
-                + ". Please choose from: 'numpy', 'filepath'."
+                + ". Please choose from: 'numpy', 'filepath', 'pipeline', 'lazy'."
+            )
+
+    def _check_duration(self, duration: float):
+        if self.min_length is not None and duration < self.min_length:
+            raise Error(
+                f"Audio is too short, and must be at least {self.min_length} seconds"
+            )
+        if self.max_length is not None and duration > self.max_length:
+            raise Error(
+                f"Audio is too long, and must be at most {self.max_length} seconds"
             )
 
     def postprocess(
-        self, value: Tuple[str | Path | Tuple[int, np.ndarray], PyannoteAnnotation]
+        self,
+        value: (
+            Tuple[str | Path | Tuple[int, np.ndarray], PyannoteAnnotation]
+            | AnnotadedAudioData
+        ),
     ) -> AnnotadedAudioData | None:
         """
         Parameters:
             value: a tuble containing two elements :
                 - an audio file representing the audio downloaded by the user. The audio file can
-                be a file path (Path or str) or a tuple of (sample_rate, data).
+                be a file path (Path or str), a tuple of (sample_rate, data) or a mapping as
+                returned by preprocess when `type` is "pipeline", or an `AudioHandle`.
                 - a pyannote Annotation object containing annotation provided by the pipeline
+            or an already prepared audio data object (e.g. as returned by `Corpus.value`).
         Returns:
             an audio data object. This object contains file data and a list of diarization annotations
         """
@@ -374,29 +442,39 @@ class AudioLabeling(
         if value is None:
             return None
 
+        if isinstance(value, AnnotadedAudioData):
+            if self._is_paged(value.annotations):
+                return self._page_annotations(value, value.annotations)
+            return value
+
         audio, annotations = value
 
         # postprocess audio
         if isinstance(audio, bytes):
             if self.streaming:
-                return value
+                # chunk of a stream, converted by `stream_output`
+                return audio
             audio_path = Path(
-                processing_utils.save_bytes_to_cache(
-                    audio, "audio", cache_dir=self.GRADIO_CACHE
-                )
+                cache_manager.track(save_bytes(audio, "audio", self.GRADIO_CACHE))
             )
             orig_name = audio_path.name
 
         elif isinstance(audio, Tuple):
             sample_rate, data = audio
+            # identical samples are only encoded once
             audio_path = Path(
-                processing_utils.save_audio_to_cache(
-                    data, sample_rate, format=self.format, cache_dir=self.GRADIO_CACHE
+                cache_manager.track(
+                    save_audio(data, sample_rate, self.format, self.GRADIO_CACHE)
                 )
             )
             orig_name = audio_path.name
 
         else:
+            if isinstance(audio, Mapping) and "audio" in audio:
+                # mapping returned by preprocess with "pipeline" type
+                audio = audio["audio"]
+            elif isinstance(audio, AudioHandle):
+                audio = audio.path
             if not isinstance(audio, (str, Path)):
                 raise ValueError(f"Cannot process {audio} as FileData")
             audio_path = Path(audio)
@@ -404,13 +482,275 @@ class AudioLabeling(
 
         file_data = FileData(path=str(audio_path), orig_name=orig_name)
 
+        if self._is_paged(annotations):
+            return self._page_annotations(
+                AnnotadedAudioData(file_data=file_data), annotations
+            )
         return AnnotadedAudioData(file_data=file_data, annotations=annotations)
 
+    def _is_paged(
+        self, annotations: PyannoteAnnotation | List | SegmentIndex | None
+    ) -> bool:
+        # edited annotations are sent back as a whole, hence are never paged
+        return (
+            self.paging_threshold is not None
+            and self.interactive is False
+            and annotations is not None
+            and len(annotations) > self.paging_threshold
+        )
+
+    def _page_annotations(
+        self,
+        data: AnnotadedAudioData,
+        annotations: PyannoteAnnotation | List | SegmentIndex,
+    ) -> AnnotadedAudioData:
+        """Index `annotations` on the server, and send none of them with `data`"""
+        if isinstance(annotations, SegmentIndex):
+            index = annotations
+        else:
+            with metrics.measure("annotations.index", count=len(annotations)):
+                index = SegmentIndex.from_annotations(annotations)
+
+        from gradio.context import LocalContext
+
+        session = get_session()
+        # initial values are shared by all sessions, but values of events are not:
+        # their indexes would be shared by all sessions, and never released
+        if session is None and LocalContext.blocks.get() is not None:
+            raise RuntimeError(
+                "Paged annotations are kept per session: call "
+                "`audio_labeling.install(demo)`, or disable paging with "
+                "`paging_threshold=None`"
+            )
+
+        annotations_id = secrets.token_urlsafe(16)
+        with self._segment_indexes_lock:
+            indexes = self._segment_indexes.setdefault(session, OrderedDict())
+            indexes[annotations_id] = index
+            self._segment_index_sessions[annotations_id] = session
+            while len(indexes) > MAX_SEGMENT_INDEXES:
+                evicted, _ = indexes.popitem(last=False)
+                del self._segment_index_sessions[evicted]
+
+        return data.model_copy(
+            update={
+                "annotations": [],
+                "annotations_id": annotations_id,
+                # speakers of all pages, so that they keep the same color
+                "speakers": data.speakers
+                or SpeakerTable.from_labels(index.labels.tolist()),
+            }
+        )
+
+    @server
+    def fetch_annotations(self, query: Dict) -> List[Dict]:
+        """
+        Called by the frontend with the visible time range of the waveform, when
+        annotations are paged (see `paging_threshold`).
+
+        Parameters:
+            query: {"annotations_id": str, "start": float, "end": float} mapping
+        Returns:
+            annotations overlapping [start, end]
+        Raises:
+            Error: if annotations are not indexed anymore (e.g. their session ended),
+                so that the frontend shows it instead of an empty waveform.
+        """
+        index = self._find_segment_index(query["annotations_id"])
+        if index is None:
+            raise Error("These annotations have expired, please load them again")
+
+        with metrics.measure("annotations.fetch") as measure:
+            annotations = index.annotations(
+                float(query["start"]),
+                float(query["end"]),
+                limit=self.paging_threshold,
+            )
+            measure.count = len(annotations)
+        return annotations
+
+    def _find_segment_index(self, annotations_id: str | None) -> SegmentIndex | None:
+        """Paged annotations with this id, marked as recently used"""
+        with self._segment_indexes_lock:
+            if annotations_id not in self._segment_index_sessions:
+                return None
+            indexes = self._segment_indexes[
+                self._segment_index_sessions[annotations_id]
+            ]
+            indexes.move_to_end(annotations_id)
+            return indexes[annotations_id]
+
+    def release(self, session: Hashable):
+        """Forget paged annotations of `session`"""
+        with self._segment_indexes_lock:
+            for annotations_id in self._segment_indexes.pop(session, {}):
+                del self._segment_index_sessions[annotations_id]
+
+    def install(self, demo):
+        """Keep paged annotations per session of `demo`, and forget them when the
+        session ends"""
+        import gradio as gr
+
+        install_session(demo)
+
+        def release_session(request: gr.Request):
+            self.release(request.session_hash)
+
+        demo.unload(release_session)
+        return demo
+
+    def _get_segment_index(self, value: Dict) -> SegmentIndex:
+        """Segments of a serialized value, paged or not"""
+        index = self._find_segment_index(value.get("annotations_id"))
+        if index is None:
+            index = SegmentIndex.from_annotations(
+                [Annotation(**a) for a in value.get("annotations") or []]
+            )
+        return index
+
+    def apply_operations(
+        self,
+        value: AnnotadedAudioData | Dict | None,
+        operations: Sequence[Mapping] | str,
+    ) -> AnnotadedAudioData:
+        """
+        Apply bulk operations (merging or renaming speakers, dropping short segments,
+        filling short gaps, shifting...) on the annotations of this component. They are
+        applied on the server, in one pass, and updated annotations are sent back in a
+        single payload.
+
+        Parameters:
+            value: value of this component, e.g. as an event input with `preprocess=False`.
+            operations: operations applied in order (see `operations.apply_operations`),
+                as mappings or a JSON list of objects, e.g.
+                [{"operation": "drop_short", "min_duration": 0.2}]
+        Returns:
+            value with updated annotations
+
+        Usage:
+            apply_btn.click(
+                audio_labeling.apply_operations,
+                inputs=[audio_labeling, operations_textbox],
+                outputs=audio_labeling,
+                preprocess=False,
+            )
+        """
+        if not value:
+            raise Error("Please load an audio first")
+        if isinstance(value, AnnotadedAudioData):
+            value = value.model_dump()
+
+        try:
+            index = apply_operations(self._get_segment_index(value), operations)
+        except ValueError as e:
+            raise Error(f"Cannot apply operations: {e}") from e
+
+        # colors are assigned by position in the speaker table: previous speakers keep
+        # theirs (even when removed), new ones come last
+        speakers = value.get("speakers") or {}
+        previous = speakers.get("labels") or [
+            annotation["speaker"] for annotation in value.get("annotations") or []
+        ]
+        speakers = SpeakerTable.from_labels(
+            previous + index.labels.tolist(), palette=speakers.get("palette")
+        )
+
+        data = AnnotadedAudioData(
+            file_data=FileData(**value["file_data"]),
+            peaks=value.get("peaks"),
+            duration=value.get("duration"),
+            speakers=speakers,
+        )
+        if self._is_paged(index):
+            return self._page_annotations(data, index)
+        with metrics.measure("annotations.prepare", count=len(index)):
+            return data.model_copy(update={"annotations": to_annotations(index)})
+
+    def montage(
+        self,
+        value: AnnotadedAudioData | Dict | None,
+        speaker: str | None = None,
+        segments: List | PyannoteAnnotation | None = None,
+        gap: float = 0.25,
+    ) -> Iterator[Tuple[bytes, None]]:
+        """
+        Play segments of the current annotations back-to-back (e.g. all turns of a
+        speaker, to check its label) in an `AudioLabeling` output with `streaming=True`.
+        Only these segments are decoded, by seeking into the audio file, so that the
+        montage starts right away even for a speaker spread across a long file.
+
+        Parameters:
+            value: value of this component, e.g. as an event input with `preprocess=False`.
+            speaker: speaker whose segments are played. Default (or empty) to all segments.
+            segments: segments to play instead of the annotations of `value`, as (start,
+                end) tuples, `Annotation` objects or a pyannote Annotation.
+            gap: silence between two segments, in seconds.
+        Yields:
+            wav chunks of the montage, streamed to the client by `stream_output`.
+
+        Usage:
+            player = AudioLabeling(streaming=True, interactive=False)
+            listen_btn.click(
+                audio_labeling.montage,
+                inputs=[audio_labeling, speaker],
+                outputs=player,
+                preprocess=False,
+            )
+        """
+        if not value:
+            raise Error("Please load an audio first")
+        if isinstance(value, AnnotadedAudioData):
+            value = value.model_dump()
+        # without preprocessing, the path comes as is from the client: only files
+        # uploaded or sent by Gradio are played
+        path = Path(value["file_data"]["path"]).resolve()
+        if not any(
+            utils.is_in_or_equal(path, folder)
+            for folder in [self.GRADIO_CACHE, utils.get_upload_folder()]
+        ):
+            raise Error("This audio cannot be played")
+
+        if segments is None:
+            index = self._get_segment_index(value)
+        else:
+            index = SegmentIndex.from_annotations(
+                segments
+                if isinstance(segments, PyannoteAnnotation)
+                else [
+                    (
+                        segment
+                        if isinstance(segment, Annotation)
+                        else Annotation(start=segment[0], end=segment[1], speaker="")
+                    )
+                    for segment in segments
+                ]
+            )
+
+        mask = np.ones(len(index), dtype=bool)
+        if speaker:
+            mask = index.labels[index.codes] == speaker
+        if not mask.any():
+            raise Error(f"No segment of {speaker or 'any speaker'} to play")
+
+        merged = merge_segments(index.starts[mask], index.ends[mask])
+        with metrics.measure("audio.montage", count=len(merged)) as measure:
+            measure.size = 0
+            try:
+                for chunk in iter_montage(path, merged, gap=gap):
+                    measure.size += len(chunk)
+                    yield chunk, None
+            except ValueError as e:
+                raise Error(
+                    "The format of this audio cannot be played by excerpts"
+                ) from e
+
     def load_annotations(
         self,
-        audio: str | Path | Tuple[int, np.ndarray],
+        audio: str | Path | Tuple[int, np.ndarray] | Dict | AudioHandle,
         annotations: PyannoteAnnotation,
-    ) -> Tuple[str, PyannoteAnnotation]:
+    ) -> Tuple[
+        str | Path | Tuple[int, np.ndarray] | Dict | AudioHandle, PyannoteAnnotation
+    ]:
         """Callback for the upload event from the RTTM component. Used to load RTTM annotations
         into this component
         """
@@ -419,9 +759,12 @@ class AudioLabeling(
             raise Error("Please load an audio first")
 
         # TODO How to check if annotations match audio when using numpy type ?
-        if isinstance(audio, (str, Path)):
-            audioname = Path(audio).name
-            uri = audioname.split(".")[0]
+        if isinstance(audio, (str, Path, Mapping, AudioHandle)):
+            if isinstance(audio, (Mapping, AudioHandle)):
+                uri = audio["uri"] if isinstance(audio, Mapping) else audio.uri
+            else:
+                audioname = Path(audio).name
+                uri = audioname.split(".")[0]
             if uri != annotations.uri:
                 Warning(
                     "It seems that loaded annotations doesn't correspond to current audio."
@@ -429,38 +772,33 @@ class AudioLabeling(
                 )
         return (audio, annotations)
 
-    def stream_output(
-        self, value, output_id: str, first_chunk: bool
-    ) -> Tuple[bytes | None, Any]:
-        output_file = {
+    async def stream_output(
+        self, value, output_id: str, first_chunk: bool  # noqa: ARG002
+    ) -> Tuple[MediaStreamChunk | None, FileDataDict]:
+        output_file: FileDataDict = {
             "path": output_id,
             "is_stream": True,
+            "orig_name": "audio-stream.mp3",
+            "meta": {"_type": "gradio.FileData"},
         }
         if value is None:
             return None, output_file
         if isinstance(value, bytes):
-            return value, output_file
-        if client_utils.is_http_url_like(value["path"]):
-            response = httpx.get(value["path"])
-            binary_data = response.content
+            binary_data = value
         else:
-            output_file["orig_name"] = value["orig_name"]
-            file_path = value["path"]
-            is_wav = file_path.endswith(".wav")
-            with open(file_path, "rb") as f:
-                binary_data = f.read()
-            if is_wav:
-                # strip length information from first chunk header, remove headers entirely from subsequent chunks
-                if first_chunk:
-                    binary_data = (
-                        binary_data[:4] + b"\xFF\xFF\xFF\xFF" + binary_data[8:]
-                    )
-                    binary_data = (
-                        binary_data[:40] + b"\xFF\xFF\xFF\xFF" + binary_data[44:]
-                    )
-                else:
-                    binary_data = binary_data[44:]
-        return binary_data, output_file
+            value = value.get("file_data") or value
+            if client_utils.is_http_url_like(value["path"]):
+                import httpx
+
+                response = httpx.get(value["path"])
+                binary_data = response.content
+            else:
+                output_file["orig_name"] = value["orig_name"]
+                with open(value["path"], "rb") as f:
+                    binary_data = f.read()
+        # each chunk is a standalone file, converted as gr.Audio does
+        data, duration = await anyio.to_thread.run_sync(transcoder.to_adts, binary_data)
+        return {"data": data, "duration": duration, "extension": ".aac"}, output_file
 
     def check_streamable(self):
         if (
@@ -471,7 +809,7 @@ class AudioLabeling(
             raise ValueError(
                 "AudioLabeling streaming only available if source includes 'microphone'."
             )
-    
+
     async def combine_stream(
         self,
         stream: list[bytes],
@@ -479,18 +817,20 @@ class AudioLabeling(
         only_file=False,  # noqa: ARG002
     ) -> FileData:
         output_file = FileData(
-            path=processing_utils.save_bytes_to_cache(
-                b"".join(stream), "audio.mp3", cache_dir=self.GRADIO_CACHE
+            path=cache_manager.track(
+                processing_utils.save_bytes_to_cache(
+                    b"".join(stream), "audio.mp3", cache_dir=self.GRADIO_CACHE
+                )
             ),
             is_stream=False,
             orig_name="audio-stream.mp3",
         )
         if desired_output_format and desired_output_format != "mp3":
             new_path = Path(output_file.path).with_suffix(f".{desired_output_format}")
-            AudioSegment.from_file(output_file.path).export(
-                new_path, format=desired_output_format
+            await anyio.to_thread.run_sync(
+                transcoder.convert, output_file.path, new_path, desired_output_format
             )
-            output_file.path = str(new_path)
+            output_file.path = cache_manager.track(new_path)
         return output_file
 
 
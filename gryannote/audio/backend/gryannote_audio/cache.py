@@ -0,0 +1,265 @@
+"""Lifecycle of files written by gryannote components into the Gradio cache"""
+
+import functools
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Set
+from urllib.parse import unquote
+
+from .metrics import metrics
+
+# minimum duration (in seconds) between two automatic evictions
+EVICTION_INTERVAL = 60.0
+
+
+@dataclass
+class CachedFile:
+    path: Path
+    size: int
+    created: float
+    last_access: float
+    # sessions (or any other owner, e.g. a `Corpus`) referencing this file
+    owners: Set[Hashable] = field(default_factory=set)
+
+
+# session of the event being processed, from preprocessing to postprocessing of its
+# data (see `install_session`)
+_session: ContextVar[Optional[str]] = ContextVar("gryannote_session", default=None)
+# marks demos whose events are processed in their session
+SESSION_ATTRIBUTE = "_gryannote_session"
+
+
+def get_session() -> Optional[str]:
+    """Hash of the session of the event being processed, if any"""
+    from gradio.context import LocalContext
+
+    # only set while the event function runs
+    request = LocalContext.request.get()
+    return getattr(request, "session_hash", None) or _session.get()
+
+
+def install_session(demo):
+    """Set the session of events of `demo` (see `get_session`) while they are
+    processed, from preprocessing to postprocessing of their data. Idempotent."""
+    if getattr(demo, SESSION_ATTRIBUTE, False):
+        return demo
+
+    process_api = demo.process_api
+
+    # gradio only exposes the request to event functions: the session is set for
+    # the whole processing, so that `preprocess` and `postprocess` of components
+    # know it as well
+    @functools.wraps(process_api)
+    async def process_api_in_session(*args, **kwargs):
+        token = _session.set(kwargs.get("session_hash"))
+        try:
+            return await process_api(*args, **kwargs)
+        finally:
+            _session.reset(token)
+
+    demo.process_api = process_api_in_session
+    setattr(demo, SESSION_ATTRIBUTE, True)
+    return demo
+
+
+class CacheManager:
+    """
+    Tracks files written by gryannote components into the cache directory, and
+    deletes them according to size and age budgets.
+
+    Files referenced by a live session are never evicted. A file is referenced by
+    the session of the event that created or reused it (in its function, or in
+    components' `preprocess` / `postprocess`, see `install`), until the session ends.
+    Other owners can `acquire` and `release` files explicitly. Files whose session is
+    unknown are kept at least `min_age` seconds after their last access, which
+    includes their last download by a browser (see `add_middleware`).
+
+    Unreferenced files are evicted when older than `max_age`, then in least
+    recently used order until total size is below `max_size`. Eviction runs at most
+    every `EVICTION_INTERVAL` seconds, when files are tracked, or on `evict`.
+
+    Parameters:
+        max_size: maximum total size of tracked files, in bytes. None for no limit.
+        max_age: maximum age of tracked files, in seconds. None for no limit.
+        min_age: minimum duration files without owner are kept after last access.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = None,
+        max_age: Optional[float] = None,
+        min_age: float = 600.0,
+    ):
+        self.configure(max_size=max_size, max_age=max_age, min_age=min_age)
+        self._files: Dict[Path, CachedFile] = {}
+        self._size = 0
+        self._last_eviction = 0.0
+        self._lock = threading.RLock()
+
+    def configure(
+        self,
+        max_size: Optional[int] = None,
+        max_age: Optional[float] = None,
+        min_age: float = 600.0,
+    ):
+        if max_size is not None and max_size < 0:
+            raise ValueError(f"`max_size` must be positive, got {max_size}")
+        if max_age is not None and max_age < 0:
+            raise ValueError(f"`max_age` must be positive, got {max_age}")
+        self.max_size = max_size
+        self.max_age = max_age
+        self.min_age = min_age
+
+    @property
+    def size(self) -> int:
+        """Total size of tracked files, in bytes"""
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def track(self, path: str | Path, owner: Optional[Hashable] = None) -> str:
+        """
+        Track file `path`, created or reused by a component, and mark it as accessed.
+        The file is referenced by `owner` (default to the current session, if any).
+
+        Returns
+        -------
+        path: str
+            `path`, so that calls can be chained
+        """
+        path = Path(path).resolve()
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return str(path)
+
+        owner = owner if owner is not None else get_session()
+        now = time.time()
+        with self._lock:
+            file = self._files.get(path)
+            if file is None:
+                file = self._files[path] = CachedFile(path, size, now, now)
+                self._size += size
+            else:
+                # file may have been rewritten
+                self._size += size - file.size
+                file.size = size
+                file.last_access = now
+            if owner is not None:
+                file.owners.add(owner)
+
+            if now - self._last_eviction > EVICTION_INTERVAL:
+                self._evict(now)
+            self._report()
+        return str(path)
+
+    def touch(self, path: str | Path):
+        """Mark `path` as accessed, if tracked"""
+        with self._lock:
+            file = self._files.get(Path(path).resolve())
+            if file is not None:
+                file.last_access = time.time()
+
+    def acquire(self, path: str | Path, owner: Hashable, track: bool = True):
+        """Prevent eviction of `path` until `owner` releases it. If `track` is False,
+        files that are not tracked yet (e.g. not written by gryannote) are left as is."""
+        if not track:
+            with self._lock:
+                file = self._files.get(Path(path).resolve())
+                if file is not None:
+                    file.owners.add(owner)
+            return
+        self.track(path, owner=owner)
+
+    def release(self, owner: Hashable, path: str | Path | None = None):
+        """Release `path` (default to every file) referenced by `owner`"""
+        with self._lock:
+            if path is not None:
+                files = [self._files.get(Path(path).resolve())]
+            else:
+                files = list(self._files.values())
+            for file in files:
+                if file is not None:
+                    file.owners.discard(owner)
+
+    def evict(self) -> List[Path]:
+        """Delete files exceeding budgets. Returns deleted files."""
+        with self._lock:
+            return self._evict(time.time())
+
+    def _evict(self, now: float) -> List[Path]:
+        self._last_eviction = now
+        if self.max_size is None and self.max_age is None:
+            return []
+
+        with metrics.measure("cache.evict") as measure:
+            # least recently used first
+            candidates = sorted(
+                (
+                    file
+                    for file in self._files.values()
+                    if not file.owners and now - file.last_access > self.min_age
+                ),
+                key=lambda file: file.last_access,
+            )
+
+            evicted = []
+            for file in candidates:
+                expired = self.max_age is not None and now - file.created > self.max_age
+                oversized = self.max_size is not None and self._size > self.max_size
+                if not (expired or oversized):
+                    continue
+                file.path.unlink(missing_ok=True)
+                del self._files[file.path]
+                self._size -= file.size
+                evicted.append(file.path)
+
+            measure.count = len(evicted)
+        self._report()
+        return evicted
+
+    def _report(self):
+        metrics.set_gauge("cache_size_bytes", self._size)
+        metrics.set_gauge("cache_files", len(self._files))
+
+    def install(self, demo):
+        """
+        Reference files tracked while processing an event of `demo` by the session of
+        the event, and release them when the session ends (i.e. when the user closes
+        or refreshes the tab)
+        """
+        import gradio as gr
+
+        # so that files written by `preprocess` and `postprocess` of components are
+        # referenced as well
+        install_session(demo)
+
+        def release_session(request: gr.Request):
+            self.release(request.session_hash)
+
+        demo.unload(release_session)
+        return demo
+
+    def add_middleware(self, app):
+        """
+        Mark tracked files as accessed when `app` (e.g. the FastAPI app the demo is
+        mounted on) serves them to a browser. Must be called before `app` starts.
+        """
+
+        @app.middleware("http")
+        async def touch_served_files(request, call_next):
+            _, separator, path = request.url.path.partition("/file=")
+            if separator:
+                self.touch(unquote(path))
+            return await call_next(request)
+
+        return app
+
+
+# process-wide manager shared by gryannote components. Files are never deleted
+# unless budgets are set with `cache_manager.configure`.
+cache_manager = CacheManager()
@@ -1,13 +1,43 @@
-from typing import ClassVar, Dict, List, Optional, Text
+from typing import Iterable, List, Optional, Text
 
 from gradio.data_classes import FileData, GradioModel
 from pyannote.core import Annotation as PyannoteAnnotation
 
+from .metrics import metrics
 
-class Annotation(GradioModel):
-    # each speaker is assigned a color
-    speakers_color: ClassVar[Dict] = {}
+# default colors of speakers, as used by the frontend
+DEFAULT_PALETTE = ["#ffd70080", "#0000ff80", "#ff000080", "#00ff0080"]
+
+
+class SpeakerTable(GradioModel):
+    """Speakers of a single document, and their colors"""
+
+    # speaker labels, indexed by speaker id
+    labels: List[Text] = []
+    # speaker `i` is colored with `palette[i % len(palette)]`
+    palette: List[Text] = DEFAULT_PALETTE
+
+    @classmethod
+    def from_labels(
+        cls, labels: Iterable[Text], palette: Optional[List[Text]] = None
+    ) -> "SpeakerTable":
+        """Speaker table of `labels`, speaker ids following order of appearance"""
+        with metrics.measure("annotations.speakers") as measure:
+            table = cls(
+                labels=list(dict.fromkeys(labels)),
+                palette=palette or DEFAULT_PALETTE,
+            )
+            measure.count = len(table.labels)
+        return table
+
+    def get_id(self, label: Text) -> int:
+        return self.labels.index(label)
 
+    def get_color(self, label: Text) -> Text:
+        return self.palette[self.get_id(label) % len(self.palette)]
+
+
+class Annotation(GradioModel):
     # beginning of the annotation, in seconds
     start: float
     # end of the annotation, in seconds
@@ -32,6 +62,15 @@ class Annotation(GradioModel):
 class AnnotadedAudioData(GradioModel):
     file_data: FileData
     annotations: Optional[List[Annotation]] = None
+    # precomputed waveform peaks and duration (in seconds) of the audio. When both
+    # are provided, the frontend draws the waveform without decoding the audio.
+    peaks: Optional[List[float]] = None
+    duration: Optional[float] = None
+    # set when annotations are too many to be sent at once. The frontend then fetches
+    # annotations of the visible time range only (see `AudioLabeling.fetch_annotations`)
+    annotations_id: Optional[str] = None
+    # speakers of this document. Built from annotations if not provided.
+    speakers: Optional[SpeakerTable] = None
 
     def __init__(
         self,
@@ -43,6 +82,11 @@ class AnnotadedAudioData(GradioModel):
         if isinstance(annotations, PyannoteAnnotation):
             annotations = self._prepare_annotations(annotations)
 
+        if annotations and kwargs.get("speakers") is None:
+            kwargs["speakers"] = SpeakerTable.from_labels(
+                annotation.speaker for annotation in annotations
+            )
+
         super().__init__(
             file_data=file_data,
             annotations=annotations,
@@ -55,12 +99,14 @@ class AnnotadedAudioData(GradioModel):
 
         prepared_annotations: List[Annotation] = []
 
-        for segment, _, label in annotations.itertracks(yield_label=True):
-            prepared_annotations.append(
-                Annotation(
-                    start=segment.start,
-                    end=segment.end,
-                    speaker=label,
+        with metrics.measure("annotations.prepare") as measure:
+            for segment, _, label in annotations.itertracks(yield_label=True):
+                prepared_annotations.append(
+                    Annotation(
+                        start=segment.start,
+                        end=segment.end,
+                        speaker=label,
+                    )
                 )
-            )
+            measure.count = len(prepared_annotations)
         return prepared_annotations
@@ -0,0 +1,294 @@
+"""Review of a corpus of (audio, RTTM) pairs, with background prefetching"""
+
+import csv
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from gradio import processing_utils
+from gradio.data_classes import FileData
+from pyannote.core import Annotation as PyannoteAnnotation
+
+from .cache import cache_manager, get_session
+from .core import AnnotadedAudioData
+from .export import ExportItem
+from .handle import AudioHandle
+from .metrics import metrics
+
+# duration of the excerpts decoded at once to compute peaks, in seconds
+PEAKS_CHUNK_DURATION = 60.0
+
+
+@dataclass
+class CorpusItem:
+    """An entry of a corpus manifest"""
+
+    audio: Path
+    rttm: Optional[Path] = None
+
+    @property
+    def uri(self) -> str:
+        return self.audio.name.split(".")[0]
+
+
+@dataclass
+class LoadedItem:
+    """A corpus item, ready to be displayed"""
+
+    item: CorpusItem
+    handle: AudioHandle
+    annotations: Optional[PyannoteAnnotation]
+    value: AnnotadedAudioData
+
+
+def load_manifest(path: str | Path) -> List[CorpusItem]:
+    """
+    Load a corpus manifest: a CSV file with an "audio" column and an optional "rttm"
+    column. Relative paths are relative to the manifest's directory.
+    """
+    path = Path(path)
+    items = []
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            audio = path.parent / row["audio"]
+            rttm = row.get("rttm") or None
+            items.append(CorpusItem(audio, path.parent / rttm if rttm else None))
+    return items
+
+
+def compute_peaks(handle: AudioHandle, peaks_per_second: int = 100) -> List[float]:
+    """
+    Compute waveform peaks (maximum absolute amplitude over windows of
+    1 / `peaks_per_second` seconds) of the audio, decoding one excerpt at a time.
+    """
+    hop = max(1, round(handle.sample_rate / peaks_per_second))
+    peaks = []
+    for _, waveform in handle.chunks(PEAKS_CHUNK_DURATION):
+        samples = waveform.abs().amax(dim=0).numpy()
+        padding = -len(samples) % hop
+        samples = np.pad(samples, (0, padding))
+        peaks.append(samples.reshape(-1, hop).max(axis=1))
+    if not peaks:
+        return []
+    return np.round(np.concatenate(peaks), 4).tolist()
+
+
+def load_annotations(item: CorpusItem) -> Optional[PyannoteAnnotation]:
+    """Parse RTTM annotations of `item`, if any"""
+    if item.rttm is None:
+        return None
+
+    from pyannote.database.util import load_rttm
+
+    annotations = load_rttm(item.rttm)
+    if not annotations:
+        return PyannoteAnnotation(uri=item.uri)
+    # fallback to the first file of the RTTM if no file matches the audio
+    return annotations.get(item.uri, next(iter(annotations.values())))
+
+
+class Corpus:
+    """
+    Corpus of (audio, RTTM) pairs, reviewed one item at a time with `Player` or
+    `AudioLabeling`.
+
+    Only the current item is loaded on demand. The `prefetch` next items are loaded
+    in background threads: audio is copied into the Gradio cache (so that it can be
+    served without being hashed nor copied again), waveform peaks are computed (so
+    that the browser does not decode the audio to draw the waveform) and annotations
+    are parsed. Navigating to a prefetched item is hence almost immediate.
+
+    Each session has its own prefetching window, from the item before its current
+    item to the `prefetch` next ones. Items are loaded once for all sessions, and
+    forgotten when they leave every window (see `install` to close the window of a
+    session when it ends).
+
+    Parameters:
+        manifest: path to a CSV manifest (see `load_manifest`), or sequence of
+            `CorpusItem` or (audio, rttm) pairs.
+        prefetch: number of next items to load in background.
+        num_workers: number of background threads.
+        peaks_per_second: resolution of precomputed waveform peaks.
+        cache_dir: directory where audio files are copied. Default to Gradio cache.
+
+    Usage:
+        corpus = Corpus("manifest.csv", prefetch=4)
+
+        with gr.Blocks() as demo:
+            index = gr.State(0)
+            player = AudioLabeling(value=corpus.value(0), interactive=False)
+            next_btn = gr.Button("Next")
+            next_btn.click(lambda i: corpus.navigate(i, 1), index, [index, player])
+    """
+
+    def __init__(
+        self,
+        manifest: str | Path | Sequence[CorpusItem | Tuple],
+        *,
+        prefetch: int = 2,
+        num_workers: int = 2,
+        peaks_per_second: int = 100,
+        cache_dir: str | Path | None = None,
+    ):
+        if isinstance(manifest, (str, Path)):
+            self.items = load_manifest(manifest)
+        else:
+            self.items = [
+                item
+                if isinstance(item, CorpusItem)
+                else CorpusItem(
+                    Path(item[0]), Path(item[1]) if item[1] is not None else None
+                )
+                for item in manifest
+            ]
+
+        if prefetch < 0:
+            raise ValueError(f"`prefetch` must be positive, got {prefetch}")
+        self.prefetch = prefetch
+        self.peaks_per_second = peaks_per_second
+
+        if cache_dir is None:
+            from gradio.utils import get_upload_folder
+
+            cache_dir = get_upload_folder()
+        self.cache_dir = str(cache_dir)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=num_workers, thread_name_prefix="gryannote-corpus"
+        )
+        self._futures: Dict[int, Future] = {}
+        # current item of each session
+        self._windows: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _load(self, index: int) -> LoadedItem:
+        item = self.items[index]
+        with metrics.measure("corpus.load") as measure:
+            handle = AudioHandle(item.audio)
+            # files in the cache directory are served as is by Gradio
+            path = processing_utils.save_file_to_cache(item.audio, self.cache_dir)
+            # not evicted from the cache while in the prefetching window
+            cache_manager.acquire(path, owner=self)
+            peaks = compute_peaks(handle, self.peaks_per_second)
+            annotations = load_annotations(item)
+            value = AnnotadedAudioData(
+                file_data=FileData(
+                    path=path,
+                    orig_name=item.audio.name,
+                    size=Path(path).stat().st_size,
+                ),
+                annotations=annotations,
+                peaks=peaks,
+                duration=handle.duration,
+            )
+            measure.size = value.file_data.size
+            measure.count = len(annotations) if annotations is not None else 0
+        return LoadedItem(item, handle, annotations, value)
+
+    def _submit(self, index: int) -> Future:
+        """Must be called with `self._lock` held"""
+        future = self._futures.get(index)
+        if future is None:
+            future = self._executor.submit(self._load, index)
+            self._futures[index] = future
+        return future
+
+    def _in_window(self, i: int) -> bool:
+        """Whether item `i` is in the prefetching window of a session. Previous item
+        is kept, to navigate back without loading it again."""
+        return any(
+            index - 1 <= i <= index + self.prefetch for index in self._windows.values()
+        )
+
+    def _forget(self):
+        """Forget items outside of every prefetching window. Must be called with
+        `self._lock` held"""
+        for i in list(self._futures):
+            if not self._in_window(i):
+                future = self._futures.pop(i)
+                future.cancel()
+                future.add_done_callback(self._release)
+
+    def load(self, index: int, session: Optional[Hashable] = None) -> LoadedItem:
+        """Load item `index`, and prefetch the next ones in the window of `session`
+        (default to the current session)"""
+        if not 0 <= index < len(self):
+            raise IndexError(f"Item {index} out of range [0, {len(self)})")
+
+        session = session if session is not None else get_session()
+        with self._lock:
+            self._windows[session] = index
+            future = self._submit(index)
+            for i in range(index + 1, min(len(self), index + self.prefetch + 1)):
+                self._submit(i)
+            self._forget()
+
+        try:
+            return future.result()
+        except BaseException:
+            # retry on next access
+            with self._lock:
+                if self._futures.get(index) is future:
+                    del self._futures[index]
+            raise
+
+    def _release(self, future: Future):
+        """Let the cache evict audio of a loaded item"""
+        if not future.cancelled() and future.exception() is None:
+            cache_manager.release(self, future.result().value.file_data.path)
+
+    def value(self, index: int) -> AnnotadedAudioData:
+        """Value of item `index`, to be displayed by `Player` or `AudioLabeling`"""
+        return self.load(index).value
+
+    def navigate(self, index: int, step: int) -> Tuple[int, AnnotadedAudioData]:
+        """
+        Move `step` items from item `index` (clipped to corpus bounds).
+        Meant to be used as an event listener, with the current index stored in a
+        `gr.State`.
+
+        Returns
+        -------
+        index, value:
+            new index, and value of the corresponding item
+        """
+        index = min(max(0, index + step), len(self) - 1)
+        return index, self.value(index)
+
+    def export_items(self) -> List[ExportItem]:
+        """Items of the corpus, to be exported with `Exporter.link`"""
+        return [
+            ExportItem(item.uri, item.rttm, audio=item.audio) for item in self.items
+        ]
+
+    def release(self, session: Hashable):
+        """Close the prefetching window of `session`"""
+        with self._lock:
+            if self._windows.pop(session, None) is not None:
+                self._forget()
+
+    def install(self, demo):
+        """Close prefetching windows of sessions of `demo` when they end"""
+        import gradio as gr
+
+        def release_session(request: gr.Request):
+            self.release(request.session_hash)
+
+        demo.unload(release_session)
+        return demo
+
+    def close(self):
+        """Stop background loading"""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+            self._windows.clear()
+        self._executor.shutdown(wait=False)
+        cache_manager.release(self)
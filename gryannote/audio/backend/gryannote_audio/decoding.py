@@ -0,0 +1,107 @@
+"""Audio decoding for pipelines, with a cache of decoded waveforms"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple
+
+import torch
+
+# read size used to hash audio files
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(path: str | Path) -> str:
+    """Hash of the content of file `path`"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WaveformCache:
+    """
+    LRU cache of decoded waveforms, keyed by file content hash and sample rate.
+
+    Parameters:
+        max_bytes: maximum size of cached waveforms, in bytes. Least recently used
+            waveforms are dropped first when exceeded.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 2**20):
+        self.max_bytes = max_bytes
+        self._waveforms: OrderedDict[Tuple[str, int], torch.Tensor] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, int]) -> torch.Tensor | None:
+        with self._lock:
+            waveform = self._waveforms.get(key)
+            if waveform is not None:
+                self._waveforms.move_to_end(key)
+            return waveform
+
+    def put(self, key: Tuple[str, int], waveform: torch.Tensor):
+        size = waveform.element_size() * waveform.nelement()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._waveforms:
+                return
+            self._waveforms[key] = waveform
+            self._size += size
+            while self._size > self.max_bytes:
+                _, dropped = self._waveforms.popitem(last=False)
+                self._size -= dropped.element_size() * dropped.nelement()
+
+    def clear(self):
+        with self._lock:
+            self._waveforms.clear()
+            self._size = 0
+
+
+# process-wide cache of waveforms decoded for pipelines
+waveform_cache = WaveformCache()
+
+
+def load_for_pipeline(path: str | Path, sample_rate: int = 16000) -> Dict:
+    """
+    Decode `path` once, downmix it to mono and resample it to `sample_rate`.
+
+    Returns
+    -------
+    file: dict
+        {"waveform": (1, num_samples) float tensor, "sample_rate": sample_rate,
+        "uri": ..., "audio": path} mapping, that pyannote pipelines accept as is,
+        without decoding nor resampling the audio again.
+    """
+    import torchaudio
+
+    path = Path(path)
+    key = (hash_file(path), sample_rate)
+
+    waveform = waveform_cache.get(key)
+    if waveform is None:
+        waveform, file_sample_rate = torchaudio.load(path)
+        waveform = waveform.mean(dim=0, keepdim=True)
+        if file_sample_rate != sample_rate:
+            # torchaudio's high quality settings ("kaiser_best")
+            waveform = torchaudio.functional.resample(
+                waveform,
+                file_sample_rate,
+                sample_rate,
+                lowpass_filter_width=64,
+                rolloff=0.9475937167399596,
+                resampling_method="sinc_interp_kaiser",
+                beta=14.769656459379492,
+            )
+        waveform_cache.put(key, waveform)
+
+    return {
+        "waveform": waveform,
+        "sample_rate": sample_rate,
+        "uri": path.name.split(".")[0],
+        "audio": str(path),
+    }
@@ -0,0 +1,102 @@
+"""Deduplicated persistence of audio into the cache directory"""
+
+import hashlib
+import os
+import tempfile
+import wave
+from pathlib import Path
+
+import numpy as np
+from gradio import processing_utils
+
+from .transcoding import transcoder
+
+# formats written directly from arrays, without external encoder
+LOSSLESS_FORMATS = ["wav", "flac"]
+
+
+def hash_audio(data: np.ndarray, sample_rate: int) -> str:
+    """Hash of audio samples and of their layout"""
+    data = np.ascontiguousarray(data)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{sample_rate}:{data.dtype.str}:{data.shape}".encode())
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: Path, write):
+    """Write `path` with `write(tmp_path)`, so that readers never see partial files"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.stem}-", suffix=path.suffix
+    )
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def write_wav(path: str | Path, data: np.ndarray, sample_rate: int):
+    """Write 16-bit PCM wav file from `data`, without external encoder"""
+    data = processing_utils.convert_to_16_bit_wav(data)
+    with wave.open(str(path), "wb") as file:
+        file.setnchannels(1 if data.ndim == 1 else data.shape[1])
+        file.setsampwidth(2)
+        file.setframerate(sample_rate)
+        file.writeframes(np.ascontiguousarray(data).tobytes())
+
+
+def write_flac(path: str | Path, data: np.ndarray, sample_rate: int):
+    """Write 16-bit flac file from `data`, with libsndfile (no external encoder)"""
+    import soundfile
+
+    data = processing_utils.convert_to_16_bit_wav(data)
+    soundfile.write(str(path), data, sample_rate, format="FLAC", subtype="PCM_16")
+
+
+def write_audio(path: str | Path, data: np.ndarray, sample_rate: int, format: str):
+    """
+    Write audio samples into file `path`, with the given format. wav and flac files
+    are written directly from the array, other (lossy) formats are encoded by the
+    shared ffmpeg `transcoder` pool.
+    """
+    if format == "wav":
+        write_wav(path, data, sample_rate)
+    elif format == "flac":
+        write_flac(path, data, sample_rate)
+    else:
+        transcoder.encode(data, sample_rate, path, format)
+
+
+def save_audio(
+    data: np.ndarray, sample_rate: int, format: str, cache_dir: str | Path
+) -> str:
+    """
+    Save audio samples into the cache directory, with the given format.
+
+    Samples are hashed, and the file is only written if the same samples were not
+    already saved with the same format (see `write_audio`).
+
+    Returns
+    -------
+    path: str
+        path to the saved audio file
+    """
+    path = Path(cache_dir) / hash_audio(data, sample_rate) / f"audio.{format}"
+    if path.exists():
+        return str(path.resolve())
+
+    _write_atomic(path, lambda tmp: write_audio(tmp, data, sample_rate, format))
+    return str(path.resolve())
+
+
+def save_bytes(data: bytes, file_name: str, cache_dir: str | Path) -> str:
+    """Save binary content into the cache directory, unless it was already saved"""
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    path = Path(cache_dir) / digest / Path(file_name).name
+    if not path.exists():
+        _write_atomic(path, lambda tmp: Path(tmp).write_bytes(data))
+    return str(path.resolve())
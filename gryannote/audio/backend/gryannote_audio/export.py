@@ -0,0 +1,339 @@
+"""Streaming export of annotated audio as zip or tar archives"""
+
+import io
+import queue
+import secrets
+import tarfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, Iterator, List, Literal, Optional
+
+from pyannote.core import Annotation as PyannoteAnnotation
+
+from .cache import cache_manager, get_session
+from .metrics import metrics
+
+# size of the chunks read from files and sent to the client
+CHUNK_SIZE = 1 << 20
+# maximum number of chunks produced in advance of the client
+MAX_PENDING_CHUNKS = 4
+# maximum number of export links kept at once
+MAX_EXPORTS = 64
+
+
+@dataclass
+class ExportItem:
+    """
+    An annotated audio file to export.
+
+    Parameters:
+        uri: name of the file in the archive.
+        annotations: annotations, or path to an RTTM file.
+        audio: path to the audio file, only exported with `include_audio`.
+        duration: duration of the audio, in seconds, used for the UEM. Default to the
+            duration of `audio`, or to the end of the last annotation.
+    """
+
+    uri: str
+    annotations: PyannoteAnnotation | Path | str | None = None
+    audio: Optional[Path | str] = None
+    duration: Optional[float] = None
+
+
+class _Pipe(io.RawIOBase):
+    """Unseekable file, handing over written bytes to a reader thread by chunks"""
+
+    def __init__(self):
+        self.chunks: queue.Queue = queue.Queue(maxsize=MAX_PENDING_CHUNKS)
+        self.buffer = bytearray()
+        self.aborted = threading.Event()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.aborted.is_set():
+            raise BrokenPipeError("Export was interrupted by the client")
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_SIZE:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+        return len(data)
+
+    def _put(self, chunk: Optional[bytes]):
+        # do not block forever once the reader is gone
+        while not self.aborted.is_set():
+            try:
+                self.chunks.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def close_writer(self, error: Optional[BaseException] = None):
+        if self.buffer:
+            self._put(bytes(self.buffer))
+            self.buffer.clear()
+        self._put(error)
+
+
+def _rttm_bytes(item: ExportItem) -> Optional[bytes]:
+    if item.annotations is None:
+        return None
+    if isinstance(item.annotations, PyannoteAnnotation):
+        text = io.StringIO()
+        item.annotations.write_rttm(text)
+        return text.getvalue().encode("utf-8")
+    return Path(item.annotations).read_bytes()
+
+
+def _uem_bytes(item: ExportItem) -> Optional[bytes]:
+    duration = item.duration
+    if duration is None and item.audio is not None:
+        from .handle import AudioHandle
+
+        # only reads the audio header
+        duration = AudioHandle(item.audio).duration
+    if duration is None and isinstance(item.annotations, PyannoteAnnotation):
+        duration = item.annotations.get_timeline().extent().end
+    if duration is None:
+        return None
+    return f"{item.uri} 1 0.000 {duration:.3f}\n".encode("utf-8")
+
+
+def _members(
+    item: ExportItem, include_audio: bool, include_uem: bool
+) -> Iterator[tuple]:
+    """(name, bytes or path) of the archive members of `item`"""
+    rttm = _rttm_bytes(item)
+    if rttm is not None:
+        yield f"rttm/{item.uri}.rttm", rttm
+    if include_uem:
+        uem = _uem_bytes(item)
+        if uem is not None:
+            yield f"uem/{item.uri}.uem", uem
+    if include_audio and item.audio is not None:
+        audio = Path(item.audio)
+        yield f"audio/{item.uri}{audio.suffix}", audio
+
+
+def _write_zip(pipe: _Pipe, members: Iterable[tuple]):
+    with zipfile.ZipFile(pipe, mode="w") as archive:
+        for name, content in members:
+            if isinstance(content, bytes):
+                archive.writestr(name, content, compress_type=zipfile.ZIP_DEFLATED)
+                continue
+            # audio is already compressed, or too large to be worth deflating
+            info = zipfile.ZipInfo.from_file(content, name)
+            info.compress_type = zipfile.ZIP_STORED
+            with open(content, "rb") as source, archive.open(
+                info, "w", force_zip64=True
+            ) as target:
+                while chunk := source.read(CHUNK_SIZE):
+                    target.write(chunk)
+
+
+def _write_tar(pipe: _Pipe, members: Iterable[tuple]):
+    with tarfile.open(fileobj=pipe, mode="w|") as archive:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            info.mtime = int(time.time())
+            if isinstance(content, bytes):
+                info.size = len(content)
+                archive.addfile(info, io.BytesIO(content))
+            else:
+                info.size = content.stat().st_size
+                with open(content, "rb") as source:
+                    archive.addfile(info, source)
+
+
+def stream_archive(
+    items: Iterable[ExportItem],
+    format: Literal["zip", "tar"] = "zip",
+    include_audio: bool = False,
+    include_uem: bool = False,
+) -> Iterator[bytes]:
+    """
+    Stream a zip or tar archive of `items`, chunk by chunk, as it is produced.
+
+    Nothing is written to disk, and at most `MAX_PENDING_CHUNKS` chunks of
+    `CHUNK_SIZE` bytes are held in memory, whatever the size of the archive. Items
+    (e.g. from a corpus) are read one at a time, as the archive is consumed.
+    """
+    write = {"zip": _write_zip, "tar": _write_tar}.get(format)
+    if write is None:
+        raise ValueError(f"Unknown archive format {format}, choose 'zip' or 'tar'")
+
+    pipe = _Pipe()
+    members = (
+        member
+        for item in items
+        for member in _members(item, include_audio, include_uem)
+    )
+
+    def produce():
+        try:
+            write(pipe, members)
+        except BaseException as error:
+            pipe.close_writer(error)
+        else:
+            pipe.close_writer()
+
+    thread = threading.Thread(target=produce, name="gryannote-export", daemon=True)
+    with metrics.measure(f"export.{format}") as measure:
+        measure.size = 0
+        thread.start()
+        try:
+            while (chunk := pipe.chunks.get()) is not None:
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                measure.size += len(chunk)
+                yield chunk
+        finally:
+            # e.g. client disconnected
+            pipe.aborted.set()
+
+
+def _pin(items: Iterable[ExportItem], owner: Hashable):
+    """Keep audio files of `items` in cache until `owner` releases them"""
+    for item in items:
+        if item.audio is not None:
+            # files that are not in cache (e.g. of a corpus) are never deleted
+            cache_manager.acquire(item.audio, owner=owner, track=False)
+
+
+@dataclass
+class _Export:
+    items: List[ExportItem]
+    format: str
+    include_audio: bool
+    include_uem: bool
+
+
+class Exporter:
+    """
+    Collects annotated items of each session, and serves them as archives streamed
+    to the client (see `stream_archive`) from a route added with `add_route`.
+
+    Usage:
+        exporter = Exporter()
+
+        def run(pipeline, audio):
+            annotations = pipeline_selector.run(audio, pipeline)
+            exporter.add(ExportItem(annotations.uri, annotations, audio=audio["audio"]))
+            ...
+
+        export_btn.click(lambda: f"[Download]({exporter.link()})", None, markdown)
+
+        app = exporter.add_route(FastAPI())
+        app = gr.mount_gradio_app(app, demo, path="/")
+    """
+
+    def __init__(self):
+        self.path = "/gryannote/export"
+        self._items: Dict[Hashable, Dict[str, ExportItem]] = {}
+        self._exports: OrderedDict[str, _Export] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, item: ExportItem, session: Optional[Hashable] = None):
+        """Add `item` to the items of `session` (default to the current session),
+        replacing the previous item with the same uri. Its audio is kept in cache
+        until the session ends."""
+        session = session if session is not None else get_session()
+        _pin([item], owner=("export", session))
+        with self._lock:
+            self._items.setdefault(session, {})[item.uri] = item
+
+    def items(self, session: Optional[Hashable] = None) -> List[ExportItem]:
+        session = session if session is not None else get_session()
+        with self._lock:
+            return list(self._items.get(session, {}).values())
+
+    def release(self, session: Hashable):
+        """Forget items of `session`"""
+        with self._lock:
+            self._items.pop(session, None)
+        cache_manager.release(("export", session))
+
+    def link(
+        self,
+        items: Optional[Iterable[ExportItem]] = None,
+        format: Literal["zip", "tar"] = "zip",
+        include_audio: bool = False,
+        include_uem: bool = True,
+    ) -> str:
+        """
+        URL of an archive of `items` (default to the items of the current session).
+        Items are only read when the archive is downloaded: their audio files are kept
+        in cache (see `cache_manager`) as long as the link is valid.
+
+        Raises:
+            FileNotFoundError: if the audio of an item was deleted, as the archive
+                would be interrupted when reaching it.
+        """
+        if format not in ("zip", "tar"):
+            raise ValueError(f"Unknown archive format {format}, choose 'zip' or 'tar'")
+        items = self.items() if items is None else list(items)
+        if include_audio:
+            for item in items:
+                if item.audio is not None and not Path(item.audio).is_file():
+                    raise FileNotFoundError(
+                        f"Audio of {item.uri} is not available anymore: {item.audio}"
+                    )
+
+        token = secrets.token_urlsafe(16)
+        if include_audio:
+            _pin(items, owner=("export", token))
+        with self._lock:
+            self._exports[token] = _Export(items, format, include_audio, include_uem)
+            while len(self._exports) > MAX_EXPORTS:
+                expired, _ = self._exports.popitem(last=False)
+                cache_manager.release(("export", expired))
+        return f"{self.path}/{token}.{format}"
+
+    def add_route(self, app, path: str = "/gryannote/export"):
+        """Serve archives on a FastAPI application"""
+        from fastapi import HTTPException
+        from fastapi.responses import StreamingResponse
+
+        self.path = path.rstrip("/")
+
+        def get_export(name: str) -> StreamingResponse:
+            token = name.rsplit(".", 1)[0]
+            with self._lock:
+                export = self._exports.get(token)
+            if export is None:
+                raise HTTPException(status_code=404, detail="Export not found")
+            media_type = {"zip": "application/zip", "tar": "application/x-tar"}
+            return StreamingResponse(
+                stream_archive(
+                    export.items,
+                    format=export.format,
+                    include_audio=export.include_audio,
+                    include_uem=export.include_uem,
+                ),
+                media_type=media_type[export.format],
+                headers={
+                    "Content-Disposition": f'attachment; filename="export.{export.format}"'
+                },
+            )
+
+        app.add_api_route(f"{self.path}/{{name}}", get_export, methods=["GET"])
+        return app
+
+    def install(self, demo):
+        """Forget items of sessions of `demo` when they end"""
+        import gradio as gr
+
+        def release_session(request: gr.Request):
+            self.release(request.session_hash)
+
+        demo.unload(release_session)
+        return demo
+
+
+# process-wide exporter
+exporter = Exporter()
@@ -0,0 +1,134 @@
+"""Lazy seekable audio handle"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Tuple
+
+from pyannote.core import Segment
+
+if TYPE_CHECKING:
+    import torch
+
+
+class AudioHandle:
+    """
+    Lightweight handle on an audio file, whose samples are only decoded on demand,
+    by seeking into the file. Memory usage is hence bounded by the duration of the
+    requested excerpts, whatever the duration of the file.
+
+    Files are read with libsndfile (e.g. wav, flac, ogg, mp3). Other files (e.g.
+    videos) must be converted first (see `AudioLabeling` "lazy" type).
+
+    Parameters:
+        path: path to the audio file
+
+    Raises:
+        ValueError: if the file cannot be read by libsndfile, or if its length is
+            unknown
+    """
+
+    def __init__(self, path: str | Path):
+        import soundfile
+
+        self.path = Path(path)
+        try:
+            # only the header is read
+            info = soundfile.info(str(self.path))
+        except RuntimeError as e:
+            raise ValueError(f"Cannot seek into {self.path}: {e}") from e
+        self.sample_rate: int = info.samplerate
+        self.num_frames: int = info.frames
+        self.num_channels: int = info.channels
+
+        if self.num_frames <= 0:
+            # rather than decoding the whole file to find out its length
+            raise ValueError(f"Length of {self.path} is not stored in its header")
+
+    @property
+    def uri(self) -> str:
+        """File identifier, as used in RTTM files"""
+        return self.path.name.split(".")[0]
+
+    @property
+    def duration(self) -> float:
+        """Duration of the audio, in seconds"""
+        return self.num_frames / self.sample_rate
+
+    def __repr__(self) -> str:
+        return (
+            f"AudioHandle(path={str(self.path)!r}, sample_rate={self.sample_rate}, "
+            f"duration={self.duration:.3f})"
+        )
+
+    def crop(self, start: float, end: float) -> "torch.Tensor":
+        """Decode audio between `start` and `end` (in seconds)
+
+        Returns
+        -------
+        waveform: torch.Tensor
+            (num_channels, num_samples) float waveform
+        """
+        import soundfile
+        import torch
+
+        start = max(0.0, start)
+        end = min(self.duration, end)
+        if end <= start:
+            raise ValueError(f"Invalid excerpt [{start}, {end}] of {self}")
+
+        frame_offset = int(round(start * self.sample_rate))
+        num_frames = int(round(end * self.sample_rate)) - frame_offset
+        data, _ = soundfile.read(
+            str(self.path),
+            start=frame_offset,
+            frames=num_frames,
+            dtype="float32",
+            always_2d=True,
+        )
+        return torch.from_numpy(data.T.copy())
+
+    def chunks(
+        self, duration: float, step: Optional[float] = None
+    ) -> Iterator[Tuple[Segment, "torch.Tensor"]]:
+        """Iterate over the audio, `duration` seconds at a time
+
+        Parameters
+        ----------
+        duration: float
+            duration of chunks, in seconds
+        step: float, optional
+            step between the start of two consecutive chunks, in seconds.
+            Default to `duration` (i.e. no overlap).
+
+        Yields
+        ------
+        segment, waveform:
+            time span and (num_channels, num_samples) waveform of each chunk.
+            The last chunk may be shorter than `duration`.
+        """
+        step = step or duration
+        start = 0.0
+        while start < self.duration:
+            end = min(start + duration, self.duration)
+            yield Segment(start, end), self.crop(start, end)
+            if end >= self.duration:
+                break
+            start += step
+
+    def to_pyannote(self, segment: Optional[Segment] = None) -> Dict:
+        """pyannote file mapping
+
+        Parameters
+        ----------
+        segment: Segment, optional
+            If set, only this excerpt is decoded, and passed as a waveform: timestamps
+            of pipeline output are then relative to the start of `segment`. Otherwise,
+            the mapping only holds the path of the file, and pyannote decodes the whole
+            file itself: memory usage of pipeline runs is not bounded by this handle.
+        """
+        if segment is None:
+            return {"audio": str(self.path), "uri": self.uri}
+        return {
+            "waveform": self.crop(segment.start, segment.end),
+            "sample_rate": self.sample_rate,
+            "uri": self.uri,
+        }
@@ -0,0 +1,128 @@
+"""Interval index over annotation segments"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from pyannote.core import Annotation as PyannoteAnnotation
+
+from .core import Annotation
+
+
+class SegmentIndex:
+    """
+    Static interval index over annotation segments, for overlap queries.
+
+    Segments are stored in arrays sorted by start time, along with the running
+    maximum of their end times. Segments overlapping [start, end] are then found with
+    two binary searches, in O(log(n) + k) for k overlapping segments.
+
+    Parameters:
+        starts: start times of segments, in seconds
+        ends: end times of segments, in seconds
+        labels: label of each segment
+    """
+
+    def __init__(
+        self,
+        starts: Sequence[float],
+        ends: Sequence[float],
+        labels: Sequence[str],
+    ):
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        if not len(starts) == len(ends) == len(labels):
+            raise ValueError("starts, ends and labels must have the same length")
+
+        # labels are stored as indices into `self.labels`
+        labels, codes = np.unique(np.asarray(labels, dtype=object), return_inverse=True)
+        self._sort(starts, ends, codes, labels)
+
+    def _sort(
+        self,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        codes: np.ndarray,
+        labels: np.ndarray,
+    ):
+        order = np.argsort(starts, kind="stable")
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.labels = labels
+        self.codes = codes[order]
+        # maximum end time of segments[:i + 1], non decreasing
+        self.max_ends = np.maximum.accumulate(self.ends) if len(ends) else self.ends
+
+    @classmethod
+    def from_codes(
+        cls,
+        starts: Sequence[float],
+        ends: Sequence[float],
+        codes: Sequence[int],
+        labels: Sequence[str],
+    ) -> "SegmentIndex":
+        """Index of segments labeled `labels[codes]`, without comparing label strings.
+        Labels of no segment are dropped."""
+        used, codes = np.unique(np.asarray(codes, dtype=np.int64), return_inverse=True)
+        index = cls.__new__(cls)
+        index._sort(
+            np.asarray(starts, dtype=np.float64),
+            np.asarray(ends, dtype=np.float64),
+            codes.reshape(-1),
+            np.asarray(labels, dtype=object)[used],
+        )
+        return index
+
+    @classmethod
+    def from_annotations(
+        cls, annotations: PyannoteAnnotation | List[Annotation]
+    ) -> "SegmentIndex":
+        if isinstance(annotations, PyannoteAnnotation):
+            tracks = [
+                (segment.start, segment.end, label)
+                for segment, _, label in annotations.itertracks(yield_label=True)
+            ]
+        else:
+            tracks = [
+                (annotation.start, annotation.end, annotation.speaker)
+                for annotation in annotations
+            ]
+        starts, ends, labels = zip(*tracks) if tracks else ((), (), ())
+        return cls(starts, ends, labels)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def overlapping(
+        self, start: float, end: float, limit: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Indices of segments overlapping [start, end], sorted by start time.
+
+        If more than `limit` segments overlap, only the `limit` longest are returned,
+        as shorter ones would barely be visible anyway.
+        """
+        # segments starting after `end` cannot overlap
+        stop = np.searchsorted(self.starts, end, side="left")
+        # segments before `first` all end before `start`
+        first = np.searchsorted(self.max_ends[:stop], start, side="right")
+        indices = first + np.flatnonzero(self.ends[first:stop] > start)
+
+        if limit is not None and len(indices) > limit:
+            durations = self.ends[indices] - self.starts[indices]
+            longest = np.argpartition(-durations, limit - 1)[:limit]
+            indices = np.sort(indices[longest])
+        return indices
+
+    def annotations(
+        self, start: float, end: float, limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Segments overlapping [start, end], as serialized `Annotation`"""
+        indices = self.overlapping(start, end, limit=limit)
+        return [
+            {"start": start, "end": end, "speaker": label}
+            for start, end, label in zip(
+                self.starts[indices].tolist(),
+                self.ends[indices].tolist(),
+                self.labels[self.codes[indices]].tolist(),
+            )
+        ]
@@ -0,0 +1,297 @@
+"""Per-stage timing and memory metrics of gryannote components"""
+
+import contextlib
+import contextvars
+import dataclasses
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+# upper bounds (in seconds) of stage durations histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+# environment variable used to enable the per-request trace log
+TRACE_LOG_ENV = "GRYANNOTE_TRACE_LOG"
+
+# identifier of the request being processed, if any
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "gryannote_request_id", default=None
+)
+
+
+def get_peak_rss() -> int:
+    """Peak resident set size of the current process, in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in kilobytes on Linux, but in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class Measure:
+    """Measure of one execution of a stage. `size` (bytes) and `count` (items)
+    describe the processed payload and can be set while the stage is running."""
+
+    stage: str
+    start: float = 0.0
+    duration: float = 0.0
+    size: Optional[int] = None
+    count: Optional[int] = None
+    peak_rss: int = 0
+
+
+@dataclass
+class StageStats:
+    """Aggregated measures of a stage"""
+
+    count: int = 0
+    duration_sum: float = 0.0
+    duration_max: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * len(DURATION_BUCKETS))
+    size_sum: int = 0
+    item_sum: int = 0
+    peak_rss: int = 0
+
+    def add(self, measure: Measure):
+        self.count += 1
+        self.duration_sum += measure.duration
+        self.duration_max = max(self.duration_max, measure.duration)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if measure.duration <= bound:
+                self.buckets[i] += 1
+        self.size_sum += measure.size or 0
+        self.item_sum += measure.count or 0
+        self.peak_rss = max(self.peak_rss, measure.peak_rss)
+
+
+class Metrics:
+    """
+    Registry of stage measures, shared by all gryannote components of the process.
+
+    Stages are measured with the `measure` context manager. Durations, payload sizes
+    and process peak RSS at the end of each stage are aggregated per stage, and can be
+    exported in Prometheus text format with `render_prometheus`. Note that peak RSS is
+    process-wide: when requests run concurrently, it cannot be attributed to a single one.
+
+    Each measure can also be appended to a JSON lines trace log, together with the
+    identifier of the request being processed (see `request`). The trace log is enabled
+    with `enable_trace` or by setting the GRYANNOTE_TRACE_LOG environment variable.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, StageStats] = {}
+        self._gauges: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._trace_log: Optional[Path] = None
+        if os.environ.get(TRACE_LOG_ENV):
+            self.enable_trace(os.environ[TRACE_LOG_ENV])
+
+    def enable_trace(self, path: str | Path | None):
+        """Append every measure to `path`, as JSON lines. Disable trace log if None."""
+        self._trace_log = Path(path) if path else None
+
+    @contextlib.contextmanager
+    def request(self, request_id: str) -> Iterator[None]:
+        """Attach measures taken in this context to `request_id` in the trace log"""
+        token = _request_id.set(request_id)
+        try:
+            yield
+        finally:
+            _request_id.reset(token)
+
+    @contextlib.contextmanager
+    def measure(
+        self, stage: str, size: Optional[int] = None, count: Optional[int] = None
+    ) -> Iterator[Measure]:
+        """Measure execution of `stage`"""
+        measure = Measure(stage=stage, start=time.time(), size=size, count=count)
+        start = time.perf_counter()
+        try:
+            yield measure
+        finally:
+            measure.duration = time.perf_counter() - start
+            self.add(measure)
+
+    def add(self, measure: Measure):
+        """Record a stage measure"""
+        measure.peak_rss = get_peak_rss()
+        with self._lock:
+            self._stages.setdefault(measure.stage, StageStats()).add(measure)
+        if self._trace_log is not None:
+            self._trace(measure)
+
+    def set_gauge(self, name: str, value: float):
+        """Set the current value of gauge `name`"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def _trace(self, measure: Measure):
+        record = {
+            "timestamp": measure.start,
+            "request": _request_id.get(),
+            "thread": threading.current_thread().name,
+            "stage": measure.stage,
+            "duration": measure.duration,
+            "size": measure.size,
+            "count": measure.count,
+            "peak_rss": measure.peak_rss,
+        }
+        with self._lock, open(self._trace_log, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record) + "\n")
+
+    def get_stats(self) -> Dict[str, StageStats]:
+        """Snapshot of aggregated measures, per stage"""
+        with self._lock:
+            return {
+                stage: dataclasses.replace(stats, buckets=list(stats.buckets))
+                for stage, stats in self._stages.items()
+            }
+
+    def reset(self):
+        """Forget every measure and gauge"""
+        with self._lock:
+            self._stages.clear()
+            self._gauges.clear()
+
+    def render_prometheus(self) -> str:
+        """Export metrics in Prometheus text exposition format"""
+        with self._lock:
+            stages = list(self._stages.items())
+            gauges = list(self._gauges.items())
+
+        lines = [
+            "# HELP gryannote_stage_duration_seconds Duration of gryannote processing stages.",
+            "# TYPE gryannote_stage_duration_seconds histogram",
+        ]
+        for stage, stats in stages:
+            for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                lines.append(
+                    f'gryannote_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}'
+                )
+            lines.append(
+                f'gryannote_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats.count}'
+            )
+            lines.append(
+                f'gryannote_stage_duration_seconds_sum{{stage="{stage}"}} {stats.duration_sum}'
+            )
+            lines.append(
+                f'gryannote_stage_duration_seconds_count{{stage="{stage}"}} {stats.count}'
+            )
+
+        for name, description, attribute in [
+            (
+                "stage_payload_bytes_total",
+                "Payload processed by stages, in bytes.",
+                "size_sum",
+            ),
+            (
+                "stage_items_total",
+                "Items (e.g. segments) processed by stages.",
+                "item_sum",
+            ),
+        ]:
+            lines.append(f"# HELP gryannote_{name} {description}")
+            lines.append(f"# TYPE gryannote_{name} counter")
+            for stage, stats in stages:
+                lines.append(
+                    f'gryannote_{name}{{stage="{stage}"}} {getattr(stats, attribute)}'
+                )
+
+        lines.append(
+            "# HELP gryannote_stage_peak_rss_bytes Process peak RSS observed at the end of stages."
+        )
+        lines.append("# TYPE gryannote_stage_peak_rss_bytes gauge")
+        for stage, stats in stages:
+            lines.append(
+                f'gryannote_stage_peak_rss_bytes{{stage="{stage}"}} {stats.peak_rss}'
+            )
+
+        lines.append("# HELP gryannote_peak_rss_bytes Process peak RSS.")
+        lines.append("# TYPE gryannote_peak_rss_bytes gauge")
+        lines.append(f"gryannote_peak_rss_bytes {get_peak_rss()}")
+
+        for name, value in gauges:
+            lines.append(f"# TYPE gryannote_{name} gauge")
+            lines.append(f"gryannote_{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# process-wide registry
+metrics = Metrics()
+
+
+class PipelineStageHook:
+    """
+    pyannote pipeline hook recording the duration of each step of the pipeline
+    (e.g. segmentation, embeddings...) as a "pipeline.<step>" stage.
+
+    Parameters:
+        registry: registry in which measures are recorded. Default to the process-wide one.
+        hook: optional hook to call as well, e.g. a progress hook.
+    """
+
+    def __init__(self, registry: Metrics = metrics, hook: Optional[Callable] = None):
+        self.registry = registry
+        self.hook = hook
+        self._last = time.perf_counter()
+        self._start = time.time()
+
+    def __call__(
+        self,
+        step_name: str,
+        step_artifact,
+        file: Optional[Dict] = None,
+        total: Optional[int] = None,
+        completed: Optional[int] = None,
+    ):
+        if self.hook is not None:
+            self.hook(
+                step_name, step_artifact, file=file, total=total, completed=completed
+            )
+
+        # progress updates are not the end of a step
+        if completed is not None:
+            return
+
+        now = time.perf_counter()
+        self.registry.add(
+            Measure(
+                stage=f"pipeline.{step_name}",
+                start=self._start,
+                duration=now - self._last,
+            )
+        )
+        self._last, self._start = now, time.time()
+
+
+def add_metrics_route(app, path: str = "/metrics", registry: Metrics = metrics):
+    """
+    Expose metrics in Prometheus format on a FastAPI application, e.g.:
+
+        app = FastAPI()
+        add_metrics_route(app)
+        app = gr.mount_gradio_app(app, demo, path="/")
+    """
+    from fastapi.responses import PlainTextResponse
+
+    def get_metrics() -> PlainTextResponse:
+        return PlainTextResponse(
+            registry.render_prometheus(), media_type="text/plain; version=0.0.4"
+        )
+
+    app.add_api_route(path, get_metrics, methods=["GET"])
+    return app
+
+
+def file_size(path: str | Path | None) -> Optional[int]:
+    """Size of file `path` in bytes, None if unavailable"""
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
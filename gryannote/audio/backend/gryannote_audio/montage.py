@@ -0,0 +1,139 @@
+"""Montages of audio excerpts (e.g. all turns of a speaker), decoded by seeking"""
+
+import struct
+from pathlib import Path
+from typing import Iterator, Sequence, Tuple
+
+import numpy as np
+
+# duration of the chunks streamed to the client, in seconds
+CHUNK_DURATION = 5.0
+
+
+def merge_segments(starts: Sequence[float], ends: Sequence[float]) -> np.ndarray:
+    """
+    Sorted and disjoint (start, end) segments, covering the given segments, so that
+    overlapping turns are only played once.
+
+    Returns
+    -------
+    segments: np.ndarray
+        (num_segments, 2) array
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    if len(starts) == 0:
+        return np.empty((0, 2))
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    # a segment starts a new group when it starts after every previous segment ended
+    max_ends = np.maximum.accumulate(ends)
+    first = np.flatnonzero(np.r_[True, starts[1:] > max_ends[:-1]])
+    return np.stack([starts[first], np.maximum.reduceat(ends, first)], axis=1)
+
+
+def wav_header(sample_rate: int, num_channels: int, size: int) -> bytes:
+    """Header of a 16-bit PCM wav file, with `size` bytes of samples"""
+    return b"".join(
+        [
+            b"RIFF",
+            struct.pack("<I", 36 + size),
+            b"WAVEfmt ",
+            struct.pack(
+                "<IHHIIHH",
+                16,
+                1,
+                num_channels,
+                sample_rate,
+                sample_rate * num_channels * 2,
+                num_channels * 2,
+                16,
+            ),
+            b"data",
+            struct.pack("<I", size),
+        ]
+    )
+
+
+def _excerpts(
+    path: str | Path, segments: np.ndarray, block_duration: float
+) -> Tuple[int, int, Iterator[Tuple[bool, np.ndarray]]]:
+    """
+    (sample rate, number of channels, blocks) of `segments` of `path`. Blocks are
+    (first block of a segment, (num_frames, num_channels) int16 samples) tuples, of at
+    most `block_duration` seconds. Only the requested excerpts are read and decoded.
+    """
+    import soundfile
+
+    try:
+        file = soundfile.SoundFile(str(path))
+    except RuntimeError as e:
+        # not supported by libsndfile (e.g. m4a, video files)
+        raise ValueError(f"Cannot seek into {path}: {e}") from e
+    sample_rate, num_channels = file.samplerate, file.channels
+
+    def blocks():
+        with file:
+            block_size = int(block_duration * sample_rate)
+            for start, end in segments:
+                frame = int(round(start * sample_rate))
+                num_frames = min(int(round(end * sample_rate)), file.frames) - frame
+                if num_frames <= 0:
+                    continue
+                file.seek(frame)
+                for i, block in enumerate(
+                    file.blocks(
+                        blocksize=block_size,
+                        frames=num_frames,
+                        dtype="int16",
+                        always_2d=True,
+                    )
+                ):
+                    yield i == 0, block
+
+    return sample_rate, num_channels, blocks()
+
+
+def iter_montage(
+    path: str | Path,
+    segments: np.ndarray,
+    gap: float = 0.25,
+    chunk_duration: float = CHUNK_DURATION,
+) -> Iterator[bytes]:
+    """
+    Stream `segments` of audio file `path` back-to-back, separated by `gap` seconds
+    of silence, as 16-bit PCM wav files of about `chunk_duration` seconds each (which
+    `AudioLabeling.stream_output` converts into chunks of a Gradio media stream).
+
+    Each segment is read by seeking into the file, so that the time and memory needed
+    only depend on the duration of the segments, not on the duration of the file.
+
+    Parameters:
+        path: audio file.
+        segments: sorted and disjoint (start, end) segments, in seconds (see
+            `merge_segments`).
+        gap: silence between segments, in seconds.
+        chunk_duration: duration of streamed chunks, in seconds.
+
+    Raises:
+        ValueError: if the format of `path` cannot be seeked into by libsndfile.
+    """
+    sample_rate, num_channels, blocks = _excerpts(path, segments, chunk_duration)
+    silence = np.zeros((int(gap * sample_rate), num_channels), dtype="<i2").tobytes()
+    chunk_size = int(chunk_duration * sample_rate) * num_channels * 2
+
+    def chunk(samples: bytearray) -> bytes:
+        return wav_header(sample_rate, num_channels, len(samples)) + samples
+
+    buffer = bytearray()
+    started = False
+    for first, block in blocks:
+        if first and started:
+            buffer += silence
+        buffer += block.astype("<i2", copy=False).tobytes()
+        started = True
+        if len(buffer) >= chunk_size:
+            yield chunk(buffer)
+            buffer = bytearray()
+    if buffer:
+        yield chunk(buffer)
@@ -0,0 +1,203 @@
+"""Bulk operations on annotations (renaming, merging speakers, filling gaps...)
+
+Operations are applied on the arrays of a `SegmentIndex` (start and end times, label
+codes), so that their cost does not depend on the number of segments in Python.
+"""
+
+import json
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+from pyannote.core import Annotation as PyannoteAnnotation
+from pyannote.core import Segment
+
+from .core import Annotation
+from .index import SegmentIndex
+from .metrics import metrics
+
+
+def rename(index: SegmentIndex, mapping: Mapping[str, str]) -> SegmentIndex:
+    """Rename speakers, as {old label: new label}. Speakers renamed with the same
+    label are merged (see `merge_speakers`)."""
+    labels = np.array(
+        [mapping.get(label, label) for label in index.labels.tolist()], dtype=object
+    )
+    # only distinct labels are compared, not labels of each segment
+    labels, inverse = np.unique(labels, return_inverse=True)
+    return SegmentIndex.from_codes(
+        index.starts, index.ends, inverse.reshape(-1)[index.codes], labels
+    )
+
+
+def merge_speakers(
+    index: SegmentIndex, speakers: Iterable[str], into: Optional[str] = None
+) -> SegmentIndex:
+    """Label segments of `speakers` with `into` (default to the first of `speakers`).
+    Overlapping segments of the merged speaker are merged as well."""
+    speakers = list(speakers)
+    if not speakers:
+        return index
+    into = speakers[0] if into is None else into
+    index = rename(index, {speaker: into for speaker in speakers})
+    return fill_gaps(index, 0.0, speakers=[into])
+
+
+def drop_short(index: SegmentIndex, min_duration: float) -> SegmentIndex:
+    """Drop segments shorter than `min_duration` seconds"""
+    keep = index.ends - index.starts >= min_duration
+    return SegmentIndex.from_codes(
+        index.starts[keep], index.ends[keep], index.codes[keep], index.labels
+    )
+
+
+def fill_gaps(
+    index: SegmentIndex, max_gap: float, speakers: Optional[Iterable[str]] = None
+) -> SegmentIndex:
+    """
+    Merge consecutive segments of the same speaker separated by at most `max_gap`
+    seconds (overlapping segments included).
+
+    Parameters:
+        index: segments
+        max_gap: maximum gap between two merged segments, in seconds
+        speakers: only merge segments of these speakers. Default to all speakers.
+    """
+    if len(index) == 0:
+        return index
+
+    # segments grouped by speaker, sorted by start time within each group
+    order = np.lexsort((index.starts, index.codes))
+    starts, ends, codes = index.starts[order], index.ends[order], index.codes[order]
+
+    # running maximum of end times, restarted for each speaker: times of the i-th
+    # speaker are offset by i * span, hence greater than times of previous speakers
+    span = float(ends.max() - starts.min()) + max_gap + 1.0
+    offsets = codes * span
+    max_ends = np.maximum.accumulate(ends + offsets) - offsets
+
+    # a segment starts a new group when it starts more than `max_gap` seconds after
+    # every previous segment of the same speaker ended
+    first = np.r_[
+        True,
+        (codes[1:] != codes[:-1]) | (starts[1:] - max_ends[:-1] > max_gap),
+    ]
+    if speakers is not None:
+        merged = np.isin(index.labels[codes], list(speakers))
+        first |= ~merged
+    first = np.flatnonzero(first)
+
+    return SegmentIndex.from_codes(
+        starts[first],
+        np.maximum.reduceat(ends, first),
+        codes[first],
+        index.labels,
+    )
+
+
+def shift(index: SegmentIndex, offset: float) -> SegmentIndex:
+    """Shift segments by `offset` seconds. Segments are cropped at 0, and dropped if
+    they end before."""
+    starts = np.maximum(index.starts + offset, 0.0)
+    ends = index.ends + offset
+    keep = ends > starts
+    return SegmentIndex.from_codes(
+        starts[keep], ends[keep], index.codes[keep], index.labels
+    )
+
+
+# name => operation, as used by `apply_operations`
+OPERATIONS: Dict[str, Callable[..., SegmentIndex]] = {
+    "rename": rename,
+    "merge_speakers": merge_speakers,
+    "drop_short": drop_short,
+    "fill_gaps": fill_gaps,
+    "shift": shift,
+}
+
+
+def to_annotations(index: SegmentIndex) -> List[Annotation]:
+    """Segments of `index`, as `Annotation` objects sorted by start time"""
+    return [
+        Annotation(start=start, end=end, speaker=label)
+        for start, end, label in zip(
+            index.starts.tolist(),
+            index.ends.tolist(),
+            index.labels[index.codes].tolist(),
+        )
+    ]
+
+
+def to_pyannote(index: SegmentIndex, uri: Optional[str] = None) -> PyannoteAnnotation:
+    """Segments of `index`, as a pyannote Annotation"""
+    return PyannoteAnnotation.from_records(
+        (
+            (Segment(start, end), track, label)
+            for track, (start, end, label) in enumerate(
+                zip(
+                    index.starts.tolist(),
+                    index.ends.tolist(),
+                    index.labels[index.codes].tolist(),
+                )
+            )
+        ),
+        uri=uri,
+    )
+
+
+def apply_operations(
+    annotations: PyannoteAnnotation | List[Annotation] | SegmentIndex,
+    operations: Sequence[Mapping] | str,
+) -> PyannoteAnnotation | List[Annotation] | SegmentIndex:
+    """
+    Apply bulk `operations` on `annotations`, in one pass over their arrays.
+
+    Parameters:
+        annotations: annotations, as a pyannote Annotation, a list of `Annotation`
+            objects or a `SegmentIndex`.
+        operations: operations applied in order, as mappings (or a JSON list of
+            objects) with the name of the operation in "operation" and its parameters
+            in other keys (see `OPERATIONS`), e.g.
+            [
+                {"operation": "merge_speakers", "speakers": ["A", "B"]},
+                {"operation": "rename", "mapping": {"A": "Alice"}},
+                {"operation": "fill_gaps", "max_gap": 0.5},
+                {"operation": "drop_short", "min_duration": 0.2},
+                {"operation": "shift", "offset": -1.5},
+            ]
+    Returns:
+        updated annotations, of the same type as `annotations`.
+    """
+    if isinstance(operations, str):
+        operations = json.loads(operations)
+    if isinstance(operations, Mapping):
+        operations = [operations]
+    if not isinstance(operations, Sequence) or isinstance(operations, str):
+        raise ValueError(f"Operations must be a list, got {operations!r}")
+
+    if isinstance(annotations, SegmentIndex):
+        index = annotations
+    else:
+        index = SegmentIndex.from_annotations(annotations)
+
+    with metrics.measure("annotations.operations", count=len(index)):
+        for operation in operations:
+            if not isinstance(operation, Mapping):
+                raise ValueError(
+                    f"Operations must be mappings with an 'operation' key, got {operation!r}"
+                )
+            parameters = dict(operation)
+            name = parameters.pop("operation", None)
+            if name not in OPERATIONS:
+                raise ValueError(
+                    f"Unknown operation {name}, choose one of {', '.join(OPERATIONS)}"
+                )
+            try:
+                index = OPERATIONS[name](index, **parameters)
+            except TypeError as e:
+                raise ValueError(f"Invalid parameters for {name}: {e}") from e
+
+    if isinstance(annotations, SegmentIndex):
+        return index
+    if isinstance(annotations, PyannoteAnnotation):
+        return to_pyannote(index, uri=annotations.uri)
+    return to_annotations(index)
@@ -0,0 +1,228 @@
+"""Bounded pool of ffmpeg transcoding jobs, shared by gryannote components"""
+
+import io
+import os
+import shutil
+import signal
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from gradio.exceptions import Error
+
+from .metrics import file_size, metrics
+
+# sample rates of ADTS headers, by sampling frequency index
+ADTS_SAMPLE_RATES = [
+    96000,
+    88200,
+    64000,
+    48000,
+    44100,
+    32000,
+    24000,
+    22050,
+    16000,
+    12000,
+    11025,
+    8000,
+    7350,
+]
+
+
+def adts_duration(data: bytes) -> float:
+    """Duration of AAC audio in an ADTS stream, in seconds, read from frame headers"""
+    duration, offset = 0.0, 0
+    while offset + 7 <= len(data):
+        header = data[offset : offset + 7]
+        if header[0] != 0xFF or header[1] & 0xF0 != 0xF0:
+            raise ValueError(f"Invalid ADTS frame header at byte {offset}")
+        sample_rate = ADTS_SAMPLE_RATES[(header[2] >> 2) & 0x0F]
+        length = ((header[3] & 0x03) << 11) | (header[4] << 3) | (header[5] >> 5)
+        # each raw data block holds 1024 samples
+        duration += ((header[6] & 0x03) + 1) * 1024 / sample_rate
+        offset += max(length, 7)
+    return duration
+
+
+class TranscoderPool:
+    """
+    Runs audio conversions with ffmpeg, with a cap on the number of concurrent ffmpeg
+    processes, a bounded queue of pending conversions, and a timeout per conversion.
+
+    Each conversion spawns its own ffmpeg process, from a bounded pool of worker
+    threads: the pool caps how many ffmpeg processes run at once, not the cost of
+    starting them. Audio samples are piped to and from ffmpeg, instead of going
+    through temporary files (as with pydub).
+
+    Parameters:
+        max_workers: maximum number of concurrent ffmpeg processes. Default to half
+            the number of CPUs.
+        max_queue_size: maximum number of pending conversions. Conversions submitted
+            when the queue is full are rejected right away.
+        timeout: maximum duration of a conversion, in seconds. ffmpeg is killed when
+            exceeded. None for no limit.
+        ffmpeg: ffmpeg executable.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue_size: int = 32,
+        timeout: Optional[float] = 60.0,
+        ffmpeg: str = "ffmpeg",
+    ):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.configure(
+            max_workers=max_workers,
+            max_queue_size=max_queue_size,
+            timeout=timeout,
+            ffmpeg=ffmpeg,
+        )
+
+    def configure(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue_size: int = 32,
+        timeout: Optional[float] = 60.0,
+        ffmpeg: str = "ffmpeg",
+    ):
+        if max_workers is None:
+            max_workers = max(1, (os.cpu_count() or 2) // 2)
+        if max_workers < 1:
+            raise ValueError(
+                f"`max_workers` must be strictly positive, got {max_workers}"
+            )
+        if max_queue_size < 0:
+            raise ValueError(f"`max_queue_size` must be positive, got {max_queue_size}")
+        with self._lock:
+            self.max_workers = max_workers
+            self.max_queue_size = max_queue_size
+            self.timeout = timeout
+            self.ffmpeg = ffmpeg
+            # running conversions complete on the previous workers
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def encode(
+        self, data: np.ndarray, sample_rate: int, path: str | Path, format: str
+    ) -> str:
+        """Encode audio samples into file `path`, with the given format"""
+        from gradio import processing_utils
+
+        data = processing_utils.convert_to_16_bit_wav(data)
+        channels = 1 if data.ndim == 1 else data.shape[1]
+        args = [
+            *("-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels)),
+            *("-i", "pipe:0", "-f", format, str(path)),
+        ]
+        with metrics.measure("audio.transcode", size=data.nbytes):
+            self._submit(args, np.ascontiguousarray(data).tobytes())
+        return str(path)
+
+    def convert(self, source: str | Path, path: str | Path, format: str) -> str:
+        """Convert audio file `source` into file `path`, with the given format"""
+        args = ["-i", str(source), "-f", format, str(path)]
+        with metrics.measure("audio.transcode", size=file_size(source)):
+            self._submit(args)
+        return str(path)
+
+    def decode(self, source: str | Path) -> Tuple[int, np.ndarray]:
+        """
+        Decode audio (or the audio stream of a video) of file `source`.
+
+        Returns
+        -------
+        sample_rate, data:
+            sample rate, and 16-bit samples with shape (num_samples,) for mono audio,
+            (num_samples, num_channels) otherwise, as `processing_utils.audio_from_file`
+        """
+        import soundfile as sf
+
+        args = ["-i", str(source), "-vn", "-f", "wav", "-acodec", "pcm_s16le", "pipe:1"]
+        with metrics.measure("audio.transcode", size=file_size(source)):
+            wav = self._submit(args, output=True)
+        data, sample_rate = sf.read(io.BytesIO(wav), dtype="int16")
+        return sample_rate, data
+
+    def to_adts(self, data: bytes) -> Tuple[bytes, float]:
+        """
+        Convert audio file content `data` (e.g. a wav chunk) into AAC in an ADTS
+        stream, as expected by Gradio media streams.
+
+        Returns
+        -------
+        data, duration:
+            ADTS stream, and its duration in seconds
+        """
+        args = ["-i", "pipe:0", "-f", "adts", "pipe:1"]
+        with metrics.measure("audio.transcode", size=len(data)):
+            adts = self._submit(args, data, output=True)
+        return adts, adts_duration(adts)
+
+    def _submit(
+        self, args: List[str], input: Optional[bytes] = None, output: bool = False
+    ) -> Optional[bytes]:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue_size:
+                raise Error("Server is busy, please try again later")
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="gryannote-transcoder",
+                )
+            future = self._executor.submit(self._run, args, input, self.timeout, output)
+            metrics.set_gauge("transcoder_pending", self._pending)
+        future.add_done_callback(self._on_done)
+        return future.result()
+
+    def _on_done(self, _):
+        with self._lock:
+            self._pending -= 1
+            metrics.set_gauge("transcoder_pending", self._pending)
+
+    def _run(
+        self,
+        args: List[str],
+        input: Optional[bytes],
+        timeout: Optional[float],
+        output: bool = False,
+    ) -> Optional[bytes]:
+        """Run ffmpeg with `args`. Returns its standard output if `output` is True."""
+        ffmpeg = shutil.which(self.ffmpeg)
+        if ffmpeg is None:
+            raise RuntimeError(f"{self.ffmpeg} is required to convert audio")
+
+        process = subprocess.Popen(
+            [ffmpeg, "-hide_banner", "-loglevel", "error", "-y", *args],
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE if output else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            # so that processes spawned by ffmpeg are killed along with it
+            start_new_session=True,
+        )
+        try:
+            stdout, stderr = process.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+            process.communicate()
+            raise Error(f"Audio conversion timed out after {timeout} seconds")
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"Audio conversion failed: {stderr.decode(errors='replace').strip()}"
+            )
+        return stdout
+
+
+# process-wide pool shared by gryannote components
+transcoder = TranscoderPool()
@@ -1,10 +1,14 @@
 import {FileData} from "@gradio/client"
-import type {Annotation} from "./types.ts"
+import type {Annotation, SpeakerTable} from "./types.ts"
 
 
 export default class AnnotatedAudioData {
 	file_data: FileData;
 	annotations?: Annotation[] | null;
+	peaks?: number[] | null;
+	duration?: number | null;
+	annotations_id?: string | null;
+	speakers?: SpeakerTable | null;
 
 
 	constructor({
@@ -28,5 +32,9 @@ export default class AnnotatedAudioData {
 	}) {
 		this.file_data = new FileData({path, url, orig_name, size, blob, is_stream, mime_type, alt_text})
 		this.annotations = null;
+		this.peaks = null;
+		this.duration = null;
+		this.annotations_id = null;
+		this.speakers = null;
 	}
 }
\ No newline at end of file
@@ -32,6 +32,11 @@ export type Annotation = {
 	speaker: string;
 }
 
+export type SpeakerTable = {
+	labels: string[];
+	palette: string[];
+}
+
 export type Label = {
 	name: string;
 	color: string;
@@ -1,4 +1,42 @@
+import importlib
 
-from .pipelineselector import PipelineSelector
+# public name => module defining it. Modules are imported on first access (PEP 562)
+_EXPORTS = {
+    "PipelineSelector": ".pipelineselector",
+    "InferenceOptions": ".inference",
+    "MicroBatching": ".batching",
+    "CPUBackend": ".optimization",
+    "PostProcessing": ".postprocessing",
+    "PipelineExecutor": ".executor",
+    "InferenceWorkers": ".workers",
+    "OnlineDiarization": ".online",
+    "PipelineRegistry": ".registry",
+    "ParameterSweep": ".sweep",
+    "SweepResult": ".sweep",
+}
 
-__all__ = ['PipelineSelector']
+__all__ = [
+    "PipelineSelector",
+    "InferenceOptions",
+    "MicroBatching",
+    "CPUBackend",
+    "PostProcessing",
+    "PipelineExecutor",
+    "InferenceWorkers",
+    "OnlineDiarization",
+    "PipelineRegistry",
+    "ParameterSweep",
+    "SweepResult",
+]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,220 @@
+"""Dynamic micro-batching of model inference across concurrent pipeline runs"""
+
+import contextlib
+import functools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
+
+import torch
+from pyannote.audio import Pipeline
+
+
+def _slice(outputs: Any, start: int, end: int) -> Any:
+    """Slice batched outputs (possibly a tuple of batched outputs) along first dimension"""
+    if isinstance(outputs, tuple):
+        return tuple(_slice(output, start, end) for output in outputs)
+    return outputs[start:end]
+
+
+@dataclass
+class _Request:
+    args: Tuple[Optional[torch.Tensor], ...]
+    future: Future
+
+    @property
+    def size(self) -> int:
+        return len(next(arg for arg in self.args if arg is not None))
+
+    @property
+    def key(self) -> Tuple:
+        """Requests can only be batched together if they share this key"""
+        return tuple(
+            None if arg is None else (tuple(arg.shape[1:]), arg.dtype)
+            for arg in self.args
+        )
+
+
+class MicroBatcher:
+    """
+    Gather calls of a batched function coming from concurrent threads into larger
+    batches, and hand results back to each caller.
+
+    Calls are batched along their first dimension. A batch is run as soon as it
+    reaches `max_batch_size`, when the oldest call has been waiting for `max_wait`
+    seconds, or when every open session (see `session`) is waiting on this batcher,
+    as no other call can join the batch in that case. Hence, a single user does not
+    pay any batching latency.
+
+    Parameters:
+        fn: function taking tensors batched along their first dimension and returning
+            a tensor or an array batched along its first dimension.
+        max_batch_size: maximum number of samples per batch. A single call larger than
+            this is run alone.
+        max_wait: maximum time (in seconds) a call waits for other calls to join.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[..., Any],
+        max_batch_size: int = 64,
+        max_wait: float = 0.01,
+    ):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending: List[_Request] = []
+        self._condition = threading.Condition()
+        self._sessions = 0
+        self._worker: Optional[threading.Thread] = None
+
+    @contextlib.contextmanager
+    def session(self):
+        """Register a pipeline run that may submit calls to this batcher"""
+        with self._condition:
+            self._sessions += 1
+        try:
+            yield self
+        finally:
+            with self._condition:
+                self._sessions -= 1
+                self._condition.notify_all()
+
+    def __call__(self, *args: Optional[torch.Tensor]) -> Any:
+        request = _Request(args=args, future=Future())
+        with self._condition:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="gryannote-micro-batcher", daemon=True
+                )
+                self._worker.start()
+            self._pending.append(request)
+            self._condition.notify_all()
+        return request.future.result()
+
+    def _ready(self, deadline: float) -> bool:
+        size = sum(request.size for request in self._pending)
+        return (
+            size >= self.max_batch_size
+            or len(self._pending) >= self._sessions
+            or time.monotonic() >= deadline
+        )
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.max_wait
+                while not self._ready(deadline):
+                    self._condition.wait(timeout=deadline - time.monotonic())
+                batch = self._take()
+            self._process(batch)
+
+    def _take(self) -> List[_Request]:
+        """Pop the oldest pending call and compatible ones, up to `max_batch_size`"""
+        first = self._pending.pop(0)
+        batch, size = [first], first.size
+        for request in list(self._pending):
+            if request.key != first.key:
+                continue
+            if size + request.size > self.max_batch_size:
+                break
+            self._pending.remove(request)
+            batch.append(request)
+            size += request.size
+        return batch
+
+    def _process(self, batch: List[_Request]):
+        try:
+            if len(batch) == 1:
+                batch[0].future.set_result(self.fn(*batch[0].args))
+                return
+
+            args = [
+                None
+                if batch[0].args[i] is None
+                else torch.cat([request.args[i] for request in batch])
+                for i in range(len(batch[0].args))
+            ]
+            outputs = self.fn(*args)
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        start = 0
+        for request in batch:
+            request.future.set_result(_slice(outputs, start, start + request.size))
+            start += request.size
+
+
+class _BatchedEmbedding:
+    """Proxy of a pyannote speaker embedding whose calls go through a `MicroBatcher`"""
+
+    def __init__(self, embedding, batcher: MicroBatcher):
+        self._wrapped = embedding
+        self._batcher = batcher
+
+    def __call__(self, waveforms: torch.Tensor, masks: torch.Tensor = None):
+        return self._batcher(waveforms, masks)
+
+    def __getattr__(self, name: str):
+        return getattr(self._wrapped, name)
+
+
+class MicroBatching:
+    """
+    Share segmentation and embedding forward passes of a pipeline between the
+    requests running it concurrently.
+
+    Parameters:
+        max_batch_size: maximum number of chunks per forward pass.
+        max_wait: maximum time (in seconds) a chunk waits for chunks of other requests.
+    """
+
+    def __init__(self, max_batch_size: int = 64, max_wait: float = 0.01):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+    def install(self, pipeline: Pipeline) -> Pipeline:
+        """Route `pipeline` inference through batchers shared by its runs. Idempotent."""
+        if getattr(pipeline, "_micro_batchers", None) is not None:
+            return pipeline
+
+        batchers: List[MicroBatcher] = []
+
+        segmentation = getattr(pipeline, "_segmentation", None)
+        if segmentation is not None and hasattr(segmentation, "infer"):
+            batcher = MicroBatcher(
+                segmentation.infer, self.max_batch_size, self.max_wait
+            )
+            segmentation.infer = batcher
+            batchers.append(batcher)
+
+        embedding = getattr(pipeline, "_embedding", None)
+        if embedding is not None:
+            batcher = MicroBatcher(embedding, self.max_batch_size, self.max_wait)
+            object.__setattr__(
+                pipeline, "_embedding", _BatchedEmbedding(embedding, batcher)
+            )
+            batchers.append(batcher)
+
+        object.__setattr__(pipeline, "_micro_batchers", batchers)
+
+        apply = pipeline.apply
+
+        @functools.wraps(apply)
+        def batched_apply(*args, **kwargs):
+            # register this run so that batchers know how many calls they can expect
+            with contextlib.ExitStack() as stack:
+                for batcher in batchers:
+                    stack.enter_context(batcher.session())
+                return apply(*args, **kwargs)
+
+        object.__setattr__(pipeline, "apply", batched_apply)
+        return pipeline
@@ -0,0 +1,165 @@
+"""Bounded, cancellable execution of pipeline runs"""
+
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Hashable, List, Optional
+
+from gradio.exceptions import Error
+
+
+class Cancelled(Exception):
+    """Raised from pipeline hooks to stop a cancelled run"""
+
+
+class CancellableHook:
+    """pyannote hook raising `Cancelled` once `event` is set, and forwarding calls to
+    `hook`. Pipelines call hooks after each batch, hence stop shortly after."""
+
+    def __init__(self, event: threading.Event, hook: Optional[Callable] = None):
+        self.event = event
+        self.hook = hook
+
+    def __call__(self, *args, **kwargs):
+        if self.event.is_set():
+            raise Cancelled()
+        if self.hook is not None:
+            self.hook(*args, **kwargs)
+
+
+class Job:
+    """A pipeline run, submitted to a `PipelineExecutor`"""
+
+    def __init__(self, fn: Callable, session: Optional[Hashable]):
+        self.fn = fn
+        self.session = session
+        self.future: Future = Future()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Cancel the run, whether it is pending or running"""
+        self.cancel_event.set()
+        self.future.cancel()
+
+    def _run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(CancellableHook(self.cancel_event))
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class _PipelineQueue:
+    def __init__(self):
+        self.pending: Deque[Job] = deque()
+        self.running: List[Job] = []
+
+
+class PipelineExecutor:
+    """
+    Run pipelines in background threads, with a per-pipeline concurrency limit and a
+    bounded queue of pending runs.
+
+    Parameters:
+        max_concurrency: maximum number of concurrent runs of the same pipeline.
+        max_queue_size: maximum number of pending runs per pipeline. Runs submitted
+            when the queue is full are rejected right away.
+        max_workers: maximum number of threads, shared by all pipelines.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 1,
+        max_queue_size: int = 8,
+        max_workers: Optional[int] = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError(
+                f"`max_concurrency` must be strictly positive, got {max_concurrency}"
+            )
+        if max_queue_size < 0:
+            raise ValueError(f"`max_queue_size` must be positive, got {max_queue_size}")
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="gryannote-pipeline"
+        )
+        self._queues: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.RLock()
+
+    def submit(self, fn: Callable, pipeline, session: Optional[Hashable] = None) -> Job:
+        """
+        Submit a run of `pipeline`
+
+        Parameters
+        ----------
+        fn: callable
+            run, called with a `CancellableHook` to pass to the pipeline
+        pipeline: Pipeline
+            pipeline run by `fn`, on which the concurrency limit applies
+        session: hashable, optional
+            session the run belongs to (see `cancel_session`)
+
+        Raises
+        ------
+        Error
+            if too many runs of `pipeline` are pending
+        """
+        job = Job(fn, session)
+        with self._lock:
+            queue = self._queues.setdefault(pipeline, _PipelineQueue())
+            if len(queue.running) < self.max_concurrency:
+                self._start(queue, job)
+            elif len(queue.pending) < self.max_queue_size:
+                queue.pending.append(job)
+                job.future.add_done_callback(lambda _: self._on_done(queue, job))
+            else:
+                raise Error("Server is busy, please try again later")
+        return job
+
+    def _start(self, queue: _PipelineQueue, job: Job):
+        """Must be called with `self._lock` held"""
+        queue.running.append(job)
+        job.future.add_done_callback(lambda _: self._on_done(queue, job))
+        self._executor.submit(job._run)
+
+    def _on_done(self, queue: _PipelineQueue, job: Job):
+        with self._lock:
+            if job in queue.running:
+                queue.running.remove(job)
+            else:
+                # cancelled while pending
+                if job in queue.pending:
+                    queue.pending.remove(job)
+                return
+
+            while queue.pending and len(queue.running) < self.max_concurrency:
+                pending = queue.pending.popleft()
+                if not pending.future.cancelled():
+                    self._start(queue, pending)
+
+    def cancel_session(self, session: Hashable):
+        """Cancel pending and running runs of `session`"""
+        with self._lock:
+            jobs = [
+                job
+                for queue in self._queues.values()
+                for job in [*queue.pending, *queue.running]
+                if job.session == session
+            ]
+        for job in jobs:
+            job.cancel()
+
+    def install(self, demo):
+        """Cancel runs of sessions of `demo` when they end (e.g. tab is closed)"""
+        import gradio as gr
+
+        def cancel_session(request: gr.Request):
+            self.cancel_session(request.session_hash)
+
+        demo.unload(cancel_session)
+        return demo
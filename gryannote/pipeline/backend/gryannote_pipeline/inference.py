@@ -0,0 +1,125 @@
+"""CPU inference settings of pipelines"""
+
+import dataclasses
+import os
+import warnings
+from typing import Dict, Optional
+
+import torch
+from pyannote.audio import Pipeline
+
+# maximum batch size proposed in the configuration interface
+MAX_BATCH_SIZE = 128
+
+
+def get_num_cores() -> int:
+    """Number of CPU cores available to the current process"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+@dataclasses.dataclass
+class InferenceOptions:
+    """
+    A dataclass for specifying CPU inference settings of the pipelines loaded by the
+    `PipelineSelector` component. An instance of this class can be passed into the
+    `inference_options` parameter of `PipelineSelector`. Options set to None are left
+    to torch / pyannote defaults.
+
+    Parameters:
+        num_threads: number of threads used by torch for intra-op parallelism.
+            Note: this setting is process-wide.
+        num_interop_threads: number of threads used by torch for inter-op parallelism.
+            Note: this setting is process-wide and can only be set once, before any
+            inter-op parallel work has started.
+        segmentation_batch_size: batch size of the segmentation model inference
+        embedding_batch_size: batch size of the embedding model inference
+    """
+
+    num_threads: Optional[int] = None
+    num_interop_threads: Optional[int] = None
+    segmentation_batch_size: Optional[int] = None
+    embedding_batch_size: Optional[int] = None
+
+    @classmethod
+    def auto(
+        cls, concurrency: int = 1, num_cores: Optional[int] = None
+    ) -> "InferenceOptions":
+        """Pick inference settings suited to the host
+
+        Parameters
+        ----------
+        concurrency: int, optional
+            expected number of pipelines running at the same time. Cores are
+            shared between them to avoid oversubscription. Default to 1.
+        num_cores: int, optional
+            number of available cores. Default to the cores available to the
+            current process.
+        """
+        num_cores = num_cores or get_num_cores()
+        concurrency = max(1, concurrency)
+        num_threads = max(1, num_cores // concurrency)
+        # larger batches only pay off when there are enough threads to process them
+        batch_size = min(MAX_BATCH_SIZE, max(1, 4 * num_threads))
+        return cls(
+            num_threads=num_threads,
+            num_interop_threads=1 if concurrency > 1 else min(4, num_threads),
+            segmentation_batch_size=batch_size,
+            embedding_batch_size=batch_size,
+        )
+
+    def apply(self, pipeline: Optional[Pipeline] = None):
+        """Apply torch threading settings and, if provided, `pipeline` batch sizes"""
+        if self.num_threads and torch.get_num_threads() != self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        if (
+            self.num_interop_threads
+            and torch.get_num_interop_threads() != self.num_interop_threads
+        ):
+            try:
+                torch.set_num_interop_threads(self.num_interop_threads)
+            except RuntimeError:
+                warnings.warn(
+                    "Number of inter-op threads can only be set once, before any "
+                    "inference was run. Ignoring `num_interop_threads`."
+                )
+
+        if pipeline is None:
+            return
+
+        for name in ["segmentation_batch_size", "embedding_batch_size"]:
+            batch_size = getattr(self, name)
+            if batch_size and hasattr(pipeline, name):
+                setattr(pipeline, name, batch_size)
+
+    def get_specs(self, pipeline: Optional[Pipeline] = None) -> Dict:
+        """Specifications of these options, to be displayed in the configuration interface"""
+        num_cores = get_num_cores()
+        values = {
+            "num_threads": self.num_threads or torch.get_num_threads(),
+            "num_interop_threads": self.num_interop_threads
+            or torch.get_num_interop_threads(),
+        }
+        for name in ["segmentation_batch_size", "embedding_batch_size"]:
+            if getattr(self, name) or hasattr(pipeline, name):
+                values[name] = getattr(self, name) or getattr(pipeline, name)
+
+        param_specs = {}
+        for name, value in values.items():
+            high = num_cores if name.endswith("threads") else MAX_BATCH_SIZE
+            param_specs[name] = {
+                "component": "slider",
+                "value": str(value),
+                "min": "1",
+                "max": str(max(high, value)),
+                "step": "1",
+            }
+        return param_specs
+
+    def update(self, param_specs: Dict):
+        """Update options from specifications edited in the configuration interface"""
+        for name, specs in param_specs.items():
+            if hasattr(self, name):
+                setattr(self, name, int(specs["value"]))
@@ -0,0 +1,435 @@
+"""Online diarization of streamed audio, with a rolling buffer"""
+
+import secrets
+import shutil
+import threading
+import wave
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import torch
+from gradio import processing_utils
+from gradio.data_classes import FileData
+from gradio.exceptions import Error
+from gryannote_audio.cache import cache_manager, get_session
+from gryannote_audio.core import AnnotadedAudioData
+from gryannote_audio.metrics import metrics
+from pyannote.audio import Pipeline
+from pyannote.core import Annotation as PyannoteAnnotation
+from pyannote.core import Segment
+from scipy.optimize import linear_sum_assignment
+
+from .executor import Job
+
+# name of the directory of recordings, in Gradio upload folder
+RECORDINGS_DIRECTORY = "gryannote-live"
+
+
+def _recordings_dir() -> Path:
+    """Directory of recordings. Its files are served as is, without being copied into
+    the Gradio cache on each update (which would hash and copy the whole recording)."""
+    import gradio as gr
+    from gradio.data_classes import _StaticFiles
+    from gradio.utils import get_upload_folder
+
+    path = (Path(get_upload_folder()) / RECORDINGS_DIRECTORY).resolve()
+    path.mkdir(parents=True, exist_ok=True)
+    if path not in _StaticFiles.all_paths:
+        gr.set_static_paths(path)
+    return path
+
+
+@dataclass
+class OnlineState:
+    """Diarization state of a single stream (i.e. of a single recording)"""
+
+    uri: str
+    # audio of the rolling buffer, downmixed and resampled for the pipeline
+    buffer: np.ndarray
+    # time (in seconds) of the first sample of the buffer
+    buffer_start: float = 0.0
+    # end time (in seconds) of the last window submitted to the pipeline
+    last_window_end: float = 0.0
+    # annotations, with global speaker labels
+    annotation: Optional[PyannoteAnnotation] = None
+    # global speaker label => normalized embedding centroid
+    centroids: Dict[str, np.ndarray] = field(default_factory=dict)
+    # window (start, end) being diarized, and the corresponding run
+    window: Optional[Tuple[float, float]] = None
+    job: Optional[Job] = None
+    # whole recording, appended to as chunks are received
+    recording: Optional[wave.Wave_write] = None
+    recording_file: Optional[BinaryIO] = None
+    recording_path: Optional[str] = None
+    sample_rate: Optional[int] = None
+    peaks: List[float] = field(default_factory=list)
+    duration: float = 0.0
+
+
+class OnlineDiarization:
+    """
+    Diarization of a microphone stream (`AudioLabeling(streaming=True)`), as it is
+    recorded.
+
+    Streamed chunks are appended to a rolling buffer of the last `duration` seconds.
+    Every `step` seconds of audio, the pipeline is applied on the buffer in the
+    background, so that `step` never blocks the stream: if the previous window is
+    still being processed, the new one is skipped and the next run takes the latest
+    window instead. Annotations hence lag behind live by about one pipeline run on
+    `duration` seconds of audio (plus `stream_every`), whatever the recording length.
+
+    Each window is relabeled with global speaker labels: local speakers are matched
+    with the global speakers they overlap the most in the previous window, or else
+    with the closest speaker embedding centroid (when the pipeline returns speaker
+    embeddings). Annotations of the window then replace the previous ones.
+
+    The recording is written into a directory that Gradio serves as is (see
+    `gr.set_static_paths`): updates refer to the growing file, instead of a new
+    copy of it, and carry a bounded number of waveform peaks.
+
+    Parameters:
+        selector: `PipelineSelector` whose executor runs the pipeline.
+        duration: duration of the rolling buffer (i.e. of diarized windows), in seconds.
+        step: minimum duration of new audio between two pipeline runs, in seconds.
+        sample_rate: sample rate of audio passed to the pipeline.
+        max_distance: maximum cosine distance between a speaker embedding and a
+            centroid for them to be matched. None to only match overlapping speakers.
+        peaks_per_second: resolution of the waveform peaks sent to the frontend.
+        max_peaks: maximum number of waveform peaks sent on each update while
+            recording, so that updates do not grow with the recording. The final
+            value has full resolution.
+
+    Usage:
+        online = OnlineDiarization(pipeline_selector)
+
+        state = gr.State()
+        microphone = AudioLabeling(sources=["microphone"], streaming=True, type="numpy")
+        live = AudioLabeling(interactive=False)
+        microphone.stream(
+            online.step, [microphone, state, pipeline_selector], [state, live]
+        )
+        microphone.stop_recording(online.finish, state, [state, live, rttm])
+        online.install(demo)
+    """
+
+    def __init__(
+        self,
+        selector,
+        duration: float = 5.0,
+        step: float = 0.5,
+        sample_rate: int = 16000,
+        max_distance: Optional[float] = 0.5,
+        peaks_per_second: int = 100,
+        max_peaks: int = 4000,
+    ):
+        if step <= 0 or duration < step:
+            raise ValueError(
+                f"`step` must be positive and at most `duration`, got {step} and {duration}"
+            )
+        self.selector = selector
+        self.duration = duration
+        self.step_duration = step
+        self.sample_rate = sample_rate
+        self.max_distance = max_distance
+        self.peaks_per_second = peaks_per_second
+        self.max_peaks = max_peaks
+        # recordings in progress of each session, by uri
+        self._states: Dict[Hashable, Dict[str, OnlineState]] = {}
+        self._states_lock = threading.Lock()
+
+    def _init_state(self, sample_rate: int) -> OnlineState:
+        uri = f"live-{secrets.token_hex(4)}"
+        path = _recordings_dir() / uri / "recording.wav"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # header is updated on each write, so that the recording is always readable
+        recording_file = open(path, "wb")
+        recording = wave.open(recording_file, "wb")
+        recording.setnchannels(1)
+        recording.setsampwidth(2)
+        recording.setframerate(sample_rate)
+        state = OnlineState(
+            uri=uri,
+            buffer=np.zeros(0, dtype=np.float32),
+            annotation=PyannoteAnnotation(uri=uri),
+            recording=recording,
+            recording_file=recording_file,
+            recording_path=str(path.resolve()),
+            sample_rate=sample_rate,
+        )
+        with self._states_lock:
+            self._states.setdefault(get_session(), {})[uri] = state
+        return state
+
+    def _close(self, state: OnlineState):
+        """Close the recording of `state`, and forget it"""
+        with self._states_lock:
+            for session, states in list(self._states.items()):
+                if states.pop(state.uri, None) is not None and not states:
+                    del self._states[session]
+            if state.recording is not None:
+                state.recording.close()
+                state.recording_file.close()
+                state.recording = state.recording_file = None
+
+    def release(self, session: Hashable):
+        """Close and delete recordings of `session` that were not finished"""
+        with self._states_lock:
+            states = self._states.pop(session, {})
+        for state in states.values():
+            self._close(state)
+            if state.job is not None:
+                state.job.future.cancel()
+            shutil.rmtree(Path(state.recording_path).parent, ignore_errors=True)
+
+    def install(self, demo):
+        """Close recordings of sessions of `demo` that end while streaming"""
+        import gradio as gr
+
+        def release_session(request: gr.Request):
+            self.release(request.session_hash)
+
+        demo.unload(release_session)
+        return demo
+
+    def _append(self, state: OnlineState, sample_rate: int, data: np.ndarray):
+        """Append chunk to the recording and to the rolling buffer"""
+        data = processing_utils.convert_to_16_bit_wav(data)
+        if data.ndim > 1:
+            data = data.mean(axis=1).astype(np.int16)
+        state.recording.writeframes(data.tobytes())
+        state.recording_file.flush()
+
+        hop = max(1, round(sample_rate / self.peaks_per_second))
+        samples = np.abs(data.astype(np.float32) / 32768.0)
+        samples = np.pad(samples, (0, -len(samples) % hop))
+        state.peaks.extend(np.round(samples.reshape(-1, hop).max(axis=1), 4).tolist())
+        state.duration += len(data) / sample_rate
+
+        waveform = torch.from_numpy(data.astype(np.float32) / 32768.0)
+        if sample_rate != self.sample_rate:
+            import torchaudio
+
+            waveform = torchaudio.functional.resample(
+                waveform, sample_rate, self.sample_rate
+            )
+        buffer = np.concatenate([state.buffer, waveform.numpy()])
+        max_samples = round(self.duration * self.sample_rate)
+        if len(buffer) > max_samples:
+            state.buffer_start += (len(buffer) - max_samples) / self.sample_rate
+            buffer = buffer[-max_samples:]
+        state.buffer = buffer
+
+    def _submit(self, state: OnlineState, pipeline: Pipeline):
+        """Diarize the rolling buffer in the background, unless busy"""
+        window = (
+            state.buffer_start,
+            state.buffer_start + len(state.buffer) / self.sample_rate,
+        )
+        file = {
+            "waveform": torch.from_numpy(state.buffer.copy()).unsqueeze(0),
+            "sample_rate": self.sample_rate,
+            "uri": state.uri,
+        }
+
+        def run(hook):
+            with metrics.measure("pipeline.online"):
+                return self.selector.run(file, pipeline=pipeline, hook=hook)
+
+        try:
+            state.job = self.selector._executor.submit(
+                run, pipeline, session=get_session()
+            )
+        except Error:
+            # too many runs pending: skip this window
+            return
+        state.window = window
+        state.last_window_end = window[1]
+
+    def _collect(self, state: OnlineState):
+        """Wait for the window being diarized, and merge it unless the run failed"""
+        job, state.job = state.job, None
+        try:
+            output = job.future.result()
+        except Exception:
+            # e.g. cancelled, as the session ended
+            return
+        self._merge(state, output)
+
+    def _merge(self, state: OnlineState, output):
+        """Relabel the diarized window with global labels, and merge it"""
+        window_start, window_end = state.window
+        state.window = None
+        local = getattr(output, "speaker_diarization", output)
+        embeddings = getattr(output, "speaker_embeddings", None)
+        # shift from window time to stream time
+        local = local.rename_tracks().support()
+        shifted = PyannoteAnnotation(uri=state.uri)
+        for segment, track, label in local.itertracks(yield_label=True):
+            shifted[
+                Segment(segment.start + window_start, segment.end + window_start), track
+            ] = label
+
+        mapping = self._match(state, shifted, embeddings, window_start)
+        relabeled = shifted.rename_labels(mapping=mapping)
+
+        # annotations before the window are final, the window's ones replace the others
+        kept = state.annotation.crop(Segment(0.0, window_start), mode="intersection")
+        state.annotation = kept.update(
+            relabeled.crop(Segment(window_start, window_end), mode="intersection")
+        ).support()
+
+        metrics.set_gauge("online_lag_seconds", max(0.0, state.duration - window_end))
+
+    def _match(
+        self,
+        state: OnlineState,
+        local: PyannoteAnnotation,
+        embeddings: Optional[np.ndarray],
+        window_start: float,
+    ) -> Dict[str, str]:
+        """Map local speakers of a window to global speakers"""
+        local_labels = local.labels()
+        mapping: Dict[str, str] = {}
+
+        # speakers overlapping in the part of the window diarized before
+        previous = state.annotation.crop(
+            Segment(window_start, state.duration), mode="intersection"
+        )
+        if previous and local:
+            global_labels = previous.labels()
+            cooccurrence = local * previous
+            rows, cols = linear_sum_assignment(-cooccurrence)
+            for i, j in zip(rows, cols):
+                if cooccurrence[i, j] > 0:
+                    mapping[local_labels[i]] = global_labels[j]
+
+        if embeddings is not None:
+            embeddings = embeddings / np.linalg.norm(
+                embeddings, axis=1, keepdims=True
+            ).clip(min=1e-8)
+            # embeddings are sorted in labels order
+            local_embeddings = {
+                label: embedding
+                for label, embedding in zip(local_labels, embeddings)
+                if np.all(np.isfinite(embedding))
+            }
+        else:
+            local_embeddings = {}
+
+        # speakers that were silent in the previous window
+        unmatched = [label for label in local_labels if label not in mapping]
+        available = [
+            label for label in state.centroids if label not in mapping.values()
+        ]
+        if self.max_distance is not None and unmatched and available:
+            candidates = [label for label in unmatched if label in local_embeddings]
+            if candidates:
+                distances = (
+                    1.0
+                    - np.stack([local_embeddings[label] for label in candidates])
+                    @ np.stack([state.centroids[label] for label in available]).T
+                )
+                rows, cols = linear_sum_assignment(distances)
+                for i, j in zip(rows, cols):
+                    if distances[i, j] < self.max_distance:
+                        mapping[candidates[i]] = available[j]
+
+        # new speakers
+        used = set(state.annotation.labels()) | set(state.centroids)
+        for label in local_labels:
+            if label not in mapping:
+                mapping[label] = f"SPEAKER_{len(used):02d}"
+                used.add(mapping[label])
+
+        for label, embedding in local_embeddings.items():
+            centroid = state.centroids.get(mapping[label])
+            if centroid is not None:
+                embedding = centroid + embedding
+                embedding /= max(np.linalg.norm(embedding), 1e-8)
+            state.centroids[mapping[label]] = embedding
+        return mapping
+
+    def _value(
+        self, state: OnlineState, max_peaks: Optional[int] = None
+    ) -> AnnotadedAudioData:
+        peaks = state.peaks
+        if max_peaks is not None and len(peaks) > max_peaks:
+            # coarser peaks, covering the whole recording
+            hop = -(-len(peaks) // max_peaks)
+            peaks = np.pad(np.asarray(peaks), (0, -len(peaks) % hop))
+            peaks = peaks.reshape(-1, hop).max(axis=1).tolist()
+        return AnnotadedAudioData(
+            file_data=FileData(
+                path=state.recording_path,
+                orig_name="recording.wav",
+                size=Path(state.recording_path).stat().st_size,
+            ),
+            annotations=state.annotation,
+            peaks=peaks,
+            duration=state.duration,
+        )
+
+    def step(
+        self,
+        chunk: Tuple[int, np.ndarray] | None,
+        state: OnlineState | None,
+        pipeline: Pipeline | None = None,
+    ) -> Tuple[OnlineState | None, AnnotadedAudioData | None]:
+        """
+        Listener of the `stream` event of an `AudioLabeling` component (with "numpy"
+        type), also taking a `gr.State` (initially None) storing `OnlineState`.
+
+        Returns
+        -------
+        state, value:
+            updated state, and recording with its annotations so far
+        """
+        if chunk is None:
+            return state, None
+        sample_rate, data = chunk
+        if state is None:
+            state = self._init_state(sample_rate)
+        self._append(state, sample_rate, data)
+
+        if state.job is not None and state.job.future.done():
+            self._collect(state)
+
+        pipeline = pipeline or getattr(self.selector, "_pipeline", None)
+        if pipeline is None:
+            raise Error("Please select a pipeline first")
+        if (
+            state.job is None
+            and state.duration - state.last_window_end >= self.step_duration
+        ):
+            self._submit(state, pipeline)
+
+        return state, self._value(state, max_peaks=self.max_peaks)
+
+    def finish(
+        self, state: OnlineState | None, pipeline: Pipeline | None = None
+    ) -> Tuple[None, AnnotadedAudioData | None, PyannoteAnnotation | None]:
+        """
+        Listener of the `stop_recording` event: diarize the end of the recording,
+        and close it.
+
+        Returns
+        -------
+        state, value, annotation:
+            reset state, final recording with its annotations, and annotations
+        """
+        if state is None:
+            return None, None, None
+
+        if state.job is not None:
+            self._collect(state)
+        pipeline = pipeline or getattr(self.selector, "_pipeline", None)
+        if pipeline is not None and state.last_window_end < state.duration:
+            self._submit(state, pipeline)
+            if state.job is not None:
+                self._collect(state)
+
+        self._close(state)
+        cache_manager.track(state.recording_path)
+        return None, self._value(state), state.annotation
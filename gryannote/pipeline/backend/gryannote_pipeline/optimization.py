@@ -0,0 +1,260 @@
+"""Optimized CPU backends for the models of pipelines"""
+
+import copy
+import dataclasses
+import hashlib
+import os
+import time
+import warnings
+from pathlib import Path
+from typing import Dict, Iterator, Literal, Mapping, Optional, Tuple
+
+import torch
+import torch.ao.nn.quantized.dynamic as nnqd
+from pyannote.audio import Pipeline
+from pyannote.core import Annotation as PyannoteAnnotation
+from pyannote.metrics.diarization import DiarizationErrorRate
+
+# layers converted by dynamic int8 quantization
+QUANTIZED_LAYERS = {torch.nn.LSTM, torch.nn.GRU, torch.nn.Linear}
+# marks models already converted, as pipelines may be installed several times
+CONVERTED_ATTRIBUTE = "_gryannote_backend"
+# original models of pipelines, to compare them with converted ones
+ORIGINALS_ATTRIBUTE = "_gryannote_original_models"
+# dynamically quantized counterparts of QUANTIZED_LAYERS
+QUANTIZED_MODULES = {
+    torch.nn.LSTM: nnqd.LSTM,
+    torch.nn.GRU: nnqd.GRU,
+    torch.nn.Linear: nnqd.Linear,
+}
+
+
+def _default_cache_dir() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(cache_home) / "gryannote" / "cpu_backend"
+
+
+def _models(pipeline: Pipeline) -> Iterator[Tuple[str, object, str]]:
+    """(name, owner, attribute) of the segmentation and embedding models of `pipeline`"""
+    segmentation = getattr(pipeline, "_segmentation", None)
+    if isinstance(getattr(segmentation, "model", None), torch.nn.Module):
+        yield "segmentation", segmentation, "model"
+    embedding = getattr(pipeline, "_embedding", None)
+    # embedding may be wrapped by micro-batching
+    embedding = getattr(embedding, "_wrapped", embedding)
+    if isinstance(getattr(embedding, "model_", None), torch.nn.Module):
+        yield "embedding", embedding, "model_"
+
+
+def _fingerprint(model: torch.nn.Module, method: str) -> str:
+    """Identifies the checkpoint of `model` converted with `method` by this torch build"""
+    digest = hashlib.sha256()
+    digest.update(
+        f"{method}:{torch.__version__}:{torch.backends.quantized.engine}:"
+        f"{type(model).__qualname__}".encode()
+    )
+    for name, tensor in model.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()[:32]
+
+
+def _quantized_weights(model: torch.nn.Module) -> Dict[str, torch.Tensor]:
+    """int8 weights and float biases of the dynamically quantized layers of `model`.
+    Unlike `model.state_dict()`, which holds packed weights, these are plain
+    (quantized) tensors that can be loaded with `torch.load(..., weights_only=True)`"""
+    weights = {}
+    for prefix, module in model.named_modules():
+        if isinstance(module, nnqd.Linear):
+            weights[f"{prefix}.weight"] = module.weight()
+            if module.bias() is not None:
+                weights[f"{prefix}.bias"] = module.bias()
+        elif isinstance(module, (nnqd.LSTM, nnqd.GRU)):
+            for name, tensor in {**module.get_weight(), **module.get_bias()}.items():
+                weights[f"{prefix}.{name}"] = tensor
+    return weights
+
+
+def _quantized_module(
+    module: torch.nn.Module, weights: Dict[str, torch.Tensor], prefix: str
+) -> torch.nn.Module:
+    """Dynamically quantized `module`, with already quantized `weights`"""
+    if isinstance(module, torch.nn.Linear):
+        quantized = nnqd.Linear(
+            module.in_features, module.out_features, dtype=torch.qint8
+        )
+        quantized.set_weight_bias(
+            weights[f"{prefix}.weight"], weights.get(f"{prefix}.bias")
+        )
+        return quantized
+
+    # same packing as `nnqd.RNNBase.from_float`, without observing float weights
+    quantized = QUANTIZED_MODULES[type(module)](
+        module.input_size,
+        module.hidden_size,
+        num_layers=module.num_layers,
+        bias=module.bias,
+        batch_first=module.batch_first,
+        dropout=module.dropout,
+        bidirectional=module.bidirectional,
+        dtype=torch.qint8,
+    )
+    cells = []
+    for layer in range(module.num_layers):
+        for suffix in ["", "_reverse"] if module.bidirectional else [""]:
+            packed, biases = [], []
+            for gate in ["ih", "hh"]:
+                bias = weights.get(f"{prefix}.bias_{gate}_l{layer}{suffix}")
+                weight = weights[f"{prefix}.weight_{gate}_l{layer}{suffix}"]
+                packed.append(torch.ops.quantized.linear_prepack(weight, bias))
+                biases.append(bias)
+            cell = torch.ops.quantized.make_quantized_cell_params_dynamic(
+                *packed, *biases, True
+            )
+            cells.append(nnqd.modules.rnn.PackedParameter(cell))
+    quantized._all_weight_values = torch.nn.ModuleList(cells)
+    return quantized
+
+
+@dataclasses.dataclass
+class CPUBackend:
+    """
+    A dataclass for specifying an optimized CPU backend of the segmentation and
+    embedding models of the pipelines loaded by the `PipelineSelector` component. An
+    instance of this class can be passed into the `cpu_backend` parameter of
+    `PipelineSelector`.
+
+    Whether a backend pays off depends on the model (e.g. int8 quantization speeds
+    up recurrent and linear layers, not convolutions) and on the host: use
+    `evaluate` to measure the speed / accuracy trade-off on a reference annotation
+    before enabling it.
+
+    Parameters:
+        method: "int8" for dynamic int8 quantization of recurrent and linear layers,
+            "compile" for `torch.compile`.
+        cache_dir: directory of converted models. Quantized weights are stored on
+            disk, keyed by a hash of the model checkpoint and of the backend, and
+            reused (without quantizing again) the next time the same model is
+            loaded. Compiled artifacts are cached by torch itself. Default to
+            "~/.cache/gryannote/cpu_backend".
+    """
+
+    method: Literal["int8", "compile"] = "int8"
+    cache_dir: Optional[str] = None
+
+    def __post_init__(self):
+        if self.method not in ("int8", "compile"):
+            raise ValueError(
+                f"Unknown CPU backend {self.method}, choose 'int8' or 'compile'"
+            )
+
+    def _quantize(self, model: torch.nn.Module) -> torch.nn.Module:
+        cache_dir = Path(self.cache_dir) if self.cache_dir else _default_cache_dir()
+        path = cache_dir / f"{_fingerprint(model, self.method)}.pt"
+        with warnings.catch_warnings():
+            # eager mode quantization is deprecated in favor of torchao
+            warnings.simplefilter("ignore")
+            if path.exists():
+                # plain tensors only, no pickled objects
+                weights = torch.load(path, map_location="cpu", weights_only=True)
+                model = copy.deepcopy(model)
+                for prefix, module in list(model.named_modules()):
+                    if type(module) in QUANTIZED_MODULES:
+                        quantized = _quantized_module(module, weights, prefix)
+                        model.set_submodule(prefix, quantized)
+                return model
+
+            model = torch.ao.quantization.quantize_dynamic(
+                model, QUANTIZED_LAYERS, dtype=torch.qint8
+            )
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        torch.save(_quantized_weights(model), temporary)
+        temporary.replace(path)
+        return model
+
+    def convert(self, model: torch.nn.Module) -> torch.nn.Module:
+        """Optimized copy of `model`"""
+        if getattr(model, CONVERTED_ATTRIBUTE, None):
+            return model
+        model.eval()
+        if self.method == "int8":
+            converted = self._quantize(model)
+        else:
+            converted = copy.copy(model)
+            # models are called directly by pyannote inference
+            converted.forward = torch.compile(model.forward, dynamic=True)
+        setattr(converted, CONVERTED_ATTRIBUTE, self.method)
+        return converted
+
+    def install(self, pipeline: Pipeline) -> Pipeline:
+        """Replace segmentation and embedding models of `pipeline` by optimized ones.
+        Original models are kept (see `original`). Idempotent."""
+        originals = getattr(pipeline, ORIGINALS_ATTRIBUTE, {})
+        for name, owner, attribute in _models(pipeline):
+            model = getattr(owner, attribute)
+            if not getattr(model, CONVERTED_ATTRIBUTE, None):
+                originals[name] = model
+                setattr(owner, attribute, self.convert(model))
+        # pyannote pipelines only accept parameters as attributes
+        object.__setattr__(pipeline, ORIGINALS_ATTRIBUTE, originals)
+        return pipeline
+
+    @staticmethod
+    def original(pipeline: Pipeline) -> Pipeline:
+        """Copy of `pipeline` with its original models"""
+        pipeline = copy.deepcopy(pipeline)
+        originals = getattr(pipeline, ORIGINALS_ATTRIBUTE, {})
+        for name, owner, attribute in _models(pipeline):
+            if name in originals:
+                setattr(owner, attribute, originals[name])
+        object.__setattr__(pipeline, ORIGINALS_ATTRIBUTE, {})
+        return pipeline
+
+    def evaluate(
+        self,
+        pipeline: Pipeline,
+        audio: str | Path | Mapping,
+        reference: PyannoteAnnotation,
+        uem=None,
+    ) -> Dict[str, float]:
+        """
+        Compare `pipeline` with its optimized version on `audio`.
+
+        Parameters:
+            pipeline: pipeline, left untouched. If this backend is already installed,
+                it is compared with its original models.
+            audio: audio file on which pipelines are applied, as a path or a
+                pyannote file mapping (e.g. {"waveform": ..., "sample_rate": ...})
+            reference: reference annotation of `audio`
+            uem: optional evaluation map
+
+        Returns:
+            report: DER and duration of both pipelines, speedup of the optimized one.
+        """
+        if hasattr(audio, "to_pyannote"):
+            # lazy audio handle from `AudioLabeling` (type="lazy")
+            file = audio.to_pyannote()
+        elif isinstance(audio, Mapping):
+            file = dict(audio)
+        else:
+            file = {"audio": str(audio), "uri": Path(audio).stem}
+
+        pipeline = self.original(pipeline)
+        optimized = self.install(copy.deepcopy(pipeline))
+        report = {}
+        for prefix, candidate in [("", pipeline), ("optimized ", optimized)]:
+            start = time.perf_counter()
+            # copy, as pipelines may cache intermediate outputs in the file
+            hypothesis = candidate(dict(file))
+            duration = time.perf_counter() - start
+            # speaker diarization pipelines may return extra outputs (e.g. embeddings)
+            if isinstance(hypothesis, tuple):
+                hypothesis = hypothesis[0]
+            hypothesis = getattr(hypothesis, "speaker_diarization", hypothesis)
+            metric = DiarizationErrorRate()
+            report[f"{prefix}der"] = float(metric(reference, hypothesis, uem=uem))
+            report[f"{prefix}duration"] = duration
+        report["der difference"] = report["optimized der"] - report["der"]
+        report["speedup"] = report["duration"] / max(report["optimized duration"], 1e-9)
+        return report
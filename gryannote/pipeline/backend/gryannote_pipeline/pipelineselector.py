@@ -1,12 +1,18 @@
+import asyncio
+import inspect
 import warnings
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Literal, Mapping, Optional, Tuple
 
 from gradio.components.base import FormComponent
 from gradio.data_classes import GradioModel
-from gradio.events import Events
+from gradio.events import Events, SelectData
 from gradio.exceptions import Error
+from gryannote_audio.cache import get_session
+from gryannote_audio.metrics import PipelineStageHook, metrics
 from huggingface_hub import HfApi
 from pyannote.audio import Pipeline
+from pyannote.core import Annotation as PyannoteAnnotation
 from pyannote.pipeline.parameter import (
     Categorical,
     DiscreteUniform,
@@ -17,6 +23,20 @@ from pyannote.pipeline.parameter import (
     Uniform,
 )
 
+from .batching import MicroBatching
+from .executor import PipelineExecutor
+from .inference import InferenceOptions
+from .optimization import CPUBackend
+from .postprocessing import PostProcessing
+from .registry import PipelineRegistry
+from .sweep import ParameterSweep, SweepResult
+from .workers import InferenceWorkers
+
+# key of inference settings in parameters specifications
+INFERENCE_KEY = "inference"
+# key of post-processing settings in parameters specifications
+POSTPROCESSING_KEY = "postprocessing"
+
 
 class PipelineInfo(GradioModel):
     # name of the pipeline:
@@ -59,6 +79,13 @@ class PipelineSelector(FormComponent):
         show_token_textbox: bool = True,
         show_config: bool = False,
         enable_edition: bool = False,
+        inference_options: InferenceOptions | dict | Literal["auto"] | None = None,
+        micro_batching: MicroBatching | bool = False,
+        cpu_backend: CPUBackend | Literal["int8", "compile"] | None = None,
+        executor: PipelineExecutor | None = None,
+        workers: InferenceWorkers | int | None = None,
+        registry: PipelineRegistry | str | Path | None = None,
+        postprocessing: PostProcessing | dict | None = None,
         container: bool = True,
         scale: int | None = None,
         min_width: int = 160,
@@ -106,6 +133,38 @@ class PipelineSelector(FormComponent):
             has been loaded. Has no effect if `enable_edition` is set to False. Default to False.
         enable_edition: bool, optional
             If True, let the user to update pipeline's hyperparameters
+        inference_options: InferenceOptions | dict | "auto", optional
+            CPU inference settings (torch threads, segmentation and embedding batch sizes),
+            applied each time a pipeline is loaded or instantiated. These settings can also
+            be edited from the configuration interface. If "auto", settings are picked
+            according to the host's number of cores. See `InferenceOptions` for more details.
+        micro_batching: MicroBatching | bool, optional
+            If set, segmentation and embedding forward passes of concurrent runs of the same
+            pipeline are gathered into larger batches, to increase CPU throughput when several
+            users run the pipeline at the same time. Pass a `MicroBatching` instance to customize
+            the maximum batch size and waiting time. Default to False.
+        cpu_backend: CPUBackend | "int8" | "compile", optional
+            If set, segmentation and embedding models of loaded pipelines are converted to an
+            optimized CPU form (dynamic int8 quantization or `torch.compile`), cached on disk.
+            Use `evaluate_cpu_backend` to check the speed / accuracy trade-off on a reference
+            annotation. See `CPUBackend` for more details. Default to None.
+        executor: PipelineExecutor, optional
+            executor of `run_async`, limiting the number of concurrent and pending runs of each
+            pipeline. Default to one run at a time per pipeline, with up to 8 pending runs.
+        workers: InferenceWorkers | int, optional
+            If set, pipelines run in a pool of worker processes (or that number of worker
+            processes), sharing the weights of the loaded pipeline, instead of in the server
+            process. Set the executor's `max_concurrency` to the number of workers to use
+            them all. Cannot be combined with `micro_batching`. Default to None.
+        registry: PipelineRegistry | str | Path, optional
+            local registry of bundled pipelines (see `PipelineRegistry`). If set, available
+            pipelines are the ones of the registry, and they are loaded from disk without any
+            network access, instead of from Hugging Face.
+        postprocessing: PostProcessing | dict, optional
+            If set, pipeline output is simplified before being returned by `run`: turns of the
+            same speaker separated by short gaps are merged, and short turns are dropped. These
+            settings can also be edited from the configuration interface. See `PostProcessing`
+            for more details. Default to None.
         container: optional
             If True, will place the component in a container - providing some extra padding around
             the border.
@@ -136,11 +195,60 @@ class PipelineSelector(FormComponent):
 
         self._pipeline_map: Dict[str, Pipeline] = None
 
+        # not stored as `micro_batching`, as it would be serialized in the component config
+        if micro_batching is True:
+            self._micro_batching = MicroBatching()
+        else:
+            self._micro_batching = micro_batching or None
+
+        self.cpu_backend = (
+            CPUBackend(method=cpu_backend)
+            if isinstance(cpu_backend, str)
+            else cpu_backend
+        )
+
+        # not stored as `executor`, as it would be serialized in the component config
+        self._executor = executor or PipelineExecutor()
+        self._workers = (
+            InferenceWorkers(num_workers=workers)
+            if isinstance(workers, int)
+            else workers
+        )
+        if self._workers is not None and self._micro_batching:
+            raise ValueError("`workers` cannot be combined with `micro_batching`")
+        self._registry = (
+            PipelineRegistry(registry)
+            if isinstance(registry, (str, Path))
+            else registry
+        )
+
+        self.postprocessing = (
+            PostProcessing(**postprocessing)
+            if isinstance(postprocessing, dict)
+            else postprocessing
+        )
+
+        if inference_options is None:
+            self.inference_options = InferenceOptions()
+        elif inference_options == "auto":
+            self.inference_options = InferenceOptions.auto()
+        else:
+            self.inference_options = (
+                InferenceOptions(**inference_options)
+                if isinstance(inference_options, dict)
+                else inference_options
+            )
+
         if not pipelines:
             self.pipelines = [(p, p) for p in self.get_available_pipelines()]
 
         elif isinstance(pipelines, Pipeline):
             self._pipeline = pipelines
+            self.inference_options.apply(self._pipeline)
+            if self.cpu_backend:
+                self.cpu_backend.install(self._pipeline)
+            if self._micro_batching:
+                self._micro_batching.install(self._pipeline)
 
         elif isinstance(pipelines, list) and isinstance(pipelines[0], str):
             available_pipelines = self.get_available_pipelines()
@@ -235,27 +343,232 @@ class PipelineSelector(FormComponent):
         """Update pipeline according to selected value from frontend"""
         pipeline_info = PipelineInfo(**value)
         self._pipeline = self._load_pipeline(pipeline_info)
-        param_types = self._pipeline.parameters(instantiated=False)
-        param_values = self._pipeline.parameters(instantiated=True)
-        pipeline_info.param_specs = self._get_param_specs(param_types, param_values)
+        pipeline_info.param_specs = self._get_pipeline_specs()
 
         return pipeline_info
 
     def on_change(self, value: Dict):
         """Update selected pipeline's parameters"""
         pipeline_info = PipelineInfo(**value)
+        param_specs = dict(pipeline_info.param_specs)
+        inference_specs = param_specs.pop(INFERENCE_KEY, None)
+        if inference_specs:
+            self.inference_options.update(inference_specs)
+        postprocessing_specs = param_specs.pop(POSTPROCESSING_KEY, None)
+        if postprocessing_specs and self.postprocessing:
+            self.postprocessing.update(postprocessing_specs)
+
         param_types = self._pipeline.parameters(instantiated=False)
-        param_values = self._get_param_values(param_types, pipeline_info.param_specs)
+        param_values = self._get_param_values(param_types, param_specs)
         self._pipeline = self._pipeline.instantiate(param_values)
+        self.inference_options.apply(self._pipeline)
+        return pipeline_info
+
+    def run(
+        self,
+        audio: str | Path | Mapping,
+        pipeline: Pipeline | None = None,
+        hook: Callable | None = None,
+        **kwargs,
+    ):
+        """Apply a pipeline on the indicated audio, recording inference metrics
+
+        Parameters
+        ----------
+        audio: str | Path | Mapping | AudioHandle
+            audio on which the pipeline is applied
+        pipeline: Pipeline, optional
+            pipeline to apply. Default to the currently selected one.
+        hook: callable, optional
+            pyannote hook, called at each step of the pipeline. Not called when the
+            pipeline runs in `workers`.
+        kwargs:
+            additional parameters passed to the pipeline (e.g. `num_speakers`)
+
+        Returns
+        -------
+        output:
+            pipeline's output, simplified by `postprocessing` if set
+        """
+        pipeline = pipeline or getattr(self, "_pipeline", None)
+        if pipeline is None:
+            raise Error("Please select a pipeline first")
+
+        # lazy audio handle from `AudioLabeling` (type="lazy")
+        if hasattr(audio, "to_pyannote"):
+            audio = audio.to_pyannote()
+
+        if self._workers is not None:
+            with metrics.measure("pipeline.inference"):
+                output = self._workers.run(pipeline, audio, **kwargs)
+        else:
+            # not every pipeline supports hooks
+            if "hook" in inspect.signature(pipeline.apply).parameters:
+                kwargs["hook"] = PipelineStageHook(hook=hook)
+
+            with metrics.measure("pipeline.inference"):
+                output = pipeline(audio, **kwargs)
+
+        if self.postprocessing:
+            output = self.postprocessing.apply(output)
+        return output
+
+    async def run_async(
+        self,
+        audio: str | Path | Mapping,
+        pipeline: Pipeline | None = None,
+        hook: Callable | None = None,
+        **kwargs,
+    ):
+        """Same as `run`, without blocking a Gradio worker while the pipeline runs
+
+        The run is offloaded to the component's `PipelineExecutor`: it is rejected
+        right away if too many runs of the pipeline are pending. It is cancelled if the
+        event is cancelled, or if the session ends and `executor.install(demo)` was
+        called. A running pipeline stops after its current batch,
+        unless it runs in `workers`.
+
+        Parameters
+        ----------
+        See `run`
+
+        Returns
+        -------
+        output:
+            pipeline's output
+        """
+        pipeline = pipeline or getattr(self, "_pipeline", None)
+        if pipeline is None:
+            raise Error("Please select a pipeline first")
+
+        def run(cancellable_hook):
+            cancellable_hook.hook = hook
+            return self.run(audio, pipeline=pipeline, hook=cancellable_hook, **kwargs)
+
+        job = self._executor.submit(run, pipeline, session=get_session())
+        try:
+            return await asyncio.wrap_future(job.future)
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+
+    def sweep(
+        self,
+        audio: str | Path | Mapping,
+        reference: PyannoteAnnotation,
+        *,
+        mode: Literal["grid", "random"] = "random",
+        budget: int | None = 20,
+        grid_size: int = 3,
+        n_jobs: int | None = None,
+        seed: int | None = None,
+    ) -> Tuple[Dict[str, List], List[SweepResult]]:
+        """Sweep current pipeline's hyperparameters against a reference annotation
+
+        Parameters
+        ----------
+        audio: str | Path | Mapping
+            audio on which the pipeline is applied
+        reference: Annotation
+            reference annotation of `audio`, e.g. as provided by the `RTTM` component
+        mode: "grid" | "random", optional
+            how configurations are drawn from pipeline's parameter specifications.
+            Default to "random".
+        budget: int, optional
+            maximum number of configurations to evaluate. Default to 20.
+        grid_size: int, optional
+            number of values per continuous parameter in "grid" mode. Default to 3.
+        n_jobs: int, optional
+            number of configurations evaluated in parallel. Default to the number of cores
+            not used by torch intra-op threads, at most 4.
+        seed: int, optional
+            seed for reproducible sweeps
+
+        Returns
+        -------
+        table: dict
+            DER-ranked table of evaluated configurations, as a {"headers": ..., "data": ...}
+            dict to be displayed in a `gr.Dataframe`. Use `on_sweep_select` as its `select` callback to apply
+            a configuration to this component.
+        results: list of SweepResult
+            evaluated configurations, in the same order as the table. As this component is shared by all
+            sessions, they are to be stored in a `gr.State` and passed to `on_sweep_select`.
+        """
+        if not getattr(self, "_pipeline", None):
+            raise Error("Please select a pipeline first")
+        if reference is None:
+            raise Error("Please load a reference RTTM first")
+        if getattr(self._pipeline, "_micro_batchers", None) is not None:
+            # pipelines are copied for each configuration, and micro-batchers cannot be
+            raise Error("Hyperparameters cannot be swept on micro-batched pipelines")
+
+        sweep = ParameterSweep(
+            self._pipeline,
+            mode=mode,
+            budget=budget,
+            grid_size=grid_size,
+            n_jobs=n_jobs,
+            seed=seed,
+        )
+        results = sweep.run(audio, reference)
+        headers, rows = ParameterSweep.to_table(results)
+        return {"headers": headers, "data": rows}, results
+
+    def evaluate_cpu_backend(
+        self,
+        audio: str | Path | Mapping,
+        reference: PyannoteAnnotation,
+    ) -> Dict[str, float]:
+        """Compare current pipeline with its optimized CPU version on a reference annotation
+
+        Parameters
+        ----------
+        audio: str | Path | Mapping
+            audio on which both pipelines are applied
+        reference: Annotation
+            reference annotation of `audio`, e.g. as provided by the `RTTM` component
+
+        Returns
+        -------
+        report: dict
+            DER and duration of both pipelines, and speedup of the optimized one, e.g. to
+            be displayed in a `gr.JSON`. See `CPUBackend.evaluate`.
+        """
+        if not getattr(self, "_pipeline", None):
+            raise Error("Please select a pipeline first")
+        if reference is None:
+            raise Error("Please load a reference RTTM first")
+        if getattr(self._pipeline, "_micro_batchers", None) is not None:
+            raise Error("CPU backends cannot be evaluated on micro-batched pipelines")
+
+        cpu_backend = self.cpu_backend or CPUBackend()
+        return cpu_backend.evaluate(self._pipeline, audio, reference)
+
+    def on_sweep_select(
+        self, value: Dict, results: List[SweepResult] | None, evt: SelectData
+    ) -> PipelineInfo:
+        """Apply the configuration selected in the sweep results table, given the results
+        returned by `sweep` (e.g. stored in a `gr.State`)"""
+        pipeline_info = PipelineInfo(**value)
+        row = evt.index[0]
+        if not results or not 0 <= row < len(results):
+            raise Error("Please run a hyperparameter sweep first")
+
+        self._pipeline = self._pipeline.instantiate(results[row].params)
+        self.inference_options.apply(self._pipeline)
+        pipeline_info.param_specs = self._get_pipeline_specs()
         return pipeline_info
 
     def get_available_pipelines(self) -> List[str]:
-        """Get official pyannote pipelines from Hugging Face
+        """Get official pyannote pipelines from Hugging Face, or bundled pipelines if
+        a registry is set
 
         Returns
         -------
             list of default available pyannote pipelines
         """
+        if self._registry is not None:
+            return self._registry.names()
         available_pipelines = [
             p.modelId
             for p in HfApi().list_models(
@@ -287,18 +600,39 @@ class PipelineSelector(FormComponent):
             self.token = pipeline_info.token
         if self._pipeline_map:
             pipeline = self._pipeline_map[pipeline_info.name]
+        elif self._registry is not None:
+            if pipeline_info.name not in self._registry:
+                raise Error(f"{pipeline_info.name} pipeline is not available offline.")
+            with metrics.measure("pipeline.load"):
+                pipeline = self._registry.load(pipeline_info.name)
         else:
-            pipeline = Pipeline.from_pretrained(
-                pipeline_info.name, use_auth_token=self.token
-            )
+            with metrics.measure("pipeline.load"):
+                pipeline = Pipeline.from_pretrained(
+                    pipeline_info.name, use_auth_token=self.token
+                )
             if not pipeline:
                 raise Error(
                     f"Could not download {pipeline_info.name} pipeline."
                     "It might be because the pipeline is private or gated so make"
                     " sure to authenticate with your hugging face token "
                 )
+        self.inference_options.apply(pipeline)
+        if self.cpu_backend:
+            self.cpu_backend.install(pipeline)
+        if self._micro_batching:
+            self._micro_batching.install(pipeline)
         return pipeline
 
+    def _get_pipeline_specs(self) -> Dict:
+        """Specifications of current pipeline's parameters and inference settings"""
+        param_types = self._pipeline.parameters(instantiated=False)
+        param_values = self._pipeline.parameters(instantiated=True)
+        param_specs = self._get_param_specs(param_types, param_values)
+        param_specs[INFERENCE_KEY] = self.inference_options.get_specs(self._pipeline)
+        if self.postprocessing:
+            param_specs[POSTPROCESSING_KEY] = self.postprocessing.get_specs()
+        return param_specs
+
     def _get_param_specs(self, param_types: Dict, param_values: Dict) -> Dict:
         param_specs = {}
 
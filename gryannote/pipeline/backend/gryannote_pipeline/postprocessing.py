@@ -0,0 +1,116 @@
+"""Simplification of pipelines output, before it is sent to the client"""
+
+import dataclasses
+from typing import Any, Dict, Tuple
+
+from gryannote_audio.index import SegmentIndex
+from gryannote_audio.metrics import metrics
+from gryannote_audio.operations import drop_short, fill_gaps, to_pyannote
+from pyannote.core import Annotation as PyannoteAnnotation
+
+# maximum value of settings proposed in the configuration interface, in seconds
+MAX_DURATION = 5.0
+
+
+@dataclasses.dataclass
+class PostProcessing:
+    """
+    A dataclass for specifying how the output of pipelines run by the
+    `PipelineSelector` component is simplified, before it reaches `AudioLabeling`.
+    Raw output is often fragmented into many tiny turns of the same speaker, which
+    are expensive to send and render, and tedious to merge by hand. An instance of
+    this class can be passed into the `postprocessing` parameter of `PipelineSelector`.
+
+    Turns of the same speaker separated by at most `max_gap` seconds are merged
+    first, then turns shorter than `min_duration` seconds are dropped. Both steps
+    are applied on sorted arrays (see `gryannote_audio.operations`). Numbers of
+    segments before and after are reported as `postprocessing_segments_before` and
+    `postprocessing_segments_after` gauges of `metrics`.
+
+    Parameters:
+        max_gap: maximum gap between two merged turns of the same speaker, in
+            seconds. Default to 0 (only overlapping or adjacent turns are merged).
+        min_duration: minimum duration of turns, in seconds. Default to 0 (no turn
+            is dropped).
+    """
+
+    max_gap: float = 0.0
+    min_duration: float = 0.0
+
+    def __post_init__(self):
+        if self.max_gap < 0 or self.min_duration < 0:
+            raise ValueError("`max_gap` and `min_duration` must be positive")
+
+    def simplify(self, annotation: PyannoteAnnotation) -> PyannoteAnnotation:
+        """Simplified copy of `annotation`"""
+        with metrics.measure("pipeline.postprocessing") as measure:
+            index = SegmentIndex.from_annotations(annotation)
+            before = len(index)
+            index = fill_gaps(index, self.max_gap)
+            if self.min_duration > 0:
+                index = drop_short(index, self.min_duration)
+            simplified = to_pyannote(index, uri=annotation.uri)
+            measure.count = before
+        metrics.set_gauge("postprocessing_segments_before", before)
+        metrics.set_gauge("postprocessing_segments_after", len(index))
+        return simplified
+
+    def _simplify_with_embeddings(
+        self, annotation: PyannoteAnnotation, embeddings: Any
+    ) -> Tuple[PyannoteAnnotation, Any]:
+        simplified = self.simplify(annotation)
+        labels = annotation.labels()
+        if embeddings is not None and len(embeddings) == len(labels):
+            # embeddings are sorted as labels: keep the ones of remaining speakers
+            remaining = set(simplified.labels())
+            embeddings = embeddings[[label in remaining for label in labels]]
+        return simplified, embeddings
+
+    def apply(self, output: Any) -> Any:
+        """Simplify speaker diarization of a pipeline `output`. Speaker embeddings
+        returned along with it are kept aligned with remaining speakers."""
+        if isinstance(output, PyannoteAnnotation):
+            return self.simplify(output)
+        # speaker diarization pipelines may return embeddings as well
+        if isinstance(output, tuple) and output:
+            if len(output) == 2 and isinstance(output[0], PyannoteAnnotation):
+                return self._simplify_with_embeddings(*output)
+            return (self.apply(output[0]),) + output[1:]
+        # pyannote.audio 4 pipelines return diarization along with other outputs
+        if dataclasses.is_dataclass(output) and not isinstance(output, type):
+            changes = {
+                field.name: self.simplify(getattr(output, field.name))
+                for field in dataclasses.fields(output)
+                if field.name != "speaker_diarization"
+                and isinstance(getattr(output, field.name), PyannoteAnnotation)
+            }
+            diarization = getattr(output, "speaker_diarization", None)
+            if isinstance(diarization, PyannoteAnnotation):
+                embeddings = getattr(output, "speaker_embeddings", None)
+                diarization, embeddings = self._simplify_with_embeddings(
+                    diarization, embeddings
+                )
+                changes["speaker_diarization"] = diarization
+                if hasattr(output, "speaker_embeddings"):
+                    changes["speaker_embeddings"] = embeddings
+            return dataclasses.replace(output, **changes)
+        return output
+
+    def get_specs(self) -> Dict:
+        """Specifications of these settings, to be displayed in the configuration interface"""
+        return {
+            name: {
+                "component": "slider",
+                "value": str(getattr(self, name)),
+                "min": "0",
+                "max": str(max(MAX_DURATION, getattr(self, name))),
+                "step": "any",
+            }
+            for name in ["max_gap", "min_duration"]
+        }
+
+    def update(self, param_specs: Dict):
+        """Update settings from specifications edited in the configuration interface"""
+        for name, specs in param_specs.items():
+            if hasattr(self, name):
+                setattr(self, name, max(0.0, float(specs["value"])))
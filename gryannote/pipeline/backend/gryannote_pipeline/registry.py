@@ -0,0 +1,290 @@
+"""Local registry of pipelines bundled with their model dependencies, for offline use
+
+Usage:
+    python -m gryannote_pipeline.registry pyannote/speaker-diarization-3.1 ./pipelines
+"""
+
+import argparse
+import importlib
+import inspect
+import json
+import os
+import pickle
+import tempfile
+import warnings
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+from pyannote.audio import Pipeline
+
+# index of bundled pipelines, at the root of the registry
+INDEX_FILE = "registry.json"
+# pipeline configuration file, in each bundled pipeline directory
+CONFIG_FILE = "config.yaml"
+# prefix of paths relative to the registry root, in bundled configurations
+BUNDLE_PREFIX = "$bundle/"
+# prefix of paths relative to the pipeline directory (pyannote.audio >= 4.0)
+MODEL_PREFIX = "$model/"
+# checkpoint file of models downloaded from the hub
+CHECKPOINT_FILE = "pytorch_model.bin"
+
+
+def _slug(name: str) -> str:
+    """Directory name of a hub repository"""
+    return name.replace("/", "--")
+
+
+def _is_repo_id(value: Any) -> bool:
+    """Whether a configuration value refers to a model on the hub"""
+    return (
+        isinstance(value, str)
+        and value.count("/") == 1
+        and not value.startswith(("$", ".", "/"))
+        and not os.path.exists(value)
+    )
+
+
+def _resolve(config: Any, root: Path, pipeline_dir: Path) -> Any:
+    """Replace bundle and model relative paths of `config` by absolute paths"""
+    if isinstance(config, dict):
+        return {
+            key: _resolve(value, root, pipeline_dir) for key, value in config.items()
+        }
+    if isinstance(config, list):
+        return [_resolve(value, root, pipeline_dir) for value in config]
+    if isinstance(config, str) and config.startswith(BUNDLE_PREFIX):
+        return str(root / config[len(BUNDLE_PREFIX) :])
+    if isinstance(config, str) and config.startswith(MODEL_PREFIX):
+        # bundles contain a single revision of the pipeline repository
+        subfolder = config[len(MODEL_PREFIX) :].split("@")[0]
+        return str(pipeline_dir / subfolder)
+    return config
+
+
+def _checkpoint_file(value: Any) -> Optional[Path]:
+    """Model checkpoint referred to by a resolved configuration value, if any"""
+    if not isinstance(value, str) or not os.path.exists(value):
+        return None
+    path = Path(value)
+    if path.is_dir():
+        path = path / CHECKPOINT_FILE
+    return path if path.is_file() and path.suffix in (".bin", ".ckpt") else None
+
+
+def _loads_configurations() -> bool:
+    """Whether pipelines can be loaded from configuration dictionaries (and hence be
+    given model instances), as in pyannote.audio >= 4.0"""
+    from pyannote.audio import __version__
+
+    return int(__version__.split(".")[0]) >= 4
+
+
+def load_model(path: str | Path):
+    """
+    Load pyannote.audio model checkpoint `path`, with memory-mapped weights: weights
+    are paged in from disk when used, and pages are shared by processes loading the
+    same checkpoint. Only weights and pyannote.audio specifications are unpickled
+    (`weights_only=True`).
+
+    Raises
+    ------
+    pickle.UnpicklingError
+        if the checkpoint contains other objects
+    """
+    import torch
+    from pyannote.audio.core.task import Problem, Resolution, Specifications
+    from torch.torch_version import TorchVersion
+
+    with torch.serialization.safe_globals(
+        [Specifications, Problem, Resolution, TorchVersion]
+    ):
+        checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+
+    architecture = checkpoint["pyannote.audio"]["architecture"]
+    module = importlib.import_module(architecture["module"])
+    Klass = getattr(module, architecture["class"])
+
+    # as lightning does, only hyperparameters accepted by the model are passed
+    hparams = checkpoint.get("hyper_parameters", {})
+    parameters = inspect.signature(Klass.__init__).parameters
+    if not any(p.kind == p.VAR_KEYWORD for p in parameters.values()):
+        hparams = {k: v for k, v in hparams.items() if k in parameters}
+    model = Klass(**hparams)
+    # specifications, and task-dependent layers
+    model.on_load_checkpoint(checkpoint)
+    # parameters are the memory-mapped tensors, instead of copies of them.
+    # Task-dependent loss functions are not needed for inference.
+    missing, _ = model.load_state_dict(
+        checkpoint["state_dict"], strict=False, assign=True
+    )
+    if missing:
+        raise RuntimeError(f"Missing weights in {path}: {', '.join(missing)}")
+    return model.eval()
+
+
+class PipelineRegistry:
+    """
+    Directory of pipelines bundled with all of their model dependencies, so that they
+    can be loaded without any network access (e.g. in air-gapped deployments, or to
+    avoid downloads on container cold starts).
+
+    Each pipeline repository is downloaded into its own directory, and models it
+    refers to by hub identifier (e.g. "pyannote/segmentation-3.0") are downloaded
+    into "models/". References are replaced by paths relative to the registry, so
+    that the registry can be moved or copied (e.g. into a container image).
+
+    Parameters:
+        root: registry directory.
+
+    Usage:
+        registry = PipelineRegistry("./pipelines")
+        registry.bundle("pyannote/speaker-diarization-3.1", token=...)
+
+        # later on, without network access
+        pipeline_selector = PipelineSelector(registry="./pipelines")
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root).resolve()
+
+    def _read_index(self) -> Dict[str, Dict]:
+        index = self.root / INDEX_FILE
+        if not index.exists():
+            return {}
+        return json.loads(index.read_text(encoding="utf-8"))["pipelines"]
+
+    def _write_index(self, pipelines: Dict[str, Dict]):
+        self.root.mkdir(parents=True, exist_ok=True)
+        (self.root / INDEX_FILE).write_text(
+            json.dumps({"pipelines": pipelines}, indent=2), encoding="utf-8"
+        )
+
+    def names(self) -> List[str]:
+        """Names of bundled pipelines"""
+        return list(self._read_index())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._read_index()
+
+    def _download(
+        self, name: str, directory: Path, token: Optional[str], revision: Optional[str]
+    ) -> str:
+        """Download hub repository `name` into `directory`, return its revision"""
+        from huggingface_hub import HfApi, snapshot_download
+
+        info = HfApi().model_info(name, revision=revision, token=token)
+        snapshot_download(name, revision=info.sha, token=token, local_dir=directory)
+        return info.sha
+
+    def bundle(
+        self, name: str, token: Optional[str] = None, revision: Optional[str] = None
+    ) -> Path:
+        """
+        Download pipeline `name` from the hub, and all of the models it depends on
+
+        Returns
+        -------
+        directory: Path
+            directory of the bundled pipeline
+        """
+        pipeline_dir = self.root / _slug(name)
+        sha = self._download(name, pipeline_dir, token, revision)
+
+        config_file = pipeline_dir / CONFIG_FILE
+        config = yaml.safe_load(config_file.read_text(encoding="utf-8"))
+
+        # models referred to by "$model/..." are already part of the pipeline
+        # repository, others are referred to by hub identifier
+        dependencies = {}
+        params = config["pipeline"].get("params", {})
+        for key, value in params.items():
+            if not _is_repo_id(value):
+                continue
+            model_dir = Path("models") / _slug(value)
+            dependencies[value] = self._download(
+                value, self.root / model_dir, token, None
+            )
+            # pyannote.audio < 4.0 expects a checkpoint file, not a directory
+            checkpoint = model_dir / "pytorch_model.bin"
+            if (self.root / checkpoint).exists():
+                model_dir = checkpoint
+            params[key] = f"{BUNDLE_PREFIX}{model_dir.as_posix()}"
+        # do not try to authenticate against the hub when loading
+        params.pop("use_auth_token", None)
+        params.pop("token", None)
+
+        config_file.write_text(yaml.safe_dump(config), encoding="utf-8")
+
+        pipelines = self._read_index()
+        pipelines[name] = {
+            "path": _slug(name),
+            "revision": sha,
+            "dependencies": dependencies,
+        }
+        self._write_index(pipelines)
+        return pipeline_dir
+
+    def load(self, name: str, mmap: bool = True) -> Pipeline:
+        """
+        Load bundled pipeline `name`, without network access
+
+        Parameters
+        ----------
+        name: str
+            name of the pipeline on the hub
+        mmap: bool, optional
+            memory-map model checkpoints instead of reading them at once (see
+            `load_model`). Requires pyannote.audio >= 4.0, and checkpoints that
+            only contain weights and specifications: other checkpoints are
+            loaded by pyannote.audio as usual. Default to True.
+        """
+        pipelines = self._read_index()
+        if name not in pipelines:
+            raise KeyError(f"Pipeline {name} is not bundled in {self.root}")
+
+        pipeline_dir = self.root / pipelines[name]["path"]
+        config = yaml.safe_load(
+            (pipeline_dir / CONFIG_FILE).read_text(encoding="utf-8")
+        )
+        config = _resolve(config, self.root, pipeline_dir)
+
+        if mmap and _loads_configurations():
+            # models are loaded here, and given to the pipeline
+            params = config["pipeline"].get("params", {})
+            for key, value in params.items():
+                checkpoint = _checkpoint_file(value)
+                if checkpoint is None:
+                    continue
+                try:
+                    params[key] = load_model(checkpoint)
+                except pickle.UnpicklingError as e:
+                    warnings.warn(f"{checkpoint} cannot be memory-mapped: {e}")
+            return Pipeline.from_pretrained(config)
+
+        # resolved configuration is written apart, as the registry may be read-only
+        with tempfile.TemporaryDirectory() as directory:
+            config_file = Path(directory) / CONFIG_FILE
+            config_file.write_text(yaml.safe_dump(config), encoding="utf-8")
+            return Pipeline.from_pretrained(config_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Bundle pipelines and their models into a local registry"
+    )
+    parser.add_argument("pipelines", nargs="+", help="pipelines to bundle")
+    parser.add_argument("registry", help="registry directory")
+    parser.add_argument("--token", default=None, help="Hugging Face token")
+    parser.add_argument("--revision", default=None, help="pipeline revision")
+    args = parser.parse_args()
+
+    registry = PipelineRegistry(args.registry)
+    for name in args.pipelines:
+        print(
+            f"{name} => {registry.bundle(name, token=args.token, revision=args.revision)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
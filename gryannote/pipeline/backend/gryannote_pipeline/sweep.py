@@ -0,0 +1,287 @@
+"""Hyperparameter sweep of a pipeline against a reference annotation"""
+
+import copy
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Literal, Mapping, Optional, Tuple
+
+import numpy as np
+import torch
+from pyannote.audio import Pipeline
+from pyannote.core import Annotation as PyannoteAnnotation
+from pyannote.metrics.diarization import DiarizationErrorRate
+from pyannote.pipeline.parameter import (
+    Categorical,
+    DiscreteUniform,
+    Frozen,
+    Integer,
+    LogUniform,
+    ParamDict,
+    Uniform,
+)
+
+from .inference import get_num_cores
+
+# separator used to flatten nested parameter names (e.g. "clustering.threshold")
+SEPARATOR = "."
+# maximum default number of worker threads, as each one owns a copy of the pipeline
+MAX_JOBS = 4
+
+
+@dataclass
+class SweepResult:
+    """
+    Result of the evaluation of one pipeline configuration.
+
+    Parameters:
+        params: nested pipeline parameters, as expected by `Pipeline.instantiate`
+        der: diarization error rate of the configuration on the reference
+        components: detailed DER components (confusion, missed detection, false alarm...)
+    """
+
+    params: Dict[str, Any]
+    der: float
+    components: Dict[str, float] = field(default_factory=dict)
+
+
+def flatten(params: Mapping[str, Any], parent: str = "") -> Dict[str, Any]:
+    """Flatten nested pipeline parameters into a {"a.b": value} dict"""
+    flat = {}
+    for name, value in params.items():
+        key = f"{parent}{SEPARATOR}{name}" if parent else name
+        if isinstance(value, (ParamDict, Mapping)):
+            flat.update(flatten(value, key))
+        else:
+            flat[key] = value
+    return flat
+
+
+def unflatten(flat: Mapping[str, Any]) -> Dict[str, Any]:
+    """Inverse of `flatten`"""
+    params: Dict[str, Any] = {}
+    for key, value in flat.items():
+        *parents, name = key.split(SEPARATOR)
+        subset = params
+        for parent in parents:
+            subset = subset.setdefault(parent, {})
+        subset[name] = value
+    return params
+
+
+class ParameterSweep:
+    """
+    Evaluate a set of pipeline configurations against a reference annotation.
+
+    Configurations are drawn from the pipeline's parameter specifications, either
+    as a grid or randomly. The first configuration evaluated is always the current
+    one: it fills pyannote's training cache (segmentation and embeddings) stored
+    in the processed file, which is then shared by all other configurations.
+    These are evaluated in parallel, each worker thread owning its own copy of
+    the pipeline.
+
+    Parameters:
+        pipeline: instantiated pipeline to tune
+        mode: "grid" to sweep over `grid_size` values per parameter, "random" to
+            draw configurations at random.
+        budget: maximum number of configurations to evaluate, current one included.
+            Required for "random" mode. In "grid" mode, the grid is randomly
+            subsampled if larger than the budget.
+        grid_size: number of values per continuous parameter in "grid" mode.
+        n_jobs: number of worker threads. Default to the number of cores not used by
+            torch intra-op threads, at most `MAX_JOBS`.
+        seed: seed of the random generator, for reproducible sweeps.
+    """
+
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        *,
+        mode: Literal["grid", "random"] = "random",
+        budget: Optional[int] = 20,
+        grid_size: int = 3,
+        n_jobs: Optional[int] = None,
+        seed: Optional[int] = None,
+    ):
+        valid_modes = ["grid", "random"]
+        if mode not in valid_modes:
+            raise ValueError(
+                f"Invalid value for parameter `mode`: {mode}. Please choose from one of: {valid_modes}"
+            )
+        if mode == "random" and not budget:
+            raise ValueError("A `budget` is required when using random mode.")
+
+        self.pipeline = pipeline
+        self.mode = mode
+        self.budget = budget
+        self.grid_size = grid_size
+        # each worker runs torch with the process-wide number of intra-op threads
+        self.n_jobs = n_jobs or min(
+            MAX_JOBS, max(1, get_num_cores() // torch.get_num_threads())
+        )
+        self._rng = np.random.default_rng(seed)
+
+        # frozen parameters cannot be instantiated, hence are not swept
+        self.param_types = {
+            name: param
+            for name, param in flatten(pipeline.parameters(instantiated=False)).items()
+            if not isinstance(param, Frozen)
+        }
+        current_params = flatten(pipeline.parameters(instantiated=True))
+        self.current_params = {name: current_params[name] for name in self.param_types}
+
+    def _grid_values(self, param) -> List[Any]:
+        if isinstance(param, Categorical):
+            return list(param.choices)
+        if isinstance(param, Integer):
+            values = np.linspace(param.low, param.high, self.grid_size)
+            return sorted({int(round(v)) for v in values})
+        if isinstance(param, DiscreteUniform):
+            values = np.linspace(param.low, param.high, self.grid_size)
+            values = param.low + np.round((values - param.low) / param.q) * param.q
+            return sorted({float(v) for v in values})
+        if isinstance(param, LogUniform):
+            return [
+                float(v) for v in np.geomspace(param.low, param.high, self.grid_size)
+            ]
+        if isinstance(param, Uniform):
+            return [
+                float(v) for v in np.linspace(param.low, param.high, self.grid_size)
+            ]
+        raise TypeError(f"Unknown parameter type {type(param)}")
+
+    def _random_value(self, param) -> Any:
+        if isinstance(param, Categorical):
+            return param.choices[self._rng.integers(len(param.choices))]
+        if isinstance(param, Integer):
+            return int(self._rng.integers(param.low, param.high + 1))
+        if isinstance(param, DiscreteUniform):
+            steps = int(round((param.high - param.low) / param.q))
+            return float(param.low + self._rng.integers(steps + 1) * param.q)
+        if isinstance(param, LogUniform):
+            return float(
+                np.exp(self._rng.uniform(np.log(param.low), np.log(param.high)))
+            )
+        if isinstance(param, Uniform):
+            return float(self._rng.uniform(param.low, param.high))
+        raise TypeError(f"Unknown parameter type {type(param)}")
+
+    def candidates(self) -> List[Dict[str, Any]]:
+        """Configurations to evaluate, as flat parameters. The current one comes first."""
+        names = list(self.param_types)
+        candidates = [dict(self.current_params)]
+
+        if self.mode == "grid":
+            grid = [
+                dict(zip(names, values))
+                for values in itertools.product(
+                    *(self._grid_values(self.param_types[name]) for name in names)
+                )
+            ]
+            if self.budget and len(grid) > self.budget - 1:
+                indices = self._rng.choice(len(grid), self.budget - 1, replace=False)
+                grid = [grid[i] for i in sorted(indices)]
+            candidates.extend(grid)
+        else:
+            for _ in range(self.budget - 1):
+                candidates.append(
+                    {name: self._random_value(self.param_types[name]) for name in names}
+                )
+
+        # remove duplicates while preserving order
+        unique, seen = [], set()
+        for candidate in candidates:
+            key = tuple(sorted((k, repr(v)) for k, v in candidate.items()))
+            if key not in seen:
+                seen.add(key)
+                unique.append(candidate)
+        return unique
+
+    def _evaluate(
+        self,
+        pipeline: Pipeline,
+        params: Dict[str, Any],
+        file: Dict,
+        reference: PyannoteAnnotation,
+        uem=None,
+    ) -> SweepResult:
+        pipeline.instantiate(unflatten(params))
+        hypothesis = pipeline(file)
+        # speaker diarization pipelines may return extra outputs (e.g. embeddings)
+        if isinstance(hypothesis, tuple):
+            hypothesis = hypothesis[0]
+        # pyannote.audio 4 pipelines return diarization along with other outputs
+        hypothesis = getattr(hypothesis, "speaker_diarization", hypothesis)
+        metric = DiarizationErrorRate()
+        components = metric(reference, hypothesis, uem=uem, detailed=True)
+        return SweepResult(
+            params=params,
+            der=float(components[DiarizationErrorRate.metric_name()]),
+            components={k: float(v) for k, v in components.items()},
+        )
+
+    def iter_run(
+        self,
+        audio: str | Path | Mapping,
+        reference: PyannoteAnnotation,
+        uem=None,
+    ) -> Iterator[SweepResult]:
+        """
+        Evaluate configurations, yielding results as soon as they are available.
+
+        Parameters:
+            audio: audio file on which the pipeline is applied, as a path or a
+                pyannote file mapping (e.g. {"waveform": ..., "sample_rate": ...})
+            reference: reference annotation of `audio`
+            uem: optional evaluation map
+        """
+        if hasattr(audio, "to_pyannote"):
+            # lazy audio handle from `AudioLabeling` (type="lazy")
+            file = audio.to_pyannote()
+        elif isinstance(audio, Mapping):
+            file = dict(audio)
+        else:
+            file = {"audio": str(audio), "uri": Path(audio).stem}
+
+        candidates = self.candidates()
+
+        # each worker owns a copy of the pipeline, as instantiation is stateful
+        local = threading.local()
+        template = copy.deepcopy(self.pipeline)
+        # enable pyannote's training cache so that segmentation and embeddings
+        # are computed once and reused by every configuration
+        template.training = True
+
+        def evaluate(params: Dict[str, Any]) -> SweepResult:
+            if not hasattr(local, "pipeline"):
+                local.pipeline = copy.deepcopy(template)
+            return self._evaluate(local.pipeline, params, file, reference, uem=uem)
+
+        # first evaluation fills the shared cache
+        yield self._evaluate(template, candidates[0], file, reference, uem=uem)
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            yield from executor.map(evaluate, candidates[1:])
+
+    def run(
+        self,
+        audio: str | Path | Mapping,
+        reference: PyannoteAnnotation,
+        uem=None,
+    ) -> List[SweepResult]:
+        """Evaluate all configurations. Returns results sorted by increasing DER."""
+        return sorted(self.iter_run(audio, reference, uem=uem), key=lambda r: r.der)
+
+    @staticmethod
+    def to_table(results: List[SweepResult]) -> Tuple[List[str], List[List[Any]]]:
+        """Convert results to a (headers, rows) table, e.g. for a `gr.Dataframe`"""
+        if not results:
+            return ["rank", "DER"], []
+        names = list(flatten(results[0].params))
+        rows = [
+            [rank, round(result.der, 4)] + [flatten(result.params)[n] for n in names]
+            for rank, result in enumerate(results, start=1)
+        ]
+        return ["rank", "DER"] + names, rows
@@ -0,0 +1,162 @@
+"""Pool of inference worker processes, sharing the weights of a loaded pipeline"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+import torch
+from gradio.exceptions import Error
+from pyannote.audio import Pipeline
+
+from .inference import get_num_cores
+
+# pipeline inherited by the current worker process
+_pipeline: Optional[Pipeline] = None
+
+
+@dataclass
+class _SharedWaveform:
+    """Waveform handed over to a worker through shared memory"""
+
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    def load(self) -> torch.Tensor:
+        memory = shared_memory.SharedMemory(name=self.name)
+        try:
+            buffer = np.ndarray(self.shape, dtype=self.dtype, buffer=memory.buf)
+            return torch.from_numpy(buffer.copy())
+        finally:
+            memory.close()
+
+
+def _initialize(pipeline: Pipeline, num_threads: int):
+    global _pipeline
+    _pipeline = pipeline
+    torch.set_num_threads(num_threads)
+
+
+def _parameters(pipeline: Pipeline) -> Optional[Dict]:
+    try:
+        return pipeline.parameters(instantiated=True)
+    except Exception:
+        # e.g. pipeline without hyperparameters, or not instantiated yet
+        return None
+
+
+def _run(file: Dict, parameters: Optional[Dict], kwargs: Dict) -> Any:
+    """Apply the inherited pipeline on `file` (in a worker process)"""
+    if parameters is not None and _parameters(_pipeline) != parameters:
+        # hyperparameters were edited since the worker was forked
+        _pipeline.instantiate(parameters)
+    if isinstance(file.get("waveform"), _SharedWaveform):
+        file["waveform"] = file["waveform"].load()
+    return _pipeline(file, **kwargs)
+
+
+class InferenceWorkers:
+    """
+    Runs a pipeline in a pool of worker processes, so that inference neither holds
+    the GIL nor allocates memory in the Gradio server process, and a crashing
+    worker does not take the server down.
+
+    Workers are forked once the pipeline is loaded: they share its weights with the
+    server process (copy-on-write pages, that are never written to), instead of
+    loading their own copy. The pool is forked again when another pipeline is run.
+    Hyperparameters edited afterwards are sent along with each run.
+
+    Audio is handed over by path. Waveforms (e.g. from a microphone) are copied
+    once into shared memory, rather than pickled through a pipe.
+
+    Hooks are not called in workers, and running pipelines cannot be interrupted.
+    Requires the "fork" start method (i.e. Linux or macOS).
+
+    Parameters:
+        num_workers: number of worker processes. Default to the number of cores.
+        num_threads: number of torch threads of each worker. Default to the number of
+            cores divided by the number of workers.
+    """
+
+    def __init__(
+        self, num_workers: Optional[int] = None, num_threads: Optional[int] = None
+    ):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise ValueError("Inference workers require the 'fork' start method")
+        num_cores = get_num_cores()
+        self.num_workers = num_workers or num_cores
+        if self.num_workers < 1:
+            raise ValueError(
+                f"`num_workers` must be strictly positive, got {self.num_workers}"
+            )
+        self.num_threads = num_threads or max(1, num_cores // self.num_workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pipeline: Optional[Pipeline] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self, pipeline: Pipeline) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None or self._pipeline is not pipeline:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False, cancel_futures=True)
+                # processes are forked on first submission, and inherit `pipeline`
+                # instead of receiving a pickled copy
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                    initializer=_initialize,
+                    initargs=(pipeline, self.num_threads),
+                )
+                self._pipeline = pipeline
+            return self._pool
+
+    def run(self, pipeline: Pipeline, audio: str | Path | Mapping, **kwargs) -> Any:
+        """Apply `pipeline` on `audio` in a worker process"""
+        if getattr(pipeline, "_micro_batchers", None) is not None:
+            raise ValueError("Micro-batched pipelines cannot run in worker processes")
+
+        if isinstance(audio, Mapping):
+            file = dict(audio)
+        else:
+            file = {"audio": str(audio), "uri": Path(audio).stem}
+
+        memory = None
+        if "waveform" in file:
+            waveform = np.ascontiguousarray(np.asarray(file["waveform"]))
+            memory = shared_memory.SharedMemory(
+                create=True, size=max(1, waveform.nbytes)
+            )
+            shared = np.ndarray(waveform.shape, dtype=waveform.dtype, buffer=memory.buf)
+            shared[:] = waveform
+            del shared
+            file["waveform"] = _SharedWaveform(
+                memory.name, waveform.shape, waveform.dtype.str
+            )
+
+        pool = self._get_pool(pipeline)
+        try:
+            return pool.submit(_run, file, _parameters(pipeline), kwargs).result()
+        except BrokenProcessPool:
+            # a worker died (e.g. out of memory), fork a new pool on next run
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise Error("Inference worker crashed, please try again")
+        finally:
+            if memory is not None:
+                memory.close()
+                memory.unlink()
+
+    def shutdown(self):
+        """Stop worker processes"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._pipeline = None
@@ -1,3 +1,4 @@
+from .comparison import EditComparison
 from .rttm import RTTM
 
-__all__ = ["RTTM"]
+__all__ = ["EditComparison", "RTTM"]
@@ -0,0 +1,202 @@
+"""Incremental comparison of edited annotations with the pipeline's hypothesis"""
+
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+from gryannote_audio.core import AnnotadedAudioData, Annotation
+from gryannote_audio.metrics import metrics
+from pyannote.core import Annotation as PyannoteAnnotation
+
+# (start, end, label)
+Track = Tuple[float, float, str]
+
+COMPONENTS = ["total", "correct", "missed detection", "false alarm", "confusion"]
+
+# rows of the activity array
+HYPOTHESIS, EDITED = 0, 1
+# number of frames allocated in advance when edits extend past the end
+FRAMES_PADDING = 1000
+
+
+def _tracks(
+    annotations: PyannoteAnnotation | AnnotadedAudioData | Dict | List | None,
+) -> List[Track]:
+    if annotations is None:
+        return []
+    if isinstance(annotations, PyannoteAnnotation):
+        return [
+            (segment.start, segment.end, label)
+            for segment, _, label in annotations.itertracks(yield_label=True)
+        ]
+    if isinstance(annotations, AnnotadedAudioData):
+        annotations = annotations.annotations or []
+    elif isinstance(annotations, Dict):
+        annotations = annotations.get("annotations") or []
+    return [
+        (
+            (annotation.start, annotation.end, annotation.speaker)
+            if isinstance(annotation, Annotation)
+            else (annotation["start"], annotation["end"], annotation["speaker"])
+        )
+        for annotation in annotations
+    ]
+
+
+class EditComparison:
+    """
+    Compares edited annotations with the original pipeline output while they are
+    edited, with the components of the diarization error rate. Speakers are compared
+    by label (edits keep pipeline labels), hence:
+        - missed detection: speech removed by annotators (e.g. boundary shifts)
+        - false alarm: speech added by annotators (e.g. boundary shifts)
+        - confusion: speech relabeled by annotators
+
+    Both annotations are stored as (speaker, frame) activity counts, at the given
+    resolution (i.e. 4 bytes per speaker per frame). On each edit, only frames of
+    modified segments are compared again, and their contribution to each component
+    is updated. Finding modified segments is linear in the number of segments (a
+    cheap set difference), but comparison itself is proportional to the edited
+    regions, not to the file length.
+
+    Parameters:
+        hypothesis: original pipeline output.
+        resolution: duration of frames, in seconds.
+
+    Usage:
+        comparison = gr.State()
+        # `apply_pipeline` also returns `EditComparison(annotations)`
+        run_btn.click(apply_pipeline, ..., outputs=[audio_labeling, comparison])
+        audio_labeling.edit(
+            fn=lambda comparison, value: comparison.update(value),
+            inputs=[comparison, audio_labeling],
+            outputs=report,  # e.g. gr.JSON
+            preprocess=False,
+        )
+    """
+
+    def __init__(self, hypothesis: PyannoteAnnotation, resolution: float = 0.01):
+        self.resolution = resolution
+        tracks = _tracks(hypothesis)
+
+        labels = dict.fromkeys(label for _, _, label in tracks)
+        self._labels: Dict[str, int] = {label: i for i, label in enumerate(labels)}
+        num_frames = round(max((end for _, end, _ in tracks), default=0.0) / resolution)
+        # (hypothesis or edited, speaker, frame) activity counts
+        self._activity = np.zeros(
+            (2, len(labels), num_frames + FRAMES_PADDING), dtype=np.int16
+        )
+        self._hypothesis_tracks = Counter(tracks)
+        self._tracks = Counter(tracks)
+        for track in tracks:
+            self._add(HYPOTHESIS, track, 1)
+            self._add(EDITED, track, 1)
+        # number of edited segments identical to a hypothesis segment
+        self._unchanged = len(tracks)
+        self._components = self._compare(0, self._activity.shape[2])
+
+    def _add(self, row: int, track: Track, count: int):
+        start, end, label = track
+        first = max(0, round(start / self.resolution))
+        last = round(end / self.resolution)
+
+        if label not in self._labels:
+            self._labels[label] = len(self._labels)
+            self._activity = np.pad(self._activity, ((0, 0), (0, 1), (0, 0)))
+        if last > self._activity.shape[2]:
+            num_frames = self._activity.shape[2]
+            padding = max(last - num_frames, num_frames // 4, FRAMES_PADDING)
+            self._activity = np.pad(self._activity, ((0, 0), (0, 0), (0, padding)))
+
+        self._activity[row, self._labels[label], first:last] += count
+
+    def _regions(self, tracks: List[Track]) -> List[Tuple[int, int]]:
+        """Disjoint [first, last) frame ranges covering `tracks`"""
+        regions = []
+        for start, end, _ in sorted(tracks):
+            first = max(0, round(start / self.resolution))
+            last = round(end / self.resolution)
+            if regions and first <= regions[-1][1]:
+                regions[-1][1] = max(regions[-1][1], last)
+            else:
+                regions.append([first, last])
+        return [(first, last) for first, last in regions]
+
+    def _compare(self, first: int, last: int) -> Dict[str, float]:
+        """Components of frames [first, last)"""
+        # overlapping segments of the same speaker count twice, as in pyannote.metrics
+        activity = self._activity[:, :, first:last].astype(np.int64)
+        hypothesis = activity[HYPOTHESIS].sum(axis=0)
+        edited = activity[EDITED].sum(axis=0)
+        correct = np.minimum(activity[HYPOTHESIS], activity[EDITED]).sum(axis=0)
+        frames = {
+            "total": hypothesis.sum(),
+            "correct": correct.sum(),
+            "missed detection": np.maximum(hypothesis - edited, 0).sum(),
+            "false alarm": np.maximum(edited - hypothesis, 0).sum(),
+            "confusion": (np.minimum(hypothesis, edited) - correct).sum(),
+        }
+        return {name: float(count) * self.resolution for name, count in frames.items()}
+
+    def update(
+        self, annotations: AnnotadedAudioData | Dict | List | PyannoteAnnotation
+    ) -> Dict[str, float]:
+        """
+        Update comparison with the current state of edited annotations (e.g. as
+        sent by `AudioLabeling` edit event).
+
+        Returns
+        -------
+        report: dict
+            see `report`
+        """
+        tracks = Counter(_tracks(annotations))
+        added = tracks - self._tracks
+        removed = self._tracks - tracks
+        if not (added or removed):
+            return self.report()
+
+        with metrics.measure("comparison.update") as measure:
+            changed = list(added) + list(removed)
+            regions = self._regions(changed)
+
+            before = [self._compare(first, last) for first, last in regions]
+            for track, count in removed.items():
+                self._add(EDITED, track, -count)
+            for track, count in added.items():
+                self._add(EDITED, track, count)
+            after = [self._compare(first, last) for first, last in regions]
+            for name in COMPONENTS:
+                self._components[name] += sum(a[name] for a in after) - sum(
+                    b[name] for b in before
+                )
+
+            for track in changed:
+                self._unchanged += min(
+                    self._hypothesis_tracks[track], tracks[track]
+                ) - min(self._hypothesis_tracks[track], self._tracks[track])
+            self._tracks = tracks
+            measure.count = len(changed)
+        return self.report()
+
+    def report(self) -> Dict[str, float]:
+        """
+        Components (in seconds), edit rate (i.e. diarization error rate of edited
+        annotations, with the pipeline output as reference) and number of unchanged,
+        added and removed segments.
+        """
+        components = dict(self._components)
+        errors = (
+            components["missed detection"]
+            + components["false alarm"]
+            + components["confusion"]
+        )
+        components["edit rate"] = (
+            errors / components["total"] if components["total"] > 0 else 0.0
+        )
+        components["unchanged segments"] = self._unchanged
+        components["added segments"] = sum(self._tracks.values()) - self._unchanged
+        components["removed segments"] = (
+            sum(self._hypothesis_tracks.values()) - self._unchanged
+        )
+        return components
@@ -9,7 +9,9 @@ from gradio.data_classes import FileData, ListFiles
 from gradio.events import Events
 from gradio.utils import NamedString
 from gradio_client.documentation import document, set_documentation_group
+from gryannote_audio.cache import cache_manager
 from gryannote_audio.core import AnnotadedAudioData
+from gryannote_audio.metrics import file_size, metrics
 from pyannote.core import Annotation as PyannoteAnnotation
 from pyannote.core import Segment
 from pyannote.database.util import load_rttm
@@ -133,10 +135,12 @@ class RTTM(Component):
         """
 
         uri = annotations.uri
-        with open(f"{self.GRADIO_CACHE}/{uri}.rttm", "w", encoding="utf-8") as file:
-            annotations.write_rttm(file)
+        with metrics.measure("rttm.write", count=len(annotations)) as measure:
+            with open(f"{self.GRADIO_CACHE}/{uri}.rttm", "w", encoding="utf-8") as file:
+                annotations.write_rttm(file)
+            measure.size = file_size(file.name)
 
-        return Path(file.name)
+        return Path(cache_manager.track(file.name))
 
     def _convert_to_pyannote_annotation(
         self, data: AnnotadedAudioData
@@ -0,0 +1,82 @@
+import asyncio
+import shutil
+from pathlib import Path
+
+import gradio as gr
+import numpy as np
+import pytest
+import soundfile
+from gradio.state_holder import SessionState
+from gradio.utils import get_upload_folder
+from gryannote_audio import AudioLabeling
+from gryannote_audio.transcoding import adts_duration
+
+
+@pytest.fixture
+def audio_path():
+    path = Path(get_upload_folder()) / "test-montage" / "audio.wav"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    soundfile.write(path, 0.1 * rng.standard_normal((16000 * 30, 1)), 16000)
+    return str(path)
+
+
+def _run(demo, inputs):
+    """Outputs of each step of the first event of `demo`, as processed by Gradio"""
+    state, iterator, outputs = SessionState(demo), None, []
+
+    async def run():
+        nonlocal iterator
+        while True:
+            output = await demo.process_api(
+                block_fn=0,
+                inputs=inputs,
+                state=state,
+                iterator=iterator,
+                session_hash="test-montage",
+                event_id="event",
+            )
+            iterator = output.get("iterator")
+            if not output["is_generating"]:
+                return
+            outputs.append(output["data"][0])
+
+    asyncio.run(run())
+    return outputs, demo.pending_streams["test-montage"]
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is required")
+def test_montage_streams_through_process_api(audio_path):
+    with gr.Blocks() as demo:
+        audio_labeling = AudioLabeling(interactive=True)
+        speaker = gr.Textbox()
+        player = AudioLabeling(streaming=True, interactive=False)
+        gr.Button().click(
+            audio_labeling.montage,
+            inputs=[audio_labeling, speaker],
+            outputs=player,
+            preprocess=False,
+        )
+
+    value = {
+        "file_data": {"path": audio_path, "meta": {"_type": "gradio.FileData"}},
+        "annotations": [
+            {"start": 1.0, "end": 5.0, "speaker": "A"},
+            {"start": 6.0, "end": 8.0, "speaker": "B"},
+            {"start": 10.0, "end": 14.0, "speaker": "A"},
+        ],
+    }
+    outputs, streams = _run(demo, [value, "A"])
+
+    assert outputs and all(output["is_stream"] for output in outputs)
+    # 8 seconds of speaker A, and a gap of 0.25 seconds
+    (stream,) = [s for run in streams.values() for s in run.values()]
+    duration = sum(adts_duration(segment["data"]) for segment in stream.segments)
+    assert duration == pytest.approx(8.25, abs=0.2)
+
+
+def test_montage_rejects_files_outside_of_cache():
+    audio_labeling = AudioLabeling()
+    value = {"file_data": {"path": __file__}, "annotations": []}
+    with pytest.raises(gr.Error):
+        next(audio_labeling.montage(value))
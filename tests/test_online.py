@@ -0,0 +1,22 @@
+from pathlib import Path
+
+import numpy as np
+from gryannote_audio.cache import _session
+from gryannote_pipeline import OnlineDiarization
+
+
+def test_recordings_are_closed_when_sessions_end():
+    online = OnlineDiarization(selector=None)
+    token = _session.set("test-online")
+    try:
+        state = online._init_state(16000)
+    finally:
+        _session.reset(token)
+    online._append(state, 16000, np.zeros(1600, dtype=np.int16))
+    recording_file = state.recording_file
+
+    online.release("test-online")
+    assert recording_file.closed
+    assert not Path(state.recording_path).exists()
+    # other sessions are left untouched
+    online.release("other-session")
@@ -0,0 +1,28 @@
+import torch
+from gryannote_pipeline.optimization import CPUBackend
+
+
+class Model(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.lstm = torch.nn.LSTM(8, 16, num_layers=2, bidirectional=True)
+        self.linear = torch.nn.Linear(32, 4)
+
+    def forward(self, x):
+        return self.linear(self.lstm(x)[0])
+
+
+def test_quantized_weights_are_cached(tmp_path):
+    model = Model().eval()
+    backend = CPUBackend(cache_dir=str(tmp_path))
+    converted = backend.convert(model)
+    (path,) = tmp_path.iterdir()
+    # cached weights are plain tensors
+    torch.load(path, weights_only=True)
+
+    cached = backend.convert(model)
+    assert isinstance(cached.lstm, torch.ao.nn.quantized.dynamic.LSTM)
+    assert isinstance(cached.linear, torch.ao.nn.quantized.dynamic.Linear)
+    x = torch.randn(5, 3, 8)
+    with torch.inference_mode():
+        assert torch.equal(converted(x), cached(x))
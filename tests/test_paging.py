@@ -0,0 +1,63 @@
+import asyncio
+from pathlib import Path
+
+import gradio as gr
+import numpy as np
+import pytest
+import soundfile
+from gradio.exceptions import Error
+from gradio.state_holder import SessionState
+from gradio.utils import get_upload_folder
+from gryannote_audio import AudioLabeling
+from pyannote.core import Annotation, Segment
+
+
+@pytest.fixture
+def value():
+    path = Path(get_upload_folder()) / "test-paging" / "audio.wav"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    soundfile.write(path, np.zeros(16000 * 10), 16000)
+    annotation = Annotation()
+    for start in range(5):
+        annotation[Segment(start, start + 1)] = f"speaker {start % 2}"
+    return str(path), annotation
+
+
+def _process(demo, session_hash):
+    output = asyncio.run(
+        demo.process_api(
+            block_fn=0,
+            inputs=[],
+            state=SessionState(demo),
+            session_hash=session_hash,
+            event_id="event",
+        )
+    )
+    return output["data"][0]
+
+
+def test_paged_annotations_are_kept_per_session(value):
+    with gr.Blocks() as demo:
+        player = AudioLabeling(interactive=False, paging_threshold=2)
+        button = gr.Button()
+        button.click(lambda: value, outputs=player)
+    player.install(demo)
+
+    data = _process(demo, "test-paging")
+    assert data["annotations"] == []
+    query = {"annotations_id": data["annotations_id"], "start": 0.0, "end": 10.0}
+    assert len(player.fetch_annotations(query)) == 2
+
+    player.release("test-paging")
+    with pytest.raises(Error):
+        player.fetch_annotations(query)
+
+
+def test_paging_requires_sessions(value):
+    with gr.Blocks() as demo:
+        player = AudioLabeling(interactive=False, paging_threshold=2)
+        button = gr.Button()
+        button.click(lambda: value, outputs=player)
+
+    with pytest.raises(RuntimeError, match="per session"):
+        _process(demo, "test-paging")
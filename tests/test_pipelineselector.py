@@ -0,0 +1,17 @@
+import json
+
+import gradio as gr
+from gryannote_pipeline import PipelineSelector
+from pyannote.audio import Pipeline
+
+
+def test_config_is_serializable():
+    with gr.Blocks() as demo:
+        PipelineSelector(
+            pipelines={"pipeline": Pipeline()},
+            micro_batching=True,
+            cpu_backend="int8",
+            postprocessing={},
+            inference_options="auto",
+        )
+    json.dumps(demo.get_config_file())